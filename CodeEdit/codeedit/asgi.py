@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve through this module (e.g. with uvicorn or daphne) so that the execution
+job streams under ``api/execute/jobs/<id>/stream/`` run as async iterators
+instead of holding a worker thread per open stream. WebSocket connections
+go to the collaborative editing server in editor.collab.
 """
 
 import os
@@ -13,4 +18,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "codeedit.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup, since it loads models
+from editor.collab import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "editor.metrics.MetricsMiddleware",
+    "editor.compression.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -56,7 +58,7 @@ MIDDLEWARE = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'editor.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -66,6 +68,66 @@ REST_FRAMEWORK = {
     # 'PAGE_SIZE': 10,
 }
 
+# Token -> user lookups cached by editor.authentication.CachedTokenAuthentication
+TOKEN_AUTH_CACHE = {
+    'TTL': 60,  # seconds
+    'SIZE': 10000,  # entries per process
+    'CACHE_ALIAS': None,  # set to a CACHES alias to share lookups between processes
+}
+
+# Write-behind buffer for file content saves (see editor/autosave.py). It is
+# per-process, so only enable it when a user's requests reach one process.
+AUTOSAVE_BUFFER = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL': 5,  # seconds; the most auto-save work a crash can lose
+    'MAX_DIRTY': 200,  # files waiting before an immediate flush
+}
+
+# File history (see editor/revisions.py)
+FILE_REVISIONS = {
+    'SNAPSHOT_INTERVAL': 20,  # max deltas applied to rebuild any revision
+    'KEEP': 200,  # revisions kept per file
+}
+
+# Collaborative editing sessions served over WebSockets by codeedit.asgi
+COLLAB_EDITING = {
+    'BATCH_INTERVAL': 0.01,  # seconds; the broadcast delay added to each keystroke
+    'PERSIST_INTERVAL': 2,  # seconds between saves of an edited document
+    'HISTORY': 1000,  # ops kept for rebasing edits from lagging clients
+}
+
+# Per-view request metrics, served at api/metrics/ (see editor/metrics.py)
+METRICS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_SECONDS': None,  # e.g. 1.0 to log slower requests with their SQL
+}
+
+# Compression of large file contents at rest and of API responses (see
+# editor/compression.py); brotli is used for responses when installed
+COMPRESSION = {
+    'CONTENT_THRESHOLD': 64 * 1024,  # characters; None stores everything as plain text
+    'RESPONSE_MIN_SIZE': 1024,  # bytes; None turns response compression off
+    'RESPONSE_LEVEL': 1,  # higher levels shave ~15% off large bodies for ~3x the CPU
+}
+
+# Per-user cache of the projects dashboard (see editor/summaries.py). Writes
+# through the API clear it in the process that served them; other processes
+# see the change after CACHE_TTL unless CACHE_ALIAS points at a shared cache.
+PROJECT_SUMMARIES = {
+    'CACHE_TTL': 300,  # seconds
+    'CACHE_SIZE': 10000,  # users per process
+    'CACHE_ALIAS': None,
+}
+
+# Syntax and lint checks for files (see editor/diagnostics.py); JavaScript
+# and TypeScript are parsed by the TypeScript transpiler's node script
+DIAGNOSTICS = {
+    'CACHE_SIZE': 4096,  # files whose findings are kept while their content is unchanged
+    'WORKERS': 4,  # parallel checks, and node processes, for a project-wide check
+    'TIMEOUT': 5,  # seconds per JavaScript/TypeScript file
+    'MAX_SIZE': 1024 * 1024,  # characters; larger files are not checked
+}
+
 ROOT_URLCONF = "codeedit.urls"
 
 TEMPLATES = [
@@ -93,9 +155,32 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections (and their pragmas) between requests, but only
+        # when served by codeedit.wsgi: under ASGI sync code runs on a new
+        # thread per request, and each would leave a connection behind
+        "CONN_MAX_AGE": int(os.environ.get("CODEEDIT_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Take the write lock when a transaction starts; a deferred
+            # transaction that reads and then writes fails with "database is
+            # locked" when another writer got in between, without waiting
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
+# SQLite tuning applied to every new connection (see editor/storage.py).
+# WAL lets reads proceed during a write and makes commits cheaper; with
+# synchronous = normal a power loss can drop the last commits but never
+# corrupts the database.
+SQLITE_STORAGE = {
+    'JOURNAL_MODE': 'wal',
+    'SYNCHRONOUS': 'normal',
+    'BUSY_TIMEOUT': 5000,  # milliseconds
+    'WRITE_RETRIES': 3,  # after the busy timeout, with exponential backoff
+    'RETRY_BACKOFF': 0.05,  # seconds
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,4 +229,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+# Code execution runner pools (see editor/execution.py)
+CODE_EXECUTION = {
+    'TIMEOUT': 5,  # seconds per run
+    'POOL_SIZE': 2,  # warm workers per language
+    'MAX_JOBS_PER_WORKER': 100,  # recycle a worker after this many runs
+    # Results of runs sent with "cache": true
+    'CACHE_SIZE': 512,  # entries in the in-process LRU
+    'CACHE_TTL': 3600,  # seconds
+    'CACHE_ALIAS': None,  # set to a CACHES alias to share results between processes
+    # Admission control; beyond these limits requests get a 429 with Retry-After
+    'MAX_CONCURRENT': 4,  # runs at once in this process
+    'MAX_PER_USER': 2,  # runs at once for one user
+    'QUEUE_SIZE': 8,  # requests allowed to wait for a slot
+    'MAX_QUEUED_PER_USER': 2,
+    'QUEUE_TIMEOUT': 3,  # seconds
+    # Limits for each process running user code
+    'CPU_LIMIT': 5,  # seconds of CPU time
+    'MEMORY_LIMIT': 256 * 1024 * 1024,  # bytes
+    'PROCESS_LIMIT': 64,  # counts every process of the uid, so run as a dedicated user
+    'NICE': 10,
+    # Project runs sync files into reusable per-project directories
+    'WORKSPACE_ROOT': None,  # defaults to codeedit-workspaces in the temp dir
+    'WORKSPACE_BUDGET': 512 * 1024 * 1024,  # bytes; least recently used workspaces are evicted beyond this
+    # TypeScript is compiled by a long-lived node process and cached by content hash
+    'TRANSPILER_NODE': None,  # node used for compiling; defaults to NODE, needs 22.13+ without the typescript package
+    'TRANSPILE_TIMEOUT': 10,  # seconds
+    'TRANSPILE_CACHE_SIZE': 256,  # compiled sources kept in memory
+    'TRANSPILE_CACHE_DIR': None,  # defaults to ~/.cache/codeedit/typescript; must be private to this user
+    'TRANSPILE_CACHE_BUDGET': 64 * 1024 * 1024,  # bytes on disk
+}
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "codeedit.settings")
+# Worker threads live as long as the server, so connections can too
+os.environ.setdefault("CODEEDIT_CONN_MAX_AGE", "60")
 
 application = get_wsgi_application()
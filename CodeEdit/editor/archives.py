@@ -0,0 +1,163 @@
+import posixpath
+import zipfile
+
+from django.utils import timezone
+
+from . import revisions
+from .folders import assign_folders, normalize_path
+from .models import File, hash_content
+
+# Mirrors getLanguage() in the editor frontend
+EXTENSION_LANGUAGES = {
+    'js': 'javascript',
+    'jsx': 'javascript',
+    'ts': 'typescript',
+    'tsx': 'typescript',
+    'py': 'python',
+    'html': 'html',
+    'css': 'css',
+    'json': 'json',
+    'md': 'markdown',
+}
+
+# Limits for uploaded archives
+MAX_MEMBER_SIZE = 10 * 1024 * 1024
+MAX_MEMBERS = 50000
+
+# Flush imported files to the database after this many rows or bytes
+BATCH_SIZE = 500
+BATCH_BYTES = 8 * 1024 * 1024
+
+
+def language_for(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return EXTENSION_LANGUAGES.get(extension, 'plaintext')
+
+
+def archive_name(file):
+    return posixpath.join(file.path.strip('/'), file.name)
+
+
+class _ChunkSink:
+    """Write-only file object that hands the bytes written so far to a generator.
+
+    It deliberately has no tell()/seek(), so zipfile writes a streamable
+    archive with data descriptors instead of seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_project_zip(project):
+    """Yield a zip archive of the project's files piece by piece.
+
+    Rows are read with .iterator() and each file is compressed and yielded
+    before the next is loaded, so memory stays flat however big the
+    project is.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        files = File.objects.filter(project=project).order_by('path', 'name')
+        # Small chunks: each fetched row carries a whole file body
+        for file in files.only('path', 'name', 'content', 'updated_at').iterator(chunk_size=20):
+            info = zipfile.ZipInfo(archive_name(file), date_time=file.updated_at.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, file.content.encode())
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def import_project_zip(project, upload, overwrite=True):
+    """Load files from a zip upload into ``project``.
+
+    Members are read one at a time and written in batches with bulk_create
+    (new paths) and bulk_update (existing paths, when ``overwrite``), so the
+    archive is never held in memory. Returns counts plus the members that
+    were skipped and why.
+    """
+    with zipfile.ZipFile(upload) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > MAX_MEMBERS:
+            raise ValueError(f'Archive has more than {MAX_MEMBERS} files')
+
+        existing = {
+            (path, name): (file_id, version)
+            for file_id, path, name, version in File.objects.filter(project=project).values_list('id', 'path', 'name', 'version')
+        }
+        summary = {'created': 0, 'updated': 0, 'skipped': []}
+        to_create, to_update, pending_bytes = [], [], 0
+
+        def flush():
+            now = timezone.now()
+            if to_create:
+                assign_folders(project.pk, to_create)
+                File.objects.bulk_create(to_create)
+                summary['created'] += len(to_create)
+            if to_update:
+                for file in to_update:
+                    file.updated_at = now
+                File.objects.bulk_update(to_update, ['content', 'content_hash', 'language', 'version', 'updated_at'])
+                summary['updated'] += len(to_update)
+            revisions.record_many(to_create + to_update)
+            to_create.clear()
+            to_update.clear()
+
+        for info in members:
+            path, _, name = info.filename.rpartition('/')
+            try:
+                path = normalize_path(path)
+            except ValueError:
+                path = None
+            if not name or path is None or info.filename.startswith('/'):
+                summary['skipped'].append({'name': info.filename, 'reason': 'invalid path'})
+                continue
+            if len(name) > 100 or len(path) > 255:
+                summary['skipped'].append({'name': info.filename, 'reason': 'path too long'})
+                continue
+            if info.file_size > MAX_MEMBER_SIZE:
+                summary['skipped'].append({'name': info.filename, 'reason': 'file too large'})
+                continue
+            with archive.open(info) as member:
+                data = member.read(MAX_MEMBER_SIZE + 1)
+            if len(data) > MAX_MEMBER_SIZE:
+                summary['skipped'].append({'name': info.filename, 'reason': 'file too large'})
+                continue
+            try:
+                content = data.decode()
+            except UnicodeDecodeError:
+                summary['skipped'].append({'name': info.filename, 'reason': 'not a text file'})
+                continue
+
+            fields = {'content': content, 'content_hash': hash_content(content), 'language': language_for(name)}
+            file_id, version = existing.get((path, name), (None, None))
+            if file_id is None:
+                to_create.append(File(project=project, path=path, name=name, **fields))
+                existing[(path, name)] = (-1, None)
+            elif overwrite and file_id > 0:
+                to_update.append(File(id=file_id, version=version + 1, **fields))
+                existing[(path, name)] = (-1, None)
+            else:
+                summary['skipped'].append({'name': info.filename, 'reason': 'already exists'})
+                continue
+
+            pending_bytes += len(data)
+            if len(to_create) + len(to_update) >= BATCH_SIZE or pending_bytes >= BATCH_BYTES:
+                flush()
+                pending_bytes = 0
+        flush()
+    return summary
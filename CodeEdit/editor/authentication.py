@@ -0,0 +1,65 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from .lru import LRUCache
+
+DEFAULTS = {
+    'TTL': 60,  # seconds a resolved token is trusted without the database
+    'SIZE': 10000,  # entries in the in-process LRU
+    'CACHE_ALIAS': None,  # optional Django cache shared between processes, used instead of the LRU
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(name, DEFAULTS[name])
+
+
+_local = LRUCache(get_setting('SIZE'), get_setting('TTL'))
+
+
+def _cache_key(key):
+    # Never use the raw token as a cache key
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _shared_cache():
+    alias = get_setting('CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def invalidate_token(key):
+    """Forget a token in this process and in the shared cache."""
+    cache_key = _cache_key(key)
+    _local.delete(cache_key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the Token/User query on a cache hit.
+
+    Resolved ``(user, token)`` pairs live in an in-process LRU or, when
+    CACHE_ALIAS is set, only in that shared Django cache, so an entry
+    invalidated by one process is gone for all of them. Both use a short
+    TTL. Deleting a token or saving its user invalidates the entry (see
+    editor.signals); the TTL bounds staleness for changes that bypass
+    signals, such as queryset updates.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        cache = _shared_cache() or _local
+        cached = cache.get(cache_key)
+        if cached is not None:
+            user, token = cached
+            # Hand out copies so one request can't mutate another's user
+            return copy.copy(user), copy.copy(token)
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), get_setting('TTL'))
+        return copy.copy(user), copy.copy(token)
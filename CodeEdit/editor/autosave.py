@@ -0,0 +1,169 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import revisions, summaries
+from .models import File, hash_content
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL': 5,  # seconds between background flushes
+    'MAX_DIRTY': 200,  # flush as soon as this many files are waiting
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'AUTOSAVE_BUFFER', {}).get(name, DEFAULTS[name])
+
+
+class WriteBehindBuffer:
+    """Per-process write-behind buffer for file content saves.
+
+    Content PUTs/PATCHes land here and are read back by the content
+    endpoints, so a user always sees their latest edit. Dirty files are
+    written to the database with one bulk_update every FLUSH_INTERVAL
+    seconds, as soon as MAX_DIRTY files are waiting, and at interpreter
+    exit. Anything still buffered when the process dies without a clean
+    shutdown is lost; FLUSH_INTERVAL bounds how much.
+
+    The buffer is in process memory, so only enable it when requests for a
+    user reach a single process (e.g. runserver or one ASGI worker).
+    """
+
+    def __init__(self):
+        self.dirty = {}
+        # Entries being written by a flush stay readable until committed
+        self.flushing = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.timer = None
+
+    @property
+    def enabled(self):
+        return get_setting('ENABLED')
+
+    def lookup(self, file_id):
+        with self.lock:
+            return self.dirty.get(file_id) or self.flushing.get(file_id)
+
+    def overlay(self, file):
+        """Replace a loaded file's content fields with its buffered state, if any."""
+        entry = self.lookup(file.pk)
+        if entry is not None:
+            for field, value in entry.items():
+                setattr(file, field, value)
+        return file
+
+    def put(self, file, content, base_version=None):
+        """Buffer new content for ``file`` and return the buffered entry.
+
+        When ``base_version`` is given the write only happens if it equals
+        the latest version (buffered or stored); otherwise None is returned.
+        """
+        with self.lock:
+            current = self.dirty.get(file.pk) or self.flushing.get(file.pk)
+            version = current['version'] if current else file.version
+            if base_version is not None and base_version != version:
+                return None
+            entry = {
+                'content': content,
+                'content_hash': hash_content(content),
+                'version': version + 1,
+                'updated_at': timezone.now(),
+            }
+            self.dirty[file.pk] = entry
+            full = len(self.dirty) >= get_setting('MAX_DIRTY')
+        self._ensure_timer()
+        if full:
+            self.flush()
+        return entry
+
+    def discard(self, file_ids):
+        with self.lock:
+            for file_id in file_ids:
+                self.dirty.pop(file_id, None)
+
+    def flush(self, file_ids=None):
+        """Write buffered files (all, or just ``file_ids``) to the database.
+
+        Entries of files deleted in the meantime are dropped. If the batch
+        fails as a whole, files are written one at a time so a bad entry
+        only holds back itself; the ones that still fail stay buffered for
+        the next flush.
+        """
+        with self.flush_lock:
+            with self.lock:
+                if file_ids is None:
+                    batch, self.dirty = self.dirty, {}
+                else:
+                    batch = {i: self.dirty.pop(i) for i in file_ids if i in self.dirty}
+                self.flushing = batch
+            if not batch:
+                return 0
+            saved, settled = [], set()
+            try:
+                try:
+                    saved = self._write(batch)
+                    settled.update(batch)
+                except Exception:
+                    logger.exception('Auto-save flush of %d files failed, saving them one at a time', len(batch))
+                    for file_id, entry in batch.items():
+                        try:
+                            saved += self._write({file_id: entry})
+                            settled.add(file_id)
+                        except Exception:
+                            logger.exception('Auto-save of file %s failed', file_id)
+            finally:
+                with self.lock:
+                    # Put back whatever a newer save has not superseded and retry later
+                    for file_id, entry in batch.items():
+                        if file_id not in settled:
+                            self.dirty.setdefault(file_id, entry)
+                    self.flushing = {}
+            if saved:
+                summaries.invalidate_for_files(saved)
+            return len(saved)
+
+    def _write(self, batch):
+        """Save ``batch`` in one transaction and return the ids of the files written."""
+        with transaction.atomic():
+            existing = set(File.objects.filter(pk__in=list(batch)).values_list('id', flat=True))
+            files = [File(id=file_id, **entry) for file_id, entry in batch.items() if file_id in existing]
+            File.objects.bulk_update(files, ['content', 'content_hash', 'version', 'updated_at'], batch_size=200)
+            revisions.record_many(files)
+        return [file.pk for file in files]
+
+    def _ensure_timer(self):
+        with self.lock:
+            if self.timer is not None:
+                return
+            self.timer = threading.Thread(target=self._run_timer, name='autosave-flush', daemon=True)
+            self.timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(get_setting('FLUSH_INTERVAL'))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Auto-save flush failed')
+            finally:
+                connections.close_all()
+
+
+buffer = WriteBehindBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Auto-save flush at shutdown failed')
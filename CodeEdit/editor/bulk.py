@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import revisions
+from .folders import assign_folders, prune_folders
+from .models import File, hash_content
+
+
+class BulkOperationError(Exception):
+    """Raised with per-item results when any operation in a batch is invalid."""
+
+    def __init__(self, results):
+        super().__init__('Invalid bulk file operations')
+        self.results = results
+
+
+def _check(project, operations):
+    """Validate a batch against the project and return per-item errors."""
+    errors = {}
+    ids = {op['id'] for op in operations if 'id' in op}
+    existing = {file.id: file for file in File.objects.filter(project=project, id__in=ids)}
+
+    seen = set()
+    for index, op in enumerate(operations):
+        if op['op'] == 'create':
+            continue
+        if op['id'] not in existing:
+            errors[index] = {'id': 'File not found in this project.'}
+        elif op['id'] in seen:
+            errors[index] = {'id': 'File appears in more than one operation.'}
+        seen.add(op.get('id'))
+
+    # Work out where every touched file ends up, then make sure no two files
+    # share a (path, name) and no target is held by a file outside the batch
+    moved_away = {op['id'] for op in operations if op['op'] in ('rename', 'delete') and op.get('id') in existing}
+    targets = {}
+    for index, op in enumerate(operations):
+        if index in errors or op['op'] not in ('create', 'rename'):
+            continue
+        if op['op'] == 'create':
+            key = (op.get('path', ''), op['name'])
+        else:
+            key = (op.get('path', existing[op['id']].path), op['name'])
+        if key in targets:
+            errors[index] = {'name': 'Another operation in this batch uses this path and name.'}
+        else:
+            targets[key] = index
+
+    if targets:
+        lookup = Q()
+        for path, name in targets:
+            lookup |= Q(path=path, name=name)
+        for file_id, path, name in File.objects.filter(project=project).filter(lookup).values_list('id', 'path', 'name'):
+            if file_id not in moved_away:
+                errors.setdefault(targets[(path, name)], {'name': 'A file with this path and name already exists.'})
+    return existing, errors
+
+
+def apply_file_operations(project, operations):
+    """Apply create/update/rename/delete operations to one project atomically.
+
+    Everything is checked up front; if any item is invalid nothing is
+    written and BulkOperationError carries the per-item results. Otherwise
+    the batch is applied in one transaction with one DELETE, one
+    bulk_update and one bulk_create, and the per-item results are returned.
+    """
+    existing, errors = _check(project, operations)
+    if errors:
+        raise BulkOperationError([
+            {'op': op['op'], 'status': 'error', 'errors': errors[index]} if index in errors
+            else {'op': op['op'], 'status': 'skipped'}
+            for index, op in enumerate(operations)
+        ])
+
+    now = timezone.now()
+    to_delete = []
+    to_update = {}
+    update_fields = set()
+    to_create = []
+    moved = []
+    for op in operations:
+        if op['op'] == 'delete':
+            to_delete.append(op['id'])
+            continue
+        if op['op'] == 'create':
+            to_create.append(File(
+                project=project,
+                name=op['name'],
+                path=op.get('path', ''),
+                language=op.get('language', 'python'),
+                content=op.get('content', ''),
+                content_hash=hash_content(op.get('content', '')),
+            ))
+            continue
+
+        file = existing[op['id']]
+        for field in ('name', 'path', 'language'):
+            if field in op:
+                setattr(file, field, op[field])
+                update_fields.add(field)
+        if 'path' in op:
+            moved.append(file)
+            update_fields.add('folder')
+        if 'content' in op and op['content'] != file.content:
+            file.content = op['content']
+            file.content_hash = hash_content(file.content)
+            file.version += 1
+            update_fields.update({'content', 'content_hash', 'version'})
+        file.updated_at = now
+        update_fields.add('updated_at')
+        to_update[file.id] = file
+
+    # Folders the batch may leave empty
+    vacated = {existing[file_id].folder_id for file_id in to_delete} | {file.folder_id for file in moved}
+    with transaction.atomic():
+        assign_folders(project.pk, to_create + moved)
+        if to_delete:
+            File.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            File.objects.bulk_update(to_update.values(), sorted(update_fields))
+        created = File.objects.bulk_create(to_create)
+        revisions.record_many(created + [file for file in to_update.values() if 'content' in update_fields])
+        prune_folders(vacated)
+        created = iter(created)
+
+    results = []
+    for op in operations:
+        if op['op'] == 'create':
+            file = next(created)
+            results.append({'op': 'create', 'status': 'ok', 'id': file.id, 'version': file.version})
+        elif op['op'] == 'delete':
+            results.append({'op': 'delete', 'status': 'ok', 'id': op['id']})
+        else:
+            file = to_update[op['id']]
+            results.append({'op': op['op'], 'status': 'ok', 'id': file.id, 'version': file.version})
+    return results
@@ -0,0 +1,366 @@
+"""Real-time collaborative editing over WebSockets.
+
+Each open File gets one DocumentSession holding the authoritative text.
+Clients connect to ``/ws/files/<id>/`` and speak JSON:
+
+    -> {"type": "auth", "token": "<api token>"}
+    <- {"type": "init", "client_id": "...", "revision": 12, "content": "..."}
+    -> {"type": "op", "revision": 12, "edits": [{"offset": 3, "delete": 0, "insert": "x"}]}
+    <- {"type": "ops", "ops": [{"revision": 13, "client_id": "...", "edits": [...]}]}
+
+Edits use the same format as the content PATCH endpoint. An op is made
+against ``revision``; the server rebases it over anything applied since
+(see editor.edits.transform_edits), applies it and broadcasts it in the
+next batch. A client keeps at most one op in flight and treats its own
+op coming back in an ``ops`` message as the acknowledgement. Remote ops
+received meanwhile are rebased over the in-flight op and any local edits
+not yet sent, with the remote op going first on ties. An ``init`` message
+can arrive at any time (e.g. after an op the server could not rebase) and
+resets the client to the given text and revision.
+
+Documents are written back to File.content every PERSIST_INTERVAL
+seconds while edited and when the last client leaves.
+"""
+
+import asyncio
+import atexit
+import collections
+import json
+import logging
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import autosave, revisions, summaries
+from .authentication import CachedTokenAuthentication
+from .edits import apply_edits, transform_edits
+from .models import File, hash_content
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_INTERVAL': 0.01,  # seconds ops are collected before a broadcast
+    'PERSIST_INTERVAL': 2,  # seconds between saves of an edited document
+    'HISTORY': 1000,  # applied ops kept for rebasing late edits
+    'MAX_BACKLOG': 500,  # unsent messages before a slow client is dropped
+    'AUTH_TIMEOUT': 10,  # seconds a new connection has to authenticate
+}
+
+PATH = re.compile(r'^/ws/files/(?P<file_id>\d+)/$')
+
+
+def get_setting(name):
+    return getattr(settings, 'COLLAB_EDITING', {}).get(name, DEFAULTS[name])
+
+
+class StaleRevision(Exception):
+    """The op is based on a revision the session no longer has history for."""
+
+
+def clean_edits(edits):
+    """Validate an edit list from a client, raising ValueError."""
+    if not isinstance(edits, list):
+        raise ValueError('edits must be a list')
+    cleaned = []
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError('Each edit must be an object')
+        offset, delete, insert = edit.get('offset'), edit.get('delete', 0), edit.get('insert', '')
+        if type(offset) is not int or type(delete) is not int or offset < 0 or delete < 0:
+            raise ValueError('offset and delete must be non-negative integers')
+        if not isinstance(insert, str):
+            raise ValueError('insert must be a string')
+        if delete or insert:
+            cleaned.append({'offset': offset, 'delete': delete, 'insert': insert})
+    return cleaned
+
+
+def save_content(file_id, content):
+    """Write a session's text to the file as a new version.
+
+    Returns the new version, or None if the file has been deleted.
+    """
+    # The session supersedes whatever the REST endpoints had buffered
+    autosave.buffer.discard([file_id])
+    with transaction.atomic():
+        updated = File.objects.filter(pk=file_id).update(
+            content=content, content_hash=hash_content(content), version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            return None
+        version = File.objects.filter(pk=file_id).values_list('version', flat=True).get()
+    revisions.record(file_id, version, content)
+    summaries.invalidate_for_files([file_id])
+    return version
+
+
+def load_content(file_id):
+    autosave.buffer.flush([file_id])
+    return File.objects.filter(pk=file_id).values_list('content', flat=True).first()
+
+
+def can_edit(user, file_id):
+    return File.objects.filter(pk=file_id, project__owner=user).exists()
+
+
+def authenticate(key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+class Connection:
+    """One WebSocket client, with its own outgoing queue.
+
+    Broadcasts only enqueue, so a slow client never holds up a session;
+    it is disconnected once MAX_BACKLOG messages are waiting.
+    """
+
+    def __init__(self, send):
+        self.id = uuid.uuid4().hex
+        self.send = send
+        self.outbox = asyncio.Queue()
+        self.closed = False
+
+    def push(self, message):
+        if self.closed:
+            return
+        if self.outbox.qsize() >= get_setting('MAX_BACKLOG'):
+            self.close(4008)
+            return
+        self.outbox.put_nowait({'type': 'websocket.send', 'text': message})
+
+    def push_json(self, data):
+        self.push(json.dumps(data))
+
+    def close(self, code=1000):
+        if not self.closed:
+            self.closed = True
+            self.outbox.put_nowait({'type': 'websocket.close', 'code': code})
+
+    async def pump(self):
+        while True:
+            message = await self.outbox.get()
+            await self.send(message)
+            if message['type'] == 'websocket.close':
+                return
+
+
+class DocumentSession:
+    """The authoritative text of one file and the clients editing it.
+
+    All mutation happens on the event loop without awaiting in between,
+    so ops are applied one at a time in arrival order.
+    """
+
+    def __init__(self, hub, file_id, content):
+        self.hub = hub
+        self.file_id = file_id
+        self.content = content
+        self.revision = 0
+        self.history = collections.deque(maxlen=get_setting('HISTORY'))
+        self.clients = {}
+        self.pending = []
+        self.broadcast_handle = None
+        self.dirty = False
+        self.persist_task = None
+
+    def join(self, connection):
+        self.clients[connection.id] = connection
+        connection.push_json(self.init_message(connection))
+
+    def init_message(self, connection):
+        return {'type': 'init', 'client_id': connection.id, 'revision': self.revision, 'content': self.content}
+
+    def submit(self, connection, revision, edits):
+        """Rebase ``edits`` from ``revision`` onto the current text and apply them."""
+        behind = self.revision - revision
+        if behind < 0 or behind > len(self.history):
+            raise StaleRevision()
+        for index in range(len(self.history) - behind, len(self.history)):
+            edits, _ = transform_edits(edits, self.history[index][2])
+        self.content = apply_edits(self.content, edits)
+        self.revision += 1
+        self.history.append((self.revision, connection.id, edits))
+        self.pending.append({'revision': self.revision, 'client_id': connection.id, 'edits': edits})
+        if self.broadcast_handle is None:
+            loop = asyncio.get_running_loop()
+            self.broadcast_handle = loop.call_later(get_setting('BATCH_INTERVAL'), self.broadcast)
+        self.dirty = True
+        if self.persist_task is None:
+            self.persist_task = asyncio.ensure_future(self.persist_later())
+
+    def broadcast(self):
+        self.broadcast_handle = None
+        if not self.pending:
+            return
+        # Serialize once for every subscriber
+        message = json.dumps({'type': 'ops', 'ops': self.pending})
+        self.pending = []
+        for connection in list(self.clients.values()):
+            connection.push(message)
+
+    async def persist_later(self):
+        try:
+            await asyncio.sleep(get_setting('PERSIST_INTERVAL'))
+            await self.persist()
+        finally:
+            self.persist_task = None
+
+    async def persist(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            version = await sync_to_async(save_content)(self.file_id, self.content)
+        except Exception:
+            self.dirty = True
+            logger.exception('Saving collaborative session for file %s failed', self.file_id)
+            return
+        if version is None:
+            for connection in list(self.clients.values()):
+                connection.push_json({'type': 'error', 'detail': 'File has been deleted'})
+                connection.close(4404)
+
+    async def leave(self, connection):
+        self.clients.pop(connection.id, None)
+        if self.clients:
+            return
+        self.broadcast()
+        if self.persist_task is not None:
+            self.persist_task.cancel()
+            self.persist_task = None
+        await self.persist()
+        # Someone may have joined while the final save was running
+        if not self.clients and self.hub.sessions.get(self.file_id) is self:
+            del self.hub.sessions[self.file_id]
+
+
+class SessionHub:
+    """Open document sessions in this process, by file id."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.loading = {}
+
+    async def open(self, file_id):
+        session = self.sessions.get(file_id)
+        if session is not None:
+            return session
+        # Concurrent joiners share one load of the file
+        loader = self.loading.get(file_id)
+        if loader is None:
+            loader = self.loading[file_id] = asyncio.ensure_future(sync_to_async(load_content)(file_id))
+        try:
+            content = await loader
+        finally:
+            self.loading.pop(file_id, None)
+        if content is None:
+            return None
+        if file_id not in self.sessions:
+            self.sessions[file_id] = DocumentSession(self, file_id, content)
+        return self.sessions[file_id]
+
+    def save_all(self):
+        """Synchronously persist every edited session, e.g. at shutdown."""
+        for session in list(self.sessions.values()):
+            if session.dirty:
+                save_content(session.file_id, session.content)
+                session.dirty = False
+
+
+hub = SessionHub()
+
+
+@atexit.register
+def save_on_exit():
+    try:
+        hub.save_all()
+    except Exception:
+        logger.exception('Saving collaborative sessions at shutdown failed')
+
+
+async def _receive_json(receive):
+    """Next JSON message from the client, or None once it disconnects."""
+    while True:
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            return None
+        if event['type'] != 'websocket.receive':
+            continue
+        try:
+            data = json.loads(event.get('text') or event.get('bytes') or '')
+        except ValueError:
+            data = None
+        return data if isinstance(data, dict) else {}
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for ``/ws/files/<id>/`` connections."""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    match = PATH.match(scope['path'])
+    if match is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    file_id = int(match['file_id'])
+    await send({'type': 'websocket.accept'})
+
+    # The token comes in the first message rather than the URL, so it
+    # doesn't end up in access logs
+    try:
+        message = await asyncio.wait_for(_receive_json(receive), get_setting('AUTH_TIMEOUT'))
+    except asyncio.TimeoutError:
+        message = None
+    user = None
+    if message and message.get('type') == 'auth' and isinstance(message.get('token'), str):
+        user = await sync_to_async(authenticate)(message['token'])
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    if not await sync_to_async(can_edit)(user, file_id):
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    session = await hub.open(file_id)
+    if session is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    connection = Connection(send)
+    writer = asyncio.ensure_future(connection.pump())
+    session.join(connection)
+    try:
+        while not connection.closed:
+            message = await _receive_json(receive)
+            if message is None:
+                break
+            kind = message.get('type')
+            if kind == 'op':
+                try:
+                    session.submit(connection, message.get('revision'), clean_edits(message.get('edits')))
+                except (StaleRevision, TypeError):
+                    # Too far behind to rebase: start over from the current text
+                    connection.push_json(session.init_message(connection))
+                except ValueError as e:
+                    connection.push_json({'type': 'error', 'detail': str(e)})
+                    connection.push_json(session.init_message(connection))
+            elif kind == 'resync':
+                connection.push_json(session.init_message(connection))
+            else:
+                connection.push_json({'type': 'error', 'detail': f'Unknown message type: {kind}'})
+    finally:
+        await session.leave(connection)
+        connection.close()
+        try:
+            await writer
+        except Exception:
+            pass
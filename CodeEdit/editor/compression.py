@@ -0,0 +1,151 @@
+import gzip
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import Length
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+DEFAULTS = {
+    'CONTENT_THRESHOLD': 64 * 1024,  # characters; larger file contents are stored compressed
+    'CONTENT_LEVEL': 1,  # zlib level; saves of large files pay for higher ones, reads don't
+    'RESPONSE_MIN_SIZE': 1024,  # bytes; smaller responses go out as they are
+    'RESPONSE_LEVEL': 1,  # gzip level, also used as the brotli quality
+}
+
+# Stored values start with the marker and the character count, zero-padded,
+# so SQL can report a file's size without decompressing it
+MARKER = b'Z'
+SIZE_DIGITS = 10
+HEADER_SIZE = len(MARKER) + SIZE_DIGITS
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def get_setting(name):
+    return getattr(settings, 'COMPRESSION', {}).get(name, DEFAULTS[name])
+
+
+def pack(text):
+    """Compressed storage form of ``text``, or None when it isn't worth it."""
+    threshold = get_setting('CONTENT_THRESHOLD')
+    if threshold is None or len(text) < threshold:
+        return None
+    data = text.encode()
+    packed = zlib.compress(data, get_setting('CONTENT_LEVEL'))
+    # Not worth a decompression on every read unless it saves a tenth
+    if len(packed) + HEADER_SIZE > len(data) * 0.9:
+        return None
+    return MARKER + b'%0*d' % (SIZE_DIGITS, len(text)) + packed
+
+
+def unpack(value):
+    return zlib.decompress(value[HEADER_SIZE:]).decode()
+
+
+class CompressedTextField(models.TextField):
+    """A TextField that stores values above CONTENT_THRESHOLD zlib-compressed.
+
+    Compressed values are written as BLOBs into the same column, which
+    SQLite's dynamic typing allows, so small files stay plain text and keep
+    working with LIKE, length() and the search index. Only SQLite gets
+    compressed values; other databases store text as before.
+    """
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if connection.vendor == 'sqlite' and isinstance(value, str):
+            packed = pack(value)
+            if packed is not None:
+                return packed
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, bytes) and value[:1] == MARKER:
+            return unpack(value)
+        return value
+
+
+class ContentLength(Length):
+    """Length in characters of a CompressedTextField, read from the header of compressed values."""
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template=(
+                "CASE WHEN typeof(%(expressions)s) = 'blob' "
+                f"THEN CAST(substr(%(expressions)s, {len(MARKER) + 1}, {SIZE_DIGITS}) AS INTEGER) "
+                "ELSE length(%(expressions)s) END"
+            ),
+            **extra_context,
+        )
+
+
+def accepted_encoding(header):
+    """The best encoding we can produce among those in an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def encode(data, encoding):
+    level = get_setting('RESPONSE_LEVEL')
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compresses JSON and text responses of at least RESPONSE_MIN_SIZE bytes.
+
+    Uses brotli when the client accepts it and the package is installed,
+    gzip otherwise. Streaming responses (exports, event streams) are left
+    alone. ETags stay strong: they identify the file content, and saves
+    send them back in If-Match, which only matches strong tags.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        min_size = get_setting('RESPONSE_MIN_SIZE')
+        if (
+            min_size is None
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < min_size:
+            return response
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        compressed = encode(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,267 @@
+import ast
+import atexit
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import autosave, execution
+from .archives import language_for
+from .lru import LRUCache
+from .models import File
+from .transpile import TranspilerUnavailable, transpiler
+
+DEFAULTS = {
+    'CACHE_SIZE': 4096,  # files whose latest findings are kept in memory
+    'WORKERS': 4,  # threads, and node checker processes, used by a project-wide check
+    'TIMEOUT': 5,  # seconds to check one JavaScript or TypeScript file
+    'MAX_SIZE': 1024 * 1024,  # characters; larger files are reported as too large to check
+}
+
+LANGUAGES = ('python', 'javascript', 'typescript')
+
+# Contents loaded per query by a project-wide check
+LOAD_BATCH = 200
+
+# Warning filters are process-wide, so Python checks record them one at a time
+_warnings_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'DIAGNOSTICS', {}).get(name, DEFAULTS[name])
+
+
+def diagnostic(message, severity='error', line=None, column=None, end_line=None, end_column=None):
+    """One finding; lines and columns are 1-based, as editors show them."""
+    return {
+        'line': line,
+        'column': column,
+        'end_line': end_line,
+        'end_column': end_column,
+        'severity': severity,
+        'message': message,
+    }
+
+
+def check_python(source, filename):
+    """Syntax errors, compiler warnings and unused imports, without running anything."""
+    with _warnings_lock, warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        try:
+            tree = ast.parse(source, filename)
+            # Some errors ('return' outside function, ...) only show up when compiling
+            compile(tree, filename, 'exec', dont_inherit=True)
+        except SyntaxError as e:
+            return [diagnostic(e.msg, line=e.lineno, column=e.offset, end_line=e.end_lineno, end_column=e.end_offset)]
+        except ValueError as e:
+            # Null bytes in the source
+            return [diagnostic(str(e))]
+        except (RecursionError, MemoryError):
+            # Nesting deeper than the parser or compiler can follow
+            return [diagnostic('Code is nested too deeply to check')]
+    findings = [
+        diagnostic(str(w.message), 'warning', line=w.lineno)
+        for w in caught
+        if issubclass(w.category, (SyntaxWarning, DeprecationWarning)) and w.filename == filename
+    ]
+    return sorted(findings + unused_imports(tree, filename), key=lambda d: (d['line'] or 0, d['column'] or 0))
+
+
+def unused_imports(tree, filename):
+    """Module-level imports whose name is never used; ``__init__.py`` files re-export, so they are skipped."""
+    if os.path.basename(filename) == '__init__.py':
+        return []
+    imported = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imported[alias.asname or alias.name.partition('.')[0]] = alias
+        elif isinstance(node, ast.ImportFrom) and node.module != '__future__':
+            for alias in node.names:
+                if alias.name != '*':
+                    imported[alias.asname or alias.name] = alias
+    if not imported:
+        return []
+    used = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == '__all__' for t in node.targets):
+            if isinstance(node.value, (ast.List, ast.Tuple)):
+                used.update(e.value for e in node.value.elts if isinstance(e, ast.Constant) and isinstance(e.value, str))
+    return [
+        diagnostic(
+            f"'{alias.name}' imported but unused", 'warning',
+            line=alias.lineno, column=alias.col_offset + 1, end_line=alias.end_lineno, end_column=alias.end_col_offset + 1,
+        )
+        for name, alias in imported.items()
+        if name not in used
+    ]
+
+
+class NodeChecker:
+    """Parses JavaScript and TypeScript in warm node processes.
+
+    The processes run the same script as editor.transpile, which stays up
+    between jobs, so a check costs a parse and no interpreter startup.
+    Several are kept so a project-wide check can parse files in parallel.
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = execution.RunnerPool(
+                    transpiler.command(),
+                    size=get_setting('WORKERS'),
+                    max_jobs=execution.get_setting('MAX_JOBS_PER_WORKER'),
+                )
+                threading.Thread(target=self.pool.warm, daemon=True).start()
+            return self.pool
+
+    def check(self, source, language, filename):
+        pool = self.get_pool()
+        payload = {'check': True, 'source': source, 'language': language, 'filename': filename}
+        for attempt in range(2):
+            worker = pool.acquire()
+            try:
+                reply = worker.call(payload, get_setting('TIMEOUT'))
+            except execution.ExecutionTimeout:
+                pool.release(worker, healthy=False)
+                raise
+            except execution.WorkerCrashed:
+                pool.release(worker, healthy=False)
+                if attempt:
+                    raise
+                continue
+            pool.release(worker)
+            break
+        if reply.get('diagnostics') is None:
+            raise TranspilerUnavailable(reply.get('error', 'No TypeScript compiler available'))
+        return [
+            diagnostic(d['message'], line=d.get('line'), column=d.get('column'),
+                       end_line=d.get('end_line'), end_column=d.get('end_column'))
+            for d in reply['diagnostics']
+        ]
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+
+
+node_checker = NodeChecker()
+atexit.register(node_checker.close)
+
+
+class DiagnosticsCache:
+    """The latest findings of each file, valid while its content hash and language match."""
+
+    def __init__(self):
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = LRUCache(get_setting('CACHE_SIZE'), float('inf'))
+        return self._entries
+
+    def get(self, file, language):
+        entry = self.entries.get(file.pk)
+        if entry is None or entry[:2] != (file.content_hash, language):
+            return None
+        return entry[2]
+
+    def set(self, file, language, findings):
+        self.entries.set(file.pk, (file.content_hash, language, findings))
+
+
+cache = DiagnosticsCache()
+
+
+def check_source(source, language, filename):
+    """Findings for ``source``, or None when ``language`` can't be checked here."""
+    if len(source) > get_setting('MAX_SIZE'):
+        return [diagnostic(f"File is too large to check (over {get_setting('MAX_SIZE')} characters)", 'warning')]
+    if language == 'python':
+        return check_python(source, filename)
+    try:
+        return node_checker.check(source, language, filename)
+    except (TranspilerUnavailable, execution.ExecutionTimeout, execution.WorkerCrashed):
+        return None
+
+
+def result(file, language, findings, cached=False):
+    return {
+        'file': file.pk,
+        'name': file.name,
+        'path': file.path,
+        'language': language,
+        'checked': findings is not None,
+        'cached': cached,
+        'diagnostics': findings or [],
+    }
+
+
+def _check(file, language):
+    findings = check_source(file.content, language, file.name)
+    if findings is not None:
+        cache.set(file, language, findings)
+    return result(file, language, findings)
+
+
+def check_file(file):
+    """Findings for one file, from the cache while its content is unchanged.
+
+    The language comes from the file name, as for project runs. Only the
+    content hash is needed for a cache hit, so ``file`` may be loaded
+    without its content.
+    """
+    file = autosave.buffer.overlay(file)
+    language = language_for(file.name)
+    if language not in LANGUAGES:
+        return result(file, language, None)
+    findings = cache.get(file, language)
+    if findings is not None:
+        return result(file, language, findings, cached=True)
+    return _check(file, language)
+
+
+def check_project(project):
+    """Check every file of ``project``.
+
+    Files come from the cache when their content hash is unchanged, which
+    needs no content at all; the rest are loaded in batches and checked
+    on WORKERS threads. Python checks hold the GIL, but JavaScript and
+    TypeScript ones wait on separate node processes and run in parallel.
+    """
+    files = list(File.objects.filter(project=project).defer('content').order_by('path', 'name'))
+    results = {}
+    pending = []
+    for file in files:
+        autosave.buffer.overlay(file)
+        language = language_for(file.name)
+        if language not in LANGUAGES:
+            results[file.pk] = result(file, language, None)
+            continue
+        findings = cache.get(file, language)
+        if findings is not None:
+            results[file.pk] = result(file, language, findings, cached=True)
+        else:
+            pending.append((file, language))
+
+    with ThreadPoolExecutor(get_setting('WORKERS')) as executor:
+        for start in range(0, len(pending), LOAD_BATCH):
+            batch = pending[start:start + LOAD_BATCH]
+            deferred = [file.pk for file, _ in batch if 'content' in file.get_deferred_fields()]
+            contents = dict(File.objects.filter(pk__in=deferred).values_list('pk', 'content'))
+            for file, _ in batch:
+                if file.pk in contents:
+                    file.content = contents[file.pk]
+            for checked in executor.map(_check, *zip(*batch)):
+                results[checked['file']] = checked
+    return [results[file.pk] for file in files]
@@ -0,0 +1,70 @@
+def apply_edits(content, edits):
+    """Apply a list of text edits to ``content`` and return the new text.
+
+    Each edit is a dict with ``offset``, ``delete`` and ``insert``. Edits are
+    applied in order, so every offset refers to the text as left by the
+    previous edit. Offsets count Unicode code points. Raises ValueError when
+    an edit falls outside the document.
+    """
+    for edit in edits:
+        offset = edit['offset']
+        end = offset + edit.get('delete', 0)
+        if offset < 0 or end > len(content):
+            raise ValueError(f'Edit at offset {offset} is outside the document (length {len(content)})')
+        content = content[:offset] + edit.get('insert', '') + content[end:]
+    return content
+
+
+def transform_edits(edits, others, first=False):
+    """Rebase two concurrent edit lists made against the same text.
+
+    Returns ``(edits', others')`` such that applying ``others`` then
+    ``edits'`` gives the same text as applying ``edits`` then ``others'``.
+    Text deleted by either side stays deleted and both insertions are
+    kept; when both insert at the same offset, ``edits`` goes first if
+    ``first`` is true. An edit may come back split in two (a deletion
+    that now straddles the other side's insertion) or dropped entirely.
+    """
+    if not edits or not others:
+        return list(edits), list(others)
+    if len(edits) > 1:
+        head, others = transform_edits(edits[:1], others, first)
+        tail, others = transform_edits(edits[1:], others, first)
+        return head + tail, others
+    if len(others) > 1:
+        head, edits = transform_edits(others[:1], edits, not first)
+        tail, edits = transform_edits(others[1:], edits, not first)
+        return edits, head + tail
+    return _rebase(edits[0], others[0], first), _rebase(others[0], edits[0], not first)
+
+
+def _rebase(edit, other, first):
+    # ``edit`` rewritten to apply after ``other``, as a list of 0-2 edits
+    start = edit['offset']
+    end = start + edit.get('delete', 0)
+    insert = edit.get('insert', '')
+    other_start = other['offset']
+    other_end = other_start + other.get('delete', 0)
+    other_insert = len(other.get('insert', ''))
+    shift = other_insert - (other_end - other_start)
+
+    # Where our insertion lands relative to the other edit's replacement
+    if start < other_start or (start == other_start and first):
+        position = start
+    elif start < other_end or start == other_start:
+        position = other_start + other_insert
+    else:
+        position = start + shift
+
+    result = []
+    # Part of our deleted range after the other edit's range
+    right = max(start, other_end)
+    if end > right:
+        result.append({'offset': right + shift, 'delete': end - right, 'insert': ''})
+    # Part before it, which is where the insertion goes when it exists
+    left = min(end, other_start)
+    if start < left:
+        result.append({'offset': start, 'delete': left - start, 'insert': insert})
+    elif insert:
+        result.append({'offset': position, 'delete': 0, 'insert': insert})
+    return result
@@ -0,0 +1,43 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+
+
+def file_etag(file):
+    """Strong ETag for a file's content, read from the stored hash."""
+    return quote_etag(file.content_hash)
+
+
+def project_etag(project, request):
+    """Strong ETag for a project's detail representation.
+
+    Derived from the project's own timestamp plus the newest file timestamp
+    and file count (one aggregate over the (project, updated_at) index), and
+    from the query string, since ?include= and ?fields= change the body.
+    """
+    files = project.files.aggregate(latest=Max('updated_at'), count=Count('id'))
+    key = '|'.join([
+        str(project.pk),
+        project.updated_at.isoformat(),
+        files['latest'].isoformat() if files['latest'] else '',
+        str(files['count']),
+        request.META.get('QUERY_STRING', ''),
+    ])
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def etag_matches(header, etag, weak=False):
+    """Check an If-Match / If-None-Match header value against ``etag``.
+
+    If-None-Match uses the weak comparison and If-Match the strong one,
+    as in RFC 9110.
+    """
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    if weak:
+        return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+    return not etag.startswith('W/') and etag in etags
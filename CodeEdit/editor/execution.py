@@ -0,0 +1,464 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import resource
+import select
+import signal
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, Queue
+
+from django.conf import settings
+
+from . import metrics
+from .scheduler import scheduler
+
+RUNNERS_DIR = Path(__file__).resolve().parent / 'runners'
+HEADER = struct.Struct('>I')
+# Runners reply on their own pipe, never on stdout, which user code shares;
+# the fd number is passed in this environment variable
+REPLY_FD_ENV = 'CODEEDIT_REPLY_FD'
+
+DEFAULTS = {
+    'TIMEOUT': 5,
+    'POOL_SIZE': 2,
+    'MAX_JOBS_PER_WORKER': 100,
+    'PYTHON': 'python',
+    'NODE': 'node',
+    'CACHE_SIZE': 512,
+    'CACHE_TTL': 3600,
+    'CACHE_ALIAS': None,
+    # Limits applied to every process running user code
+    'CPU_LIMIT': 5,  # seconds of CPU time
+    'MEMORY_LIMIT': 256 * 1024 * 1024,  # bytes of address space (heap size for node)
+    'PROCESS_LIMIT': 64,  # processes/threads per uid; not enforced when running as root
+    'NICE': 10,  # run user code at a lower priority than the API
+    'OUTPUT_LIMIT': 1024 * 1024,  # bytes per stream; the program is killed beyond this
+    # TypeScript compilation (see editor/transpile.py)
+    'TRANSPILER_NODE': None,  # node that runs the compiler, if not NODE
+    'TRANSPILE_TIMEOUT': 10,  # seconds per compile
+    'TRANSPILE_CACHE_SIZE': 256,  # compiled programs kept in memory
+    'TRANSPILE_CACHE_DIR': None,  # defaults to ~/.cache/codeedit/typescript; must be private to this user
+    'TRANSPILE_CACHE_BUDGET': 64 * 1024 * 1024,  # bytes of compiled programs kept on disk
+    # Project runs (see editor/workspaces.py)
+    'WORKSPACE_ROOT': None,  # defaults to codeedit-workspaces in the temp dir
+    'WORKSPACE_BUDGET': 512 * 1024 * 1024,  # bytes of workspaces kept for reuse
+}
+
+# V8 reserves this much address space up front, beyond the heap itself
+NODE_ADDRESS_SPACE = 1024 * 1024 * 1024
+
+
+def get_setting(name):
+    """Read a CODE_EXECUTION setting, falling back to the defaults above."""
+    return getattr(settings, 'CODE_EXECUTION', {}).get(name, DEFAULTS[name])
+
+
+class ExecutionError(Exception):
+    pass
+
+
+class UnsupportedLanguage(ExecutionError):
+    pass
+
+
+class WorkerCrashed(ExecutionError):
+    pass
+
+
+class ReplyTooLarge(WorkerCrashed):
+    pass
+
+
+class ExecutionTimeout(ExecutionError):
+    pass
+
+
+@dataclass
+class ExecutionResult:
+    stdout: str = ''
+    stderr: str = ''
+    returncode: int = 0
+    timed_out: bool = False
+    truncated: bool = False
+    # The process died without replying (e.g. killed at a resource limit)
+    crashed: bool = False
+    # Seconds spent compiling (TypeScript only) and running, when measured
+    compile_seconds: float | None = None
+    run_seconds: float | None = None
+
+
+def max_reply_size():
+    """Largest reply a job can legitimately produce, or None without an output limit.
+
+    Each stream is cut to about OUTPUT_LIMIT bytes, and JSON escaping turns
+    a byte into at most six (``\\u0000``).
+    """
+    limit = get_setting('OUTPUT_LIMIT')
+    if not limit:
+        return None
+    return 2 * 6 * limit + 64 * 1024
+
+
+def child_limits(language):
+    """rlimits and niceness for processes running ``language`` code."""
+    memory = get_setting('MEMORY_LIMIT')
+    if memory and language == 'javascript':
+        memory += NODE_ADDRESS_SPACE
+    return {
+        'cpu': get_setting('CPU_LIMIT'),
+        'memory': memory,
+        'processes': get_setting('PROCESS_LIMIT'),
+        'nice': get_setting('NICE'),
+    }
+
+
+def apply_limits(limits):
+    """Apply ``child_limits()`` to the current process, e.g. as a preexec_fn."""
+    if limits.get('nice'):
+        os.nice(limits['nice'])
+    if limits.get('cpu'):
+        # SIGXCPU at the soft limit, SIGKILL a second later
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu'], limits['cpu'] + 1))
+    if limits.get('memory'):
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory'], limits['memory']))
+    if limits.get('processes'):
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits['processes'], limits['processes']))
+
+
+class Worker:
+    """A pre-started runner process that accepts framed jobs over a pipe.
+
+    With ``limits`` the whole process runs under them (one-shot workers);
+    reusable workers instead pass them along with each job so only the
+    forked child is limited.
+    """
+
+    def __init__(self, command, reusable=True, limits=None):
+        self.reusable = reusable
+        self.jobs = 0
+        reply_r, reply_w = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=(reply_w,),
+                env={**os.environ, REPLY_FD_ENV: str(reply_w)},
+                start_new_session=True,
+                preexec_fn=functools.partial(apply_limits, limits) if limits else None,
+            )
+        except BaseException:
+            os.close(reply_r)
+            raise
+        finally:
+            os.close(reply_w)
+        self.replies = os.fdopen(reply_r, 'rb', buffering=0)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def call(self, payload, timeout):
+        """Send one framed request and return the decoded reply."""
+        deadline = time.monotonic() + timeout
+        self._send(payload)
+        return self._receive(deadline)
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode()
+        try:
+            self.process.stdin.write(HEADER.pack(len(body)) + body)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerCrashed(str(e))
+
+    def _receive(self, deadline, max_size=None):
+        size = HEADER.unpack(self._read_exact(HEADER.size, deadline))[0]
+        if max_size is not None and size > max_size:
+            # Not a reply we could have sent; don't let it fill our memory
+            self.kill()
+            raise ReplyTooLarge(f'Runner replied with {size} bytes, more than the output limit allows')
+        return json.loads(self._read_exact(size, deadline))
+
+    def run(self, code, stdin='', timeout=5, limits=None, cwd=None, filename=None):
+        """Run one job. Raises WorkerCrashed only if the job could not be sent."""
+        self.jobs += 1
+        deadline = time.monotonic() + timeout
+        self._send({
+            'code': code, 'stdin': stdin, 'limits': limits, 'output_limit': get_setting('OUTPUT_LIMIT'),
+            'cwd': cwd, 'filename': filename,
+        })
+        try:
+            reply = self._receive(deadline, max_reply_size())
+        except ReplyTooLarge as e:
+            return ExecutionResult(stderr=f'{e}\n', returncode=-signal.SIGKILL, crashed=True)
+        except WorkerCrashed:
+            # The program got the job and may have done anything before the
+            # worker died (e.g. hitting the memory or CPU limit, or killing
+            # its runner), so this is its result rather than ours to retry
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                self.process.wait(max(0, deadline - time.monotonic()))
+            self.kill()
+            returncode = self.process.returncode
+            return ExecutionResult(
+                stderr=f'Process exited unexpectedly (exit code {returncode}); '
+                       f'it may have exceeded its memory or CPU limit',
+                returncode=returncode,
+                crashed=True,
+            )
+        return ExecutionResult(
+            stdout=reply['stdout'],
+            stderr=reply['stderr'],
+            returncode=reply['returncode'],
+            truncated=reply.get('truncated', False),
+        )
+
+    def _read_exact(self, size, deadline):
+        fd = self.replies.fileno()
+        buf = bytearray()
+        while len(buf) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ExecutionTimeout()
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise ExecutionTimeout()
+            chunk = os.read(fd, size - len(buf))
+            if not chunk:
+                raise WorkerCrashed('Runner exited unexpectedly')
+            buf += chunk
+        return bytes(buf)
+
+    def kill(self):
+        # The worker runs in its own session, so this also takes down any
+        # child it forked for the current job.
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        for stream in (self.process.stdin, self.replies):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class RunnerPool:
+    """A fixed-size pool of warm workers for one language.
+
+    Workers are recycled after ``max_jobs`` jobs, on a crash or on a timeout,
+    and replacements are started in the background so a request never waits
+    on interpreter startup unless the whole pool is busy.
+    """
+
+    # Seconds between checks for room in a full pool while waiting for a worker
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, command, size, max_jobs, reusable=True, limits=None):
+        self.command = command
+        self.limits = limits
+        self.size = size
+        self.max_jobs = max_jobs if reusable else 1
+        self.reusable = reusable
+        self.idle = Queue()
+        self.lock = threading.Lock()
+        self.total = 0
+        self.closed = False
+
+    def warm(self):
+        """Start workers until the pool is full."""
+        while True:
+            with self.lock:
+                if self.closed or self.total >= self.size:
+                    return
+                self.total += 1
+            self._spawn_into_pool()
+
+    def _spawn_into_pool(self):
+        try:
+            worker = Worker(self.command, self.reusable, None if self.reusable else self.limits)
+        except OSError:
+            with self.lock:
+                self.total -= 1
+            raise
+        self.idle.put(worker)
+
+    def _replace_in_background(self):
+        def spawn():
+            try:
+                self._spawn_into_pool()
+            except OSError:
+                pass
+        threading.Thread(target=spawn, daemon=True).start()
+
+    def acquire(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except Empty:
+                with self.lock:
+                    grow = self.total < self.size
+                    if grow:
+                        self.total += 1
+                if grow:
+                    try:
+                        self._spawn_into_pool()
+                    except OSError as e:
+                        raise ExecutionError(f'Could not start a runner: {e}')
+                try:
+                    worker = self.idle.get(timeout=self.POLL_INTERVAL)
+                except Empty:
+                    # A background replacement may have failed to start and
+                    # given its place back, so look for room again
+                    continue
+            if worker.alive:
+                return worker
+            self._retire(worker)
+
+    def release(self, worker, healthy=True):
+        if healthy and worker.alive and worker.jobs < self.max_jobs and not self.closed:
+            self.idle.put(worker)
+        else:
+            self._retire(worker)
+
+    def _retire(self, worker):
+        worker.kill()
+        if self.closed:
+            with self.lock:
+                self.total -= 1
+            return
+        self._replace_in_background()
+
+    def run(self, code, stdin='', timeout=5, cwd=None, filename=None):
+        worker = self.acquire()
+        try:
+            result = worker.run(code, stdin, timeout, self.limits if self.reusable else None, cwd, filename)
+        except ExecutionTimeout:
+            self.release(worker, healthy=False)
+            return ExecutionResult(timed_out=True, returncode=-signal.SIGKILL)
+        except WorkerCrashed:
+            self.release(worker, healthy=False)
+            raise
+        self.release(worker, healthy=not result.crashed)
+        return result
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except Empty:
+                return
+            worker.kill()
+            with self.lock:
+                self.total -= 1
+
+
+def _language_specs():
+    node = [get_setting('NODE')]
+    if get_setting('MEMORY_LIMIT'):
+        node.append(f"--max-old-space-size={get_setting('MEMORY_LIMIT') // (1024 * 1024)}")
+    return {
+        'python': ([get_setting('PYTHON'), str(RUNNERS_DIR / 'python_worker.py')], True),
+        'javascript': (node + [str(RUNNERS_DIR / 'node_worker.js')], False),
+    }
+
+
+# TypeScript runs on node once editor.transpile has compiled it
+LANGUAGE_ALIASES = {'typescript': 'javascript'}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def resolve_language(language):
+    """Map a language to the runner that executes it, or raise UnsupportedLanguage."""
+    language = LANGUAGE_ALIASES.get(language, language)
+    if language not in ('python', 'javascript'):
+        raise UnsupportedLanguage(language)
+    return language
+
+
+def get_pool(language):
+    language = resolve_language(language)
+    specs = _language_specs()
+    with _pools_lock:
+        pool = _pools.get(language)
+        if pool is None:
+            command, reusable = specs[language]
+            pool = RunnerPool(
+                command,
+                size=get_setting('POOL_SIZE'),
+                max_jobs=get_setting('MAX_JOBS_PER_WORKER'),
+                reusable=reusable,
+                limits=child_limits(language),
+            )
+            _pools[language] = pool
+            threading.Thread(target=pool.warm, daemon=True).start()
+    return pool
+
+
+def run_code(language, code, stdin='', user_id=None, cwd=None, filename=None):
+    """Run ``code`` on a warm worker for ``language``.
+
+    A worker found dead when the job is sent is replaced and the job
+    retried once on a fresh one; once the job has been sent it is never
+    run again.
+    With ``user_id`` the run first takes a slot from the execution
+    scheduler, which raises scheduler.Saturated when none is available.
+    With ``cwd`` the program runs in that directory as ``filename``, so it
+    can import the files next to it. TypeScript is compiled first, and a
+    program that fails to compile comes back as a failed run.
+    """
+    pool = get_pool(language)
+    if user_id is None:
+        return _execute(language, pool, code, stdin, cwd, filename)
+    with scheduler.admit(user_id):
+        return _execute(language, pool, code, stdin, cwd, filename)
+
+
+def _execute(language, pool, code, stdin, cwd, filename):
+    # transpile builds on Worker, so it can't be imported at the top
+    from .transpile import CompileError, TranspilerUnavailable, transpile
+
+    compile_seconds = None
+    if language == 'typescript':
+        try:
+            code, compile_seconds, _ = transpile(code)
+        except CompileError as e:
+            return ExecutionResult(stderr=f'{e}\n', returncode=1)
+        except TranspilerUnavailable:
+            # Without a compiler the source runs as JavaScript, as it always did
+            pass
+    started = time.perf_counter()
+    result = _run_on_pool(pool, code, stdin, cwd, filename)
+    result.compile_seconds = compile_seconds
+    result.run_seconds = time.perf_counter() - started
+    return result
+
+
+def _run_on_pool(pool, code, stdin, cwd=None, filename=None):
+    timeout = get_setting('TIMEOUT')
+    with metrics.subprocess_timer():
+        try:
+            return pool.run(code, stdin, timeout, cwd, filename)
+        except WorkerCrashed:
+            # Only raised when the job never reached the worker
+            return pool.run(code, stdin, timeout, cwd, filename)
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
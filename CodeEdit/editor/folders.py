@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat, Length, Substr
+from django.utils import timezone
+
+from .compression import ContentLength
+from .models import File, Folder
+
+# Paths per query when looking up many folders at once
+LOOKUP_BATCH = 500
+
+
+class FolderError(Exception):
+    pass
+
+
+class FolderNotFound(FolderError):
+    pass
+
+
+class FolderConflict(FolderError):
+    pass
+
+
+def normalize_path(path):
+    """``path`` without empty segments or leading/trailing slashes, e.g. ``/src//lib/`` -> ``src/lib``."""
+    parts = [part for part in (path or '').split('/') if part]
+    if any(part in ('.', '..') for part in parts):
+        raise ValueError(f'"{path}" is not a valid path')
+    return '/'.join(parts)
+
+
+def subtree(path):
+    """Q for the folders strictly below ``path``, as a range on the (project, path) index."""
+    # '0' is the character after '/', so this is every path starting with path + '/'
+    return Q(path__gt=path + '/', path__lt=path + '0')
+
+
+def ensure_folders(project_id, paths):
+    """Map each of ``paths`` (normalized) to its folder id, creating missing folders.
+
+    Ancestors are created too, one bulk insert per depth, and the project
+    root maps to None.
+    """
+    wanted = set()
+    for path in paths:
+        parts = path.split('/') if path else []
+        wanted.update('/'.join(parts[:depth]) for depth in range(1, len(parts) + 1))
+
+    ids = {'': None}
+    pending = sorted(wanted)
+    for start in range(0, len(pending), LOOKUP_BATCH):
+        ids.update(Folder.objects.filter(
+            project_id=project_id, path__in=pending[start:start + LOOKUP_BATCH],
+        ).values_list('path', 'id'))
+
+    missing = sorted(wanted - ids.keys(), key=lambda path: path.count('/'))
+    while missing:
+        depth = missing[0].count('/')
+        level = [path for path in missing if path.count('/') == depth]
+        missing = missing[len(level):]
+        Folder.objects.bulk_create(
+            [
+                Folder(project_id=project_id, parent_id=ids[parent], name=name, path=path)
+                for path in level
+                for parent, _, name in [path.rpartition('/')]
+            ],
+            # Another request may be creating the same folders
+            ignore_conflicts=True,
+        )
+        for start in range(0, len(level), LOOKUP_BATCH):
+            ids.update(Folder.objects.filter(
+                project_id=project_id, path__in=level[start:start + LOOKUP_BATCH],
+            ).values_list('path', 'id'))
+    return ids
+
+
+def assign_folders(project_id, files):
+    """Normalize the paths of unsaved or moved ``files`` and point them at their folders."""
+    for file in files:
+        file.path = normalize_path(file.path)
+    ids = ensure_folders(project_id, {file.path for file in files})
+    for file in files:
+        file.folder_id = ids[file.path]
+
+
+def prune_folders(folder_ids):
+    """Delete those of ``folder_ids`` left without files or subfolders, then their emptied ancestors.
+
+    Folders only exist as the directories of files, so call this in the
+    transaction that deletes or moves files out of them. One query finds
+    the empty folders of each level and one deletes them.
+    """
+    pending = {folder_id for folder_id in folder_ids if folder_id is not None}
+    while pending:
+        empty = dict(Folder.objects.filter(pk__in=pending).exclude(
+            Exists(File.objects.filter(folder=OuterRef('pk'))) | Exists(Folder.objects.filter(parent=OuterRef('pk'))),
+        ).values_list('id', 'parent_id'))
+        if not empty:
+            return
+        Folder.objects.filter(pk__in=list(empty)).delete()
+        pending = {parent_id for parent_id in empty.values() if parent_id is not None}
+
+
+def get_folder(project, path):
+    """The folder at ``path``, or None for the project root."""
+    path = normalize_path(path)
+    if not path:
+        return None
+    try:
+        return Folder.objects.get(project=project, path=path)
+    except Folder.DoesNotExist:
+        raise FolderNotFound(f'Folder "{path}" not found')
+
+
+def list_children(project, folder_ids):
+    """Subfolders and files directly inside each of ``folder_ids`` (None is the root).
+
+    One query for the folders and one for the files, whatever the number
+    of directories, each answered from the (project, parent/folder, name)
+    indexes. Returns two dicts keyed by parent folder id.
+    """
+    folder_ids = list(folder_ids)
+    in_folders = Q(folder_id__in=[i for i in folder_ids if i is not None])
+    under_parents = Q(parent_id__in=[i for i in folder_ids if i is not None])
+    if None in folder_ids:
+        in_folders |= Q(folder__isnull=True)
+        under_parents |= Q(parent__isnull=True)
+
+    folders = {folder_id: [] for folder_id in folder_ids}
+    subfolders = Folder.objects.filter(under_parents, project=project).annotate(
+        has_children=Exists(Folder.objects.filter(parent=OuterRef('pk')))
+        | Exists(File.objects.filter(folder=OuterRef('pk'))),
+    ).order_by('name')
+    for folder in subfolders:
+        folders[folder.parent_id].append(folder)
+
+    files = {folder_id: [] for folder_id in folder_ids}
+    for file in File.objects.filter(in_folders, project=project).defer('content').annotate(
+        size=ContentLength('content'),
+    ).order_by('name'):
+        files[file.folder_id].append(file)
+    return folders, files
+
+
+@transaction.atomic
+def move_folder(project, source, target):
+    """Move or rename the folder at ``source`` and everything below it to ``target``.
+
+    Two UPDATE statements do the work: one rewrites the subtree's folder
+    paths, found as an index range, and one copies the new paths onto the
+    files of those folders through their folder id. Nothing is loaded row
+    by row. The folder's old parent is pruned if this emptied it. Returns
+    the number of folders and files moved.
+    """
+    folder = get_folder(project, source)
+    if folder is None:
+        raise ValueError('The project root cannot be moved')
+    target = normalize_path(target)
+    if not target:
+        raise ValueError('A folder cannot be moved to the project root path')
+    if target == folder.path:
+        return {'path': target, 'folders': 0, 'files': 0}
+    if target.startswith(folder.path + '/'):
+        raise ValueError('A folder cannot be moved inside itself')
+    parent_path, _, name = target.rpartition('/')
+    if len(name) > 100:
+        raise ValueError('Folder name is too long')
+    longest = Folder.objects.filter(subtree(folder.path), project=project).aggregate(longest=Max(Length('path')))['longest']
+    if len(target) + max(0, (longest or 0) - len(folder.path)) > 255:
+        raise ValueError('Paths below the new location would be too long')
+    if Folder.objects.filter(project=project, path=target).exists():
+        raise FolderConflict(f'Folder "{target}" already exists')
+
+    parent_id = ensure_folders(project.pk, [parent_path])[parent_path]
+    source_path = folder.path
+    moved = Folder.objects.filter(subtree(source_path), project=project).update(
+        path=Concat(Value(target), Substr('path', len(source_path) + 1)),
+    )
+    Folder.objects.filter(pk=folder.pk).update(path=target, name=name, parent_id=parent_id)
+
+    below = Folder.objects.filter(subtree(target), project=project).values('id')
+    files = File.objects.filter(Q(folder_id=folder.pk) | Q(folder_id__in=below)).update(
+        path=Subquery(Folder.objects.filter(pk=OuterRef('folder_id')).values('path')),
+        updated_at=timezone.now(),
+    )
+    if folder.parent_id != parent_id:
+        prune_folders([folder.parent_id])
+    return {'path': target, 'folders': moved + 1, 'files': files}
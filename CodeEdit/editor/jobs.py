@@ -0,0 +1,260 @@
+import asyncio
+import codecs
+import functools
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+import uuid
+
+from . import execution
+from .scheduler import scheduler
+from .transpile import CompileError, TranspilerUnavailable, transpile
+
+# Interpreter setting, extra arguments and script suffix for streamed runs
+SCRIPT_COMMANDS = {
+    'python': ('PYTHON', ['-u'], '.py'),
+    'javascript': ('NODE', [], '.js'),
+}
+
+logger = logging.getLogger(__name__)
+
+# How long finished jobs are kept around for late readers, in seconds
+JOB_TTL = 600
+
+
+class Job:
+    """One asynchronous execution and the output it has produced so far.
+
+    Output is recorded as an ordered list of ``(kind, data)`` events so a
+    reader can resume from any offset. Sync readers block on a condition,
+    async readers are woken through their own event loop.
+    """
+
+    def __init__(self, user_id, language, code, stdin=''):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.language = language
+        self.code = code
+        self.stdin = stdin
+        self.status = 'queued'
+        self.returncode = None
+        self.timed_out = False
+        self.truncated = False
+        self.compile_seconds = None
+        self.finished_at = None
+        self.events = []
+        self.cond = threading.Condition()
+        self.waiters = []
+
+    @property
+    def done(self):
+        return self.status == 'finished'
+
+    def append(self, kind, data, finish=False):
+        with self.cond:
+            self.events.append((kind, data))
+            if finish:
+                self.status = 'finished'
+                self.finished_at = time.monotonic()
+            self.cond.notify_all()
+            waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, offset, timeout):
+        """Block until there are events past ``offset`` or the job is done."""
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.events) > offset or self.done, timeout)
+            return self.events[offset:], self.done
+
+    async def wait_async(self, offset, timeout):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.cond:
+            if len(self.events) > offset or self.done:
+                return self.events[offset:], self.done
+            self.waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self.cond:
+            if (loop, future) in self.waiters:
+                self.waiters.remove((loop, future))
+            return self.events[offset:], self.done
+
+    def output(self, kind):
+        with self.cond:
+            return ''.join(data for event, data in self.events if event == kind)
+
+    def to_dict(self):
+        error = self.output('stderr')
+        if self.timed_out:
+            error = f"Execution timed out (limit: {execution.get_setting('TIMEOUT')} seconds)"
+        return {
+            'id': self.id,
+            'status': self.status,
+            'output': self.output('stdout'),
+            'error': error if error else None,
+            'returncode': self.returncode,
+            'timed_out': self.timed_out,
+            'truncated': self.truncated,
+            'compile_ms': None if self.compile_seconds is None else round(self.compile_seconds * 1000, 1),
+        }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class JobManager:
+    """Runs jobs as asyncio subprocesses on a dedicated event loop thread."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def _ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='execution-jobs', daemon=True).start()
+            return self.loop
+
+    def submit(self, user_id, language, code, stdin=''):
+        if execution.LANGUAGE_ALIASES.get(language, language) not in SCRIPT_COMMANDS:
+            raise execution.UnsupportedLanguage(language)
+        # Jobs take a slot for their whole run but never queue for one
+        scheduler.acquire(user_id, wait=False)
+        job = Job(user_id, language, code, stdin)
+        with self.lock:
+            self._purge()
+            self.jobs[job.id] = job
+        asyncio.run_coroutine_threadsafe(self._run(job), self._ensure_loop())
+        return job
+
+    def get(self, job_id, user_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _purge(self):
+        cutoff = time.monotonic() - JOB_TTL
+        expired = [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _run(self, job):
+        started = time.monotonic()
+        try:
+            await self._execute(job)
+        except Exception:
+            logger.exception('Execution job %s failed', job.id)
+            job.append('stderr', 'Internal error while running the program\n')
+        finally:
+            # Readers wait for the exit event, so every job has to end with one
+            if not job.done:
+                job.returncode = -1 if job.returncode is None else job.returncode
+                job.append('exit', {'returncode': job.returncode, 'timed_out': job.timed_out}, finish=True)
+            scheduler.release(job.user_id, time.monotonic() - started)
+
+    async def _execute(self, job):
+        language = execution.LANGUAGE_ALIASES.get(job.language, job.language)
+        setting, args, suffix = SCRIPT_COMMANDS[language]
+        if language == 'javascript' and execution.get_setting('MEMORY_LIMIT'):
+            args = [f"--max-old-space-size={execution.get_setting('MEMORY_LIMIT') // (1024 * 1024)}"] + args
+        job.status = 'running'
+        code = job.code
+        if job.language == 'typescript':
+            try:
+                code, job.compile_seconds, _ = await asyncio.get_running_loop().run_in_executor(None, transpile, code)
+            except CompileError as e:
+                job.append('stderr', f'{e}\n')
+                job.returncode = 1
+                job.append('exit', {'returncode': job.returncode, 'timed_out': False}, finish=True)
+                return
+            except TranspilerUnavailable:
+                pass
+        with tempfile.TemporaryDirectory() as workdir:
+            script = os.path.join(workdir, 'main' + suffix)
+            with open(script, 'w') as f:
+                f.write(code)
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    execution.get_setting(setting), *args, script,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True,
+                    preexec_fn=functools.partial(execution.apply_limits, execution.child_limits(language)),
+                )
+            except OSError as e:
+                job.append('stderr', str(e))
+                job.returncode = -1
+                job.append('exit', {'returncode': job.returncode, 'timed_out': False}, finish=True)
+                return
+
+            async def feed():
+                try:
+                    process.stdin.write(job.stdin.encode())
+                    await process.stdin.drain()
+                    process.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            limit = execution.get_setting('OUTPUT_LIMIT')
+
+            async def pump(stream, kind):
+                # Output is streamed to readers as it comes, so there is no
+                # tail to keep: past the limit the program is just stopped
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                total = 0
+                while True:
+                    chunk = await stream.read(4096)
+                    over = limit and total + len(chunk) > limit
+                    if over:
+                        chunk = chunk[:limit - total]
+                    total += len(chunk)
+                    text = decoder.decode(chunk, final=not chunk or over)
+                    if text:
+                        job.append(kind, text)
+                    if over:
+                        job.truncated = True
+                        kill()
+                        job.append('stderr', f'\n... [output truncated: program stopped after {limit} bytes] ...\n')
+                        return
+                    if not chunk:
+                        return
+
+            def kill():
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(feed(), pump(process.stdout, 'stdout'), pump(process.stderr, 'stderr'), process.wait()),
+                    execution.get_setting('TIMEOUT'),
+                )
+            except asyncio.TimeoutError:
+                job.timed_out = True
+                kill()
+            except BaseException:
+                # Don't leave the program running when the job fails
+                kill()
+                raise
+            job.returncode = await process.wait()
+            job.append(
+                'exit', {'returncode': job.returncode, 'timed_out': job.timed_out, 'truncated': job.truncated}, finish=True
+            )
+
+
+manager = JobManager()
@@ -0,0 +1,330 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from rest_framework.authtoken.models import Token
+
+from editor import compression
+from editor.models import File, Project
+
+PROGRAMS = {
+    'python': 'import sys\nprint(sum(range(1000)))\nprint(sys.version_info[0])\n',
+    'javascript': 'let total = 0;\nfor (let i = 0; i < 1000; i++) total += i;\nconsole.log(total);\n',
+}
+
+
+
+def database_bytes():
+    """Size of the database on disk, including writes still in the WAL."""
+    path = connection.settings_dict['NAME']
+    with connection.cursor() as cursor:
+        # Move the WAL into the main file so its size counts what is stored
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return sum(os.path.getsize(name) for name in (path, f'{path}-wal') if os.path.exists(name))
+
+def summarize_latencies(seconds):
+    """p50/p95/p99/mean/max of a list of durations, in milliseconds."""
+    if not seconds:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    ordered = sorted(seconds)
+    quantiles = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) > 1 else ordered * 99
+    return {
+        'p50': round(quantiles[49] * 1000, 3),
+        'p95': round(quantiles[94] * 1000, 3),
+        'p99': round(quantiles[98] * 1000, 3),
+        'mean': round(statistics.fmean(ordered) * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+def synthetic_source(rng, size):
+    lines = []
+    length = 0
+    while length < size:
+        name = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10)))
+        line = rng.choice([
+            f'def {name}(value):',
+            f'    return value * {rng.randint(1, 99)}',
+            f'{name} = [{rng.randint(0, 999)}, {rng.randint(0, 999)}]',
+            f'# {name} {name}',
+            f'print({name!r})',
+        ])
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+
+class QueryCounter:
+    """Counts SQL statements run on this thread's connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def decode_json(response):
+    """Parse a JSON response, undoing any Content-Encoding first."""
+    body = response.content
+    encoding = response.get('Content-Encoding')
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = compression.brotli.decompress(body)
+    return json.loads(body)
+
+
+class Session:
+    """One simulated user: an authenticated client plus what it knows about its files."""
+
+    def __init__(self, token, file_ids, rng, accept_encoding=''):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}', HTTP_ACCEPT_ENCODING=accept_encoding)
+        self.file_ids = file_ids
+        self.rng = rng
+        self.versions = {}
+
+    def list_projects(self):
+        return self.client.get('/api/projects/')
+
+    def open_file(self):
+        return self.client.get(f'/api/files/{self.rng.choice(self.file_ids)}/content/')
+
+    def autosave(self, file_id):
+        version = self.versions.get(file_id)
+        if version is None:
+            version = decode_json(self.client.get(f'/api/files/{file_id}/content/'))['version']
+        edit = {'offset': 0, 'delete': 0, 'insert': self.rng.choice('abcdefghij')}
+        response = self.client.patch(
+            f'/api/files/{file_id}/content/',
+            json.dumps({'base_version': version, 'edits': [edit]}),
+            content_type='application/json',
+        )
+        if response.status_code == 200:
+            self.versions[file_id] = decode_json(response)['version']
+        else:
+            self.versions.pop(file_id, None)
+        return response
+
+    def execute(self, language):
+        return self.client.post(
+            '/api/execute/', json.dumps({'language': language, 'code': PROGRAMS[language]}),
+            content_type='application/json',
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the editor API in-process against a freshly seeded SQLite database and '
+        'print throughput, latency percentiles and queries per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--projects', type=int, default=20, help='Projects per user')
+        parser.add_argument('--files', type=int, default=10, help='Files per project')
+        parser.add_argument('--file-size', type=int, default=2000, help='Characters per file')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--burst', type=int, default=20, help='Saves or executions per burst')
+        parser.add_argument('--concurrency', type=int, default=1, help='Simulated users sending at once')
+        parser.add_argument('--scenarios', default='list_projects,open_file,autosave_burst,execute_python,execute_javascript,mixed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--accept-encoding', default='gzip, br', help='Accept-Encoding sent by the clients; "" for none')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+        parser.add_argument('--baseline', help='Earlier report to compare p95 latency and queries against')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        settings.DEBUG = False
+
+        # Seed a throwaway file-backed database, like the real deployment
+        workdir = tempfile.mkdtemp(prefix='codeedit-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                report['comparison'] = compare(json.load(f), report)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        users = self.seed(options, rng)
+        report = {
+            'config': {
+                name: options[name]
+                for name in (
+                    'users', 'projects', 'files', 'file_size', 'requests', 'burst', 'concurrency', 'seed', 'accept_encoding',
+                )
+            },
+            'seed_seconds': round(time.perf_counter() - started, 3),
+            'db_bytes': database_bytes(),
+            'scenarios': {},
+        }
+
+        scenarios = {
+            'list_projects': lambda session: [session.list_projects],
+            'open_file': lambda session: [session.open_file],
+            'autosave_burst': self.autosave_burst(options),
+            'execute_python': lambda session: [lambda: session.execute('python')] * options['burst'],
+            'execute_javascript': lambda session: [lambda: session.execute('javascript')] * options['burst'],
+            'mixed': self.mixed(options),
+        }
+        for name in options['scenarios'].split(','):
+            if name not in scenarios:
+                raise CommandError(f'Unknown scenario "{name}"; choose from {", ".join(scenarios)}')
+            if name == 'execute_javascript' and not shutil.which(settings.CODE_EXECUTION.get('NODE', 'node')):
+                report['scenarios'][name] = {'skipped': 'node is not installed'}
+                continue
+            sessions = [
+                Session(token, file_ids, random.Random(rng.random()), options['accept_encoding'])
+                for token, file_ids in users
+            ]
+            report['scenarios'][name] = self.measure(scenarios[name], sessions, options)
+        return report
+
+    def seed(self, options, rng):
+        users = []
+        for u in range(options['users']):
+            # No password: the clients authenticate with tokens, and hashing is slow
+            user = User.objects.create_user(f'bench{u}')
+            projects = Project.objects.bulk_create(
+                Project(name=f'project {p}', owner=user) for p in range(options['projects'])
+            )
+            files = File.objects.bulk_create(
+                File(
+                    name=f'module{f}.py', project=project,
+                    content=synthetic_source(rng, options['file_size']),
+                )
+                for project in projects for f in range(options['files'])
+            )
+            users.append((Token.objects.create(user=user).key, [file.pk for file in files]))
+        return users
+
+    def autosave_burst(self, options):
+        def steps(session):
+            file_id = session.rng.choice(session.file_ids)
+            return [lambda: session.autosave(file_id)] * options['burst']
+        return steps
+
+    def mixed(self, options):
+        # Roughly what an editing session sends: mostly opens and saves
+        weights = [('open_file', 40), ('autosave', 40), ('list_projects', 10), ('execute', 10)]
+
+        def steps(session):
+            kind = session.rng.choices([k for k, _ in weights], [w for _, w in weights])[0]
+            if kind == 'autosave':
+                file_id = session.rng.choice(session.file_ids)
+                return [lambda: session.autosave(file_id)]
+            if kind == 'execute':
+                return [lambda: session.execute('python')]
+            return [getattr(session, kind)]
+        return steps
+
+    def measure(self, scenario, sessions, options):
+        """Run ``options['requests']`` requests built by ``scenario`` across the sessions."""
+        total = options['requests']
+        latencies, queries, sizes, statuses = [], [], [], {}
+        lock = threading.Lock()
+        sent = [0]
+
+        def take():
+            with lock:
+                if sent[0] >= total:
+                    return False
+                sent[0] += 1
+                return True
+
+        def drive(session):
+            try:
+                run_session(session)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+
+        def run_session(session):
+            counter = QueryCounter()
+            while True:
+                for step in scenario(session):
+                    if not take():
+                        return
+                    before = counter.count
+                    begin = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        response = step()
+                    elapsed = time.perf_counter() - begin
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(counter.count - before)
+                        sizes.append(0 if response.streaming else len(response.content))
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            futures = [pool.submit(drive, sessions[i % len(sessions)]) for i in range(options['concurrency'])]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses.items() if status >= 400),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'latency_ms': summarize_latencies(latencies),
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2) if queries else None,
+                'max': max(queries, default=None),
+            },
+            # As sent, i.e. after any Content-Encoding
+            'response_bytes': {
+                'mean': round(statistics.fmean(sizes)) if sizes else None,
+                'total': sum(sizes),
+            },
+        }
+
+
+def compare(baseline, report):
+    """Relative change in p95 latency and mean queries per scenario against ``baseline``."""
+    changes = {}
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or 'skipped' in previous or 'skipped' in current:
+            continue
+        changes[name] = {
+            'p95_change': _change(previous['latency_ms']['p95'], current['latency_ms']['p95']),
+            'queries_change': _change(previous['queries_per_request']['mean'], current['queries_per_request']['mean']),
+        }
+    return changes
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return None
+    if old == 0:
+        return 0.0 if new == 0 else None
+    return round((new - old) / old, 3)
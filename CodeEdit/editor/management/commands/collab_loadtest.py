@@ -0,0 +1,180 @@
+import asyncio
+import json
+import random
+import string
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from editor import collab
+from editor.edits import apply_edits, transform_edits
+from editor.models import File, Project
+
+from .benchmark import summarize_latencies
+
+
+class Typist:
+    """A simulated editor client speaking the editor.collab protocol in-process."""
+
+    def __init__(self, application, file_id, token, rng):
+        self.application = application
+        self.file_id = file_id
+        self.token = token
+        self.rng = rng
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.client_id = None
+        self.content = ''
+        self.revision = 0
+        self.in_flight = None
+        self.buffer = []
+        self.sent_at = None
+        self.latencies = []
+        self.acked = asyncio.Event()
+
+    async def connect(self):
+        scope = {'type': 'websocket', 'path': f'/ws/files/{self.file_id}/', 'query_string': b'', 'headers': []}
+        self.server = asyncio.ensure_future(self.application(scope, self.outgoing.get, self.incoming.put))
+        await self.outgoing.put({'type': 'websocket.connect'})
+        assert (await self.incoming.get())['type'] == 'websocket.accept'
+        self.send({'type': 'auth', 'token': self.token})
+        self.reader = asyncio.ensure_future(self.read())
+
+    def send(self, data):
+        self.outgoing.put_nowait({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def read(self):
+        while True:
+            event = await self.incoming.get()
+            if event['type'] == 'websocket.close':
+                return
+            message = json.loads(event['text'])
+            if message['type'] == 'init':
+                self.client_id = message['client_id']
+                self.content = message['content']
+                self.revision = message['revision']
+                self.in_flight, self.buffer = None, []
+                self.acked.set()
+            elif message['type'] == 'ops':
+                for op in message['ops']:
+                    self.receive(op)
+
+    def receive(self, op):
+        self.revision = op['revision']
+        if op['client_id'] == self.client_id:
+            self.latencies.append(time.perf_counter() - self.sent_at)
+            self.in_flight = None
+            self.flush()
+            return
+        edits = op['edits']
+        if self.in_flight is not None:
+            self.in_flight, edits = transform_edits(self.in_flight, edits)
+        self.buffer, edits = transform_edits(self.buffer, edits)
+        self.content = apply_edits(self.content, edits)
+
+    def flush(self):
+        if self.in_flight is None and self.buffer:
+            self.in_flight, self.buffer = self.buffer, []
+            self.sent_at = time.perf_counter()
+            self.send({'type': 'op', 'revision': self.revision, 'edits': self.in_flight})
+        if self.in_flight is None:
+            self.acked.set()
+
+    def keystroke(self):
+        cursor = self.rng.randint(0, len(self.content))
+        if cursor and self.rng.random() < 0.15:
+            edit = {'offset': cursor - 1, 'delete': 1, 'insert': ''}
+        else:
+            edit = {'offset': cursor, 'delete': 0, 'insert': self.rng.choice(string.ascii_lowercase + ' \n')}
+        self.content = apply_edits(self.content, [edit])
+        self.buffer.append(edit)
+        self.acked.clear()
+        self.flush()
+
+    async def type(self, keystrokes, interval):
+        await self.acked.wait()
+        for _ in range(keystrokes):
+            await asyncio.sleep(self.rng.expovariate(1 / interval))
+            self.keystroke()
+
+    async def settle(self):
+        await self.acked.wait()
+
+    async def disconnect(self):
+        await self.outgoing.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self.server
+        self.reader.cancel()
+
+
+class Command(BaseCommand):
+    help = 'Simulate many typists editing files over the collaborative editing WebSocket, in-process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=200)
+        parser.add_argument('--typists', type=int, default=3, help='Clients per file')
+        parser.add_argument('--keystrokes', type=int, default=50, help='Keystrokes per typist')
+        parser.add_argument('--interval', type=float, default=0.1, help='Mean seconds between keystrokes')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Always run against a throwaway database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = asyncio.run(self.run(options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    async def run(self, options):
+        from codeedit.asgi import application
+
+        token, file_ids = await sync_to_async(self.seed)(options['files'])
+        rng = random.Random(options['seed'])
+        typists = [
+            Typist(application, file_id, token, random.Random(rng.random()))
+            for file_id in file_ids for _ in range(options['typists'])
+        ]
+        await asyncio.gather(*(typist.connect() for typist in typists))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(typist.type(options['keystrokes'], options['interval']) for typist in typists))
+        await asyncio.gather(*(typist.settle() for typist in typists))
+        elapsed = time.perf_counter() - started
+
+        # Wait for the last batches to reach everyone, then compare texts
+        await asyncio.sleep(collab.get_setting('BATCH_INTERVAL') * 5)
+        diverged = sum(
+            1 for typist in typists if typist.content != collab.hub.sessions[typist.file_id].content
+        )
+        await asyncio.gather(*(typist.disconnect() for typist in typists))
+        expected = {typist.file_id: typist.content for typist in typists}
+        stored = await sync_to_async(
+            lambda: dict(File.objects.filter(pk__in=file_ids).values_list('id', 'content'))
+        )()
+        not_persisted = sum(1 for file_id, content in expected.items() if stored[file_id] != content)
+
+        latencies = [latency for typist in typists for latency in typist.latencies]
+        keystrokes = len(typists) * options['keystrokes']
+        return {
+            'files': options['files'],
+            'typists': len(typists),
+            'keystrokes': keystrokes,
+            'ops_acked': len(latencies),
+            'seconds': round(elapsed, 3),
+            'keystrokes_per_second': round(keystrokes / elapsed, 1),
+            'ack_latency_ms': summarize_latencies(latencies),
+            'diverged_clients': diverged,
+            'files_not_persisted': not_persisted,
+        }
+
+    def seed(self, count):
+        user = User.objects.create_user('loadtest')
+        project = Project.objects.create(name='collab load test', owner=user)
+        files = File.objects.bulk_create(
+            File(name=f'file{i}.py', content='print("hello")\n', project=project) for i in range(count)
+        )
+        return Token.objects.create(user=user).key, [file.pk for file in files]
@@ -0,0 +1,191 @@
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from editor.management.commands.benchmark import summarize_latencies, synthetic_source
+from editor.models import File, Project, hash_content
+
+
+def profiles():
+    """Storage settings compared by the benchmark.
+
+    ``default`` is Django's stock SQLite setup: a rollback journal, deferred
+    transactions and a connection per request. ``production`` is what
+    settings.py configures.
+    """
+    database = settings.DATABASES['default']
+    return {
+        'default': {'options': {}, 'storage': {}, 'conn_max_age': 0},
+        'production': {
+            'options': dict(database.get('OPTIONS', {})),
+            'storage': dict(getattr(settings, 'SQLITE_STORAGE', {})),
+            'conn_max_age': database.get('CONN_MAX_AGE', 0),
+        },
+    }
+
+
+def use_profile(profile, path):
+    """Point this process's connection at ``path`` with ``profile``'s settings."""
+    connection.close()
+    connection.settings_dict.update(
+        NAME=path, OPTIONS=profile['options'], CONN_MAX_AGE=profile['conn_max_age'], CONN_HEALTH_CHECKS=False,
+    )
+    settings.SQLITE_STORAGE = profile['storage']
+
+
+def client(role, profile, path, file_ids, seconds, seed, results):
+    """One process reading or saving random files until the time is up."""
+    use_profile(profile, path)
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        file_id = rng.choice(file_ids)
+        begin = time.perf_counter()
+        try:
+            if role == 'reader':
+                File.objects.only('content', 'version').get(pk=file_id)
+            else:
+                save(file_id, rng)
+        except OperationalError:
+            errors += 1
+            # A request that failed still ends, and its connection with it
+            connection.close()
+        else:
+            latencies.append(time.perf_counter() - begin)
+        # What Django does at the end of every request
+        close_old_connections()
+    connection.close()
+    results.put((role, latencies, errors))
+
+
+def save(file_id, rng):
+    # Read-then-write, like a conditional save: the pattern that fails
+    # outright under deferred transactions when two writers meet
+    with transaction.atomic():
+        version = File.objects.filter(pk=file_id).values_list('version', flat=True).get()
+        content = synthetic_source(rng, 2000)
+        File.objects.filter(pk=file_id, version=version).update(
+            content=content, content_hash=hash_content(content), version=F('version') + 1, updated_at=timezone.now(),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Run reader and writer processes against the same SQLite file under the default and the '
+        'production storage settings and print throughput, latency and lock errors as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reading processes')
+        parser.add_argument('--writers', type=int, default=4, help='Saving processes')
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--files', type=int, default=200)
+        parser.add_argument('--file-size', type=int, default=2000, help='Characters per file')
+        parser.add_argument('--profiles', default='default,production')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        available = profiles()
+        names = options['profiles'].split(',')
+        for name in names:
+            if name not in available:
+                raise CommandError(f'Unknown profile "{name}"; choose from {", ".join(available)}')
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is for SQLite databases')
+
+        workdir = tempfile.mkdtemp(prefix='codeedit-contention-')
+        try:
+            seeded, file_ids = self.seed(workdir, options)
+            report = {
+                'config': {
+                    name: options[name] for name in ('readers', 'writers', 'seconds', 'files', 'file_size', 'seed')
+                },
+                'profiles': {},
+            }
+            for name in names:
+                path = os.path.join(workdir, f'{name}.sqlite3')
+                shutil.copyfile(seeded, path)
+                report['profiles'][name] = self.measure(available[name], path, file_ids, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if 'default' in report['profiles'] and 'production' in report['profiles']:
+            before = report['profiles']['default']['throughput_ops']
+            after = report['profiles']['production']['throughput_ops']
+            report['throughput_gain'] = round(after / before, 2) if before else None
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def seed(self, workdir, options):
+        """Migrate and fill a database file, left in rollback journal mode for copying."""
+        rng = random.Random(options['seed'])
+        path = os.path.join(workdir, 'seed.sqlite3')
+        connection.settings_dict['TEST']['NAME'] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user = User.objects.create_user('contention')
+            project = Project.objects.create(name='contention', owner=user)
+            files = File.objects.bulk_create(
+                File(name=f'module{i}.py', project=project, content=synthetic_source(rng, options['file_size']))
+                for i in range(options['files'])
+            )
+        finally:
+            connection.close()
+            connection.settings_dict['NAME'] = settings.DATABASES[connection.alias]['NAME'] = old_name
+        # WAL is a property of the file; each profile sets its own mode
+        with sqlite3.connect(path) as db:
+            db.execute('PRAGMA journal_mode = delete')
+        return path, [file.pk for file in files]
+
+    def measure(self, profile, path, file_ids, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        processes = [
+            context.Process(
+                target=client,
+                args=(role, profile, path, file_ids, options['seconds'], options['seed'] * 1000 + i, results),
+            )
+            for i, role in enumerate(roles)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = {'reader': ([], 0), 'writer': ([], 0)}
+        for _ in processes:
+            role, latencies, errors = results.get()
+            collected[role] = (collected[role][0] + latencies, collected[role][1] + errors)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        report = {}
+        for role, key in (('reader', 'reads'), ('writer', 'writes')):
+            latencies, errors = collected[role]
+            report[key] = {
+                'ops': len(latencies),
+                'ops_per_second': round(len(latencies) / elapsed, 1),
+                'errors': errors,
+                'latency_ms': summarize_latencies(latencies),
+            }
+        report['throughput_ops'] = round((report['reads']['ops'] + report['writes']['ops']) / elapsed, 1)
+        with sqlite3.connect(path) as db:
+            report['journal_mode'] = db.execute('PRAGMA journal_mode').fetchone()[0]
+        return report
@@ -0,0 +1,232 @@
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .scheduler import scheduler
+
+slow_logger = logging.getLogger('editor.metrics.slow')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_SECONDS': None,  # log requests slower than this, with their SQL
+    'SLOW_REQUEST_MAX_QUERIES': 50,  # SQL statements kept per request for that log
+}
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def get_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class RequestStats:
+    """What one request spent, collected while it runs."""
+
+    __slots__ = ('queries', 'sql_seconds', 'subprocess_seconds', 'statements')
+
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.subprocess_seconds = 0.0
+        self.statements = [] if capture_sql else None
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+@contextlib.contextmanager
+def subprocess_timer():
+    """Charge the time spent in the block to the current request's subprocess time."""
+    stats = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.subprocess_seconds += time.perf_counter() - started
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'count', 'seconds', 'queries', 'sql_seconds', 'response_bytes', 'subprocess_seconds', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.response_bytes = 0
+        self.subprocess_seconds = 0.0
+        self.statuses = {}
+
+
+class Registry:
+    """Per-process request metrics, keyed by (view, method)."""
+
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, method, status, seconds, stats, response_bytes):
+        with self.lock:
+            metrics = self.views.get((view, method))
+            if metrics is None:
+                metrics = self.views[(view, method)] = ViewMetrics()
+            metrics.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            metrics.count += 1
+            metrics.seconds += seconds
+            metrics.queries += stats.queries
+            metrics.sql_seconds += stats.sql_seconds
+            metrics.response_bytes += response_bytes
+            metrics.subprocess_seconds += stats.subprocess_seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            views = [(key, _copy(metrics)) for key, metrics in sorted(self.views.items())]
+
+        lines = [
+            '# HELP codeedit_request_duration_seconds Request latency by view.',
+            '# TYPE codeedit_request_duration_seconds histogram',
+        ]
+        for (view, method), metrics in views:
+            labels = f'view="{_escape(view)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), metrics.buckets):
+                cumulative += count
+                lines.append(f'codeedit_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'codeedit_request_duration_seconds_sum{{{labels}}} {metrics.seconds:.6f}')
+            lines.append(f'codeedit_request_duration_seconds_count{{{labels}}} {metrics.count}')
+
+        counters = [
+            ('codeedit_request_sql_queries_total', 'SQL queries run by requests.', 'queries', '{}'),
+            ('codeedit_request_sql_seconds_total', 'Time requests spent in SQL.', 'sql_seconds', '{:.6f}'),
+            ('codeedit_response_bytes_total', 'Response body bytes, excluding streaming responses.', 'response_bytes', '{}'),
+            ('codeedit_request_subprocess_seconds_total', 'Time requests spent waiting on code execution.', 'subprocess_seconds', '{:.6f}'),
+        ]
+        for name, help_text, field, template in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (view, method), metrics in views:
+                value = template.format(getattr(metrics, field))
+                lines.append(f'{name}{{view="{_escape(view)}",method="{method}"}} {value}')
+
+        lines.append('# HELP codeedit_responses_total Responses by status code.')
+        lines.append('# TYPE codeedit_responses_total counter')
+        for (view, method), metrics in views:
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'codeedit_responses_total{{view="{_escape(view)}",method="{method}",status="{status}"}} {count}')
+
+        execution = scheduler.stats()
+        lines += [
+            '# HELP codeedit_executions_running Executions holding a scheduler slot.',
+            '# TYPE codeedit_executions_running gauge',
+            f"codeedit_executions_running {execution['running']}",
+            '# HELP codeedit_executions_queued Executions waiting for a slot.',
+            '# TYPE codeedit_executions_queued gauge',
+            f"codeedit_executions_queued {execution['queued']}",
+            '# HELP codeedit_executions_rejected_total Executions turned away with a 429.',
+            '# TYPE codeedit_executions_rejected_total counter',
+            f"codeedit_executions_rejected_total {execution['rejected']}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+def _copy(metrics):
+    copy = ViewMetrics()
+    for field in ViewMetrics.__slots__:
+        value = getattr(metrics, field)
+        setattr(copy, field, value.copy() if isinstance(value, (list, dict)) else value)
+    return copy
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = Registry()
+
+
+def view_name(request):
+    """Label for the view that handled ``request``, e.g. ``FileViewSet.content``."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    if cls is None:
+        return match.view_name or func.__name__
+    actions = getattr(func, 'actions', None)
+    if actions:
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    # @api_view functions are wrapped in a class named after them
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """Records latency, SQL, response size and execution time per view.
+
+    SQL is counted with a database execute wrapper, so no DEBUG query log
+    is needed. When METRICS['SLOW_REQUEST_SECONDS'] is set, requests
+    slower than that are logged to ``editor.metrics.slow`` with their SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_setting('ENABLED'):
+            return self.get_response(request)
+
+        threshold = get_setting('SLOW_REQUEST_SECONDS')
+        stats = RequestStats(capture_sql=threshold is not None)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._count_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+
+        response_bytes = 0 if response.streaming else len(response.content)
+        view = view_name(request)
+        registry.observe(view, request.method, response.status_code, seconds, stats, response_bytes)
+        if threshold is not None and seconds >= threshold:
+            self._log_slow(request, view, response, seconds, stats)
+        return response
+
+    def _count_query(self, execute, sql, params, many, context):
+        stats = _current.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if stats is not None:
+                elapsed = time.perf_counter() - started
+                stats.queries += 1
+                stats.sql_seconds += elapsed
+                if stats.statements is not None and len(stats.statements) < get_setting('SLOW_REQUEST_MAX_QUERIES'):
+                    stats.statements.append((elapsed, sql))
+
+    def _log_slow(self, request, view, response, seconds, stats):
+        statements = '\n'.join(f'  {elapsed * 1000:.1f}ms {sql}' for elapsed, sql in stats.statements)
+        slow_logger.warning(
+            'Slow request %s %s (%s) -> %s in %.0fms: %d queries in %.0fms, %.0fms in subprocesses\n%s',
+            request.method, request.path, view, response.status_code, seconds * 1000,
+            stats.queries, stats.sql_seconds * 1000, stats.subprocess_seconds * 1000, statements,
+        )
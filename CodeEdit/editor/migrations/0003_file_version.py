@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0002_userpreferences_show_minimap_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0003_file_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["project", "updated_at"], name="file_project_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(fields=["owner", "updated_at"], name="project_owner_updated_idx"),
+        ),
+    ]
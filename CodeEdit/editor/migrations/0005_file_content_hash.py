@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:40
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_content_hash(apps, schema_editor):
+    File = apps.get_model("editor", "File")
+    batch = []
+    for file in File.objects.only("id", "content").iterator(chunk_size=500):
+        file.content_hash = hashlib.sha256(file.content.encode()).hexdigest()
+        batch.append(file)
+        if len(batch) >= 500:
+            File.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    if batch:
+        File.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0004_project_file_updated_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Trigram FTS5 index over File.content. It is an external-content table, so
+# it stores only the index and reads text back from editor_file. Triggers
+# keep it in sync for every write path, including bulk and queryset updates.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE editor_file_search USING fts5(
+        content, content='editor_file', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER editor_file_search_ai AFTER INSERT ON editor_file BEGIN
+        INSERT INTO editor_file_search(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER editor_file_search_ad AFTER DELETE ON editor_file BEGIN
+        INSERT INTO editor_file_search(editor_file_search, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER editor_file_search_au AFTER UPDATE OF content ON editor_file
+    WHEN old.content IS NOT new.content BEGIN
+        INSERT INTO editor_file_search(editor_file_search, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO editor_file_search(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO editor_file_search(editor_file_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS editor_file_search_au",
+    "DROP TRIGGER IF EXISTS editor_file_search_ad",
+    "DROP TRIGGER IF EXISTS editor_file_search_ai",
+    "DROP TABLE IF EXISTS editor_file_search",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0005_file_content_hash"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0006_file_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileRevision",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("number", models.PositiveIntegerField()),
+                ("kind", models.CharField(choices=[("snapshot", "Snapshot"), ("delta", "Delta")], max_length=10)),
+                ("depth", models.PositiveIntegerField(default=0)),
+                ("data", models.BinaryField()),
+                ("size", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("file", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="revisions", to="editor.file")),
+            ],
+            options={
+                "ordering": ["-number"],
+                "unique_together": {("file", "number")},
+            },
+        ),
+    ]
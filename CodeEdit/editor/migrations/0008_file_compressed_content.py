@@ -0,0 +1,86 @@
+import importlib
+
+from django.db import migrations
+
+import editor.compression
+
+# Compressed contents are BLOBs in editor_file.content. The search index
+# can't read them, so the triggers index those rows as empty text and
+# search treats every compressed file as a candidate, found through a
+# partial index. Altering the field is state-only: SQLite would otherwise
+# rebuild editor_file and drop its triggers.
+INDEXED = "CASE WHEN typeof({row}.content) = 'blob' THEN '' ELSE {row}.content END"
+
+CREATE_SQL = [
+    "DROP TRIGGER IF EXISTS editor_file_search_au",
+    "DROP TRIGGER IF EXISTS editor_file_search_ad",
+    "DROP TRIGGER IF EXISTS editor_file_search_ai",
+    f"""
+    CREATE TRIGGER editor_file_search_ai AFTER INSERT ON editor_file BEGIN
+        INSERT INTO editor_file_search(rowid, content) VALUES (new.id, {INDEXED.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_file_search_ad AFTER DELETE ON editor_file BEGIN
+        INSERT INTO editor_file_search(editor_file_search, rowid, content) VALUES ('delete', old.id, {INDEXED.format(row='old')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_file_search_au AFTER UPDATE OF content ON editor_file
+    WHEN old.content IS NOT new.content BEGIN
+        INSERT INTO editor_file_search(editor_file_search, rowid, content) VALUES ('delete', old.id, {INDEXED.format(row='old')});
+        INSERT INTO editor_file_search(rowid, content) VALUES (new.id, {INDEXED.format(row='new')});
+    END
+    """,
+    "CREATE INDEX editor_file_compressed_idx ON editor_file(id) WHERE typeof(content) = 'blob'",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS editor_file_compressed_idx",
+    "DROP TRIGGER IF EXISTS editor_file_search_au",
+    "DROP TRIGGER IF EXISTS editor_file_search_ad",
+    "DROP TRIGGER IF EXISTS editor_file_search_ai",
+]
+
+
+def compress_aware_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def plain_text_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    # Back to plain text, then the original triggers from 0006
+    original = importlib.import_module("editor.migrations.0006_file_search_index")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT id, content FROM editor_file WHERE typeof(content) = 'blob'")
+        for file_id, value in cursor.fetchall():
+            schema_editor.execute(
+                "UPDATE editor_file SET content = %s WHERE id = %s",
+                [editor.compression.unpack(value), file_id],
+            )
+    for statement in DROP_SQL + original.CREATE_SQL[1:]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0007_filerevision"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="file",
+                    name="content",
+                    field=editor.compression.CompressedTextField(blank=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(compress_aware_index, plain_text_index),
+    ]
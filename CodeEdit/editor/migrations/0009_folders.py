@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_folders(apps, schema_editor):
+    # Normalizes every path to "a/b", dropping "." and ".." segments, and
+    # creates the folders they imply. A path that would then collide with
+    # another file's keeps its old spelling but still gets its folder.
+    File = apps.get_model("editor", "File")
+    Folder = apps.get_model("editor", "Folder")
+    rows = list(File.objects.values_list("id", "project_id", "path", "name"))
+    taken = {(project_id, path, name) for _, project_id, path, name in rows}
+    folders = {}
+    batch = []
+    for file_id, project_id, path, name in rows:
+        parts = [part for part in path.split("/") if part and part not in (".", "..")]
+        parent_id = None
+        for depth in range(1, len(parts) + 1):
+            key = (project_id, "/".join(parts[:depth]))
+            if key not in folders:
+                folders[key] = Folder.objects.create(
+                    project_id=project_id, parent_id=parent_id, name=parts[depth - 1], path=key[1],
+                ).id
+            parent_id = folders[key]
+        normalized = "/".join(parts)
+        if normalized != path and (project_id, normalized, name) not in taken:
+            taken.add((project_id, normalized, name))
+            path = normalized
+        batch.append(File(id=file_id, path=path, folder_id=parent_id))
+    File.objects.bulk_update(batch, ["path", "folder"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0008_file_compressed_content"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Folder",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100)),
+                ("path", models.CharField(max_length=255)),
+                ("parent", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="children", to="editor.folder")),
+                ("project", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="folders", to="editor.project")),
+            ],
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="folder",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="files", to="editor.folder"),
+        ),
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["project", "folder", "name"], name="file_project_folder_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="folder",
+            index=models.Index(fields=["project", "parent", "name"], name="folder_project_parent_idx"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="folder",
+            unique_together={("project", "path")},
+        ),
+        migrations.RunPython(fill_folders, migrations.RunPython.noop),
+    ]
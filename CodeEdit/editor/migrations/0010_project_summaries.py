@@ -0,0 +1,154 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Project.file_count, total_size, last_file and last_edited_at and the
+# ProjectLanguage rows are maintained by triggers on editor_file, so every
+# write path (ORM saves, queryset and bulk updates, cascades) keeps them
+# exact within its own transaction. Sizes of compressed contents are read
+# from their header, as editor.compression.ContentLength does.
+SIZE = (
+    "CASE WHEN typeof({row}.content) = 'blob' "
+    "THEN CAST(substr({row}.content, 2, 10) AS INTEGER) ELSE length({row}.content) END"
+)
+
+# The newest remaining file of a project, from the (project, updated_at) index
+NEWEST_FILE = (
+    "(SELECT id, updated_at FROM editor_file WHERE project_id = {project} "
+    "ORDER BY updated_at DESC, id DESC LIMIT 1)"
+)
+
+# "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint
+ADD_LANGUAGE = """
+    INSERT INTO editor_projectlanguage(project_id, language, files) SELECT new.project_id, new.language, 1 WHERE true
+    ON CONFLICT(project_id, language) DO UPDATE SET files = files + 1;
+"""
+
+REMOVE_LANGUAGE = """
+    UPDATE editor_projectlanguage SET files = files - 1
+    WHERE project_id = old.project_id AND language = old.language;
+    DELETE FROM editor_projectlanguage WHERE project_id = old.project_id AND language = old.language AND files <= 0;
+"""
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER editor_project_summary_ai AFTER INSERT ON editor_file BEGIN
+        UPDATE editor_project SET file_count = file_count + 1, total_size = total_size + {SIZE.format(row="new")}
+        WHERE id = new.project_id;
+        {ADD_LANGUAGE}
+        UPDATE editor_project SET last_file_id = new.id, last_edited_at = new.updated_at
+        WHERE id = new.project_id AND (last_edited_at IS NULL OR last_edited_at <= new.updated_at);
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_project_summary_ad AFTER DELETE ON editor_file BEGIN
+        UPDATE editor_project SET file_count = file_count - 1, total_size = total_size - {SIZE.format(row="old")}
+        WHERE id = old.project_id;
+        {REMOVE_LANGUAGE}
+        UPDATE editor_project SET (last_file_id, last_edited_at) = {NEWEST_FILE.format(project="old.project_id")}
+        WHERE id = old.project_id AND last_file_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_project_summary_size_au AFTER UPDATE OF content, project_id ON editor_file
+    WHEN old.content IS NOT new.content OR old.project_id IS NOT new.project_id BEGIN
+        UPDATE editor_project SET total_size = total_size - {SIZE.format(row="old")} WHERE id = old.project_id;
+        UPDATE editor_project SET total_size = total_size + {SIZE.format(row="new")} WHERE id = new.project_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_project_summary_files_au AFTER UPDATE OF language, project_id ON editor_file
+    WHEN old.language IS NOT new.language OR old.project_id IS NOT new.project_id BEGIN
+        UPDATE editor_project SET file_count = file_count - 1 WHERE id = old.project_id;
+        UPDATE editor_project SET file_count = file_count + 1 WHERE id = new.project_id;
+        {REMOVE_LANGUAGE}
+        {ADD_LANGUAGE}
+    END
+    """,
+    f"""
+    CREATE TRIGGER editor_project_summary_edited_au AFTER UPDATE OF updated_at, project_id ON editor_file BEGIN
+        UPDATE editor_project SET last_file_id = new.id, last_edited_at = new.updated_at
+        WHERE id = new.project_id AND (last_edited_at IS NULL OR last_edited_at <= new.updated_at);
+        UPDATE editor_project SET (last_file_id, last_edited_at) = {NEWEST_FILE.format(project="old.project_id")}
+        WHERE id = old.project_id AND last_file_id = old.id AND old.project_id IS NOT new.project_id;
+    END
+    """,
+]
+
+FILL_SQL = [
+    f"""
+    UPDATE editor_project SET
+        file_count = (SELECT count(*) FROM editor_file AS f WHERE f.project_id = editor_project.id),
+        total_size = (SELECT coalesce(sum({SIZE.format(row="f")}), 0) FROM editor_file AS f WHERE f.project_id = editor_project.id),
+        (last_file_id, last_edited_at) = {NEWEST_FILE.format(project="editor_project.id")}
+    """,
+    """
+    INSERT INTO editor_projectlanguage(project_id, language, files)
+    SELECT project_id, language, count(*) FROM editor_file GROUP BY project_id, language
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS editor_project_summary_edited_au",
+    "DROP TRIGGER IF EXISTS editor_project_summary_files_au",
+    "DROP TRIGGER IF EXISTS editor_project_summary_size_au",
+    "DROP TRIGGER IF EXISTS editor_project_summary_ad",
+    "DROP TRIGGER IF EXISTS editor_project_summary_ai",
+]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in FILL_SQL + CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editor", "0009_folders"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="file_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="last_edited_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="last_file",
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name="+", to="editor.file"),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="total_size",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="ProjectLanguage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("language", models.CharField(max_length=50)),
+                ("files", models.IntegerField(default=0)),
+                ("project", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="languages", to="editor.project")),
+            ],
+            options={
+                "unique_together": {("project", "language")},
+            },
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
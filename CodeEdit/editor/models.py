@@ -1,30 +1,179 @@
-from django.db import models
+import contextlib
+import hashlib
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
+from .compression import CompressedTextField
+
+
+def hash_content(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
 class Project(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
+    # Summary of the project's files, kept up to date by SQLite triggers on
+    # editor_file (migration 0010) in the same transaction as each write
+    file_count = models.IntegerField(default=0, editable=False)
+    total_size = models.BigIntegerField(default=0, editable=False)  # characters
+    # The most recently updated file; the triggers move it on when it is deleted
+    last_file = models.ForeignKey(
+        'File', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, editable=False, related_name='+',
+    )
+    last_edited_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    SUMMARY_FIELDS = {'file_count', 'total_size', 'last_file', 'last_edited_at'}
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The summary columns belong to the triggers; an update writing back
+        # whatever this instance loaded would undo theirs
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.SUMMARY_FIELDS]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'updated_at'], name='project_owner_updated_idx'),
+        ]
+
+class Folder(models.Model):
+    """A directory of a project, as found in the paths of its files.
+
+    ``path`` is the full path without leading or trailing slashes; the
+    project root has no row, and a folder goes away with its last file. Files point at their folder, so listing a
+    directory reads only its own rows, and a folder's subtree is the range
+    of paths between ``path + '/'`` and ``path + '0'`` on the
+    (project, path) index.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='folders')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    name = models.CharField(max_length=100)
+    path = models.CharField(max_length=255)
+
+    def __str__(self):
+        return f"{self.project_id} - {self.path}"
+
+    class Meta:
+        unique_together = ('project', 'path')
+        indexes = [
+            models.Index(fields=['project', 'parent', 'name'], name='folder_project_parent_idx'),
+        ]
+
 class File(models.Model):
     name = models.CharField(max_length=100)
-    content = models.TextField(blank=True)
+    # Large contents are stored zlib-compressed (see editor/compression.py)
+    content = CompressedTextField(blank=True)
     language = models.CharField(max_length=50, default='python')
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='files')
     path = models.CharField(max_length=255, default='')
+    # Kept in step with path; null for files at the project root. A folder
+    # can't be deleted from under its files, only along with its project
+    folder = models.ForeignKey(Folder, on_delete=models.RESTRICT, null=True, blank=True, related_name='files')
+    version = models.PositiveIntegerField(default=0)
+    # SHA-256 of content, kept in sync on every write and used as the ETag
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() only resolves the folder when the path moves
+        instance._loaded_path = instance.__dict__.get('path')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        vacated = None
+        if 'content' not in self.get_deferred_fields() and (update_fields is None or 'content' in update_fields):
+            self.content_hash = hash_content(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        if 'path' not in self.get_deferred_fields() and (update_fields is None or 'path' in update_fields):
+            if self._state.adding or self.path != getattr(self, '_loaded_path', None):
+                from .folders import assign_folders
+                if not self._state.adding:
+                    vacated = self.folder_id
+                assign_folders(self.project_id, [self])
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'folder'}
+        moved = vacated is not None and vacated != self.folder_id
+        with transaction.atomic() if moved else contextlib.nullcontext():
+            super().save(*args, **kwargs)
+            if moved:
+                from .folders import prune_folders
+                prune_folders([vacated])
+        self._loaded_path = self.path
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            from .folders import prune_folders
+            prune_folders([self.folder_id])
+        return deleted
+
     class Meta:
         unique_together = ('project', 'path', 'name')
+        indexes = [
+            models.Index(fields=['project', 'updated_at'], name='file_project_updated_idx'),
+            models.Index(fields=['project', 'folder', 'name'], name='file_project_folder_idx'),
+        ]
+
+class ProjectLanguage(models.Model):
+    """Number of files of a project per language, kept by the same triggers as Project.file_count."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='languages')
+    language = models.CharField(max_length=50)
+    files = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.project_id} - {self.language}"
+
+    class Meta:
+        unique_together = ('project', 'language')
+
+class FileRevision(models.Model):
+    """A stored version of a file's content, as a full snapshot or a delta.
+
+    Deltas are zlib-compressed edits against the previous stored revision
+    of the same file; ``depth`` counts deltas since the last snapshot and
+    bounds how many must be applied to rebuild a revision.
+    """
+    SNAPSHOT = 'snapshot'
+    DELTA = 'delta'
+    KIND_CHOICES = [(SNAPSHOT, 'Snapshot'), (DELTA, 'Delta')]
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    depth = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_id} r{self.number} ({self.kind})"
+
+    class Meta:
+        unique_together = ('file', 'number')
+        ordering = ['-number']
 
 class UserPreferences(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='preferences')
@@ -0,0 +1,31 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views answer ``Accept: text/event-stream`` requests.
+
+    Streaming views return a StreamingHttpResponse directly, so this only
+    renders error payloads such as 404s.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f'event: error\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Plain text for the metrics endpoint; error payloads become comments."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode()
+        return f'# {json.dumps(data)}\n'.encode()
@@ -0,0 +1,118 @@
+import functools
+import hashlib
+import subprocess
+import threading
+
+from django.core.cache import caches
+
+from . import execution
+from .lru import LRUCache
+from .transpile import TranspilerUnavailable, transpiler
+
+
+@functools.lru_cache(maxsize=None)
+def runtime_version(language):
+    """Version string of the interpreter that runs ``language``, read once per process."""
+    setting = 'PYTHON' if language == 'python' else 'NODE'
+    try:
+        process = subprocess.run(
+            [execution.get_setting(setting), '--version'],
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unknown'
+    return (process.stdout or process.stderr).strip()
+
+
+def make_key(language, code, stdin=''):
+    # TypeScript keeps its own name: it is compiled before it runs, and
+    # runs as plain JavaScript while there is no compiler
+    runtime = runtime_version(execution.resolve_language(language))
+    if language == 'typescript':
+        try:
+            runtime += f' / {transpiler.version()}'
+        except TranspilerUnavailable:
+            runtime += ' / no compiler'
+    code_hash = hashlib.sha256(code.encode()).hexdigest()
+    stdin_hash = hashlib.sha256(stdin.encode()).hexdigest()
+    return f'exec:{language}:{runtime}:{code_hash}:{stdin_hash}'
+
+
+class ResultCache:
+    """Execution results keyed by language, runtime version, code and stdin.
+
+    Backed by an in-process LRU by default, or by a Django cache when
+    CODE_EXECUTION['CACHE_ALIAS'] is set so several processes share it.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._local = None
+
+    @property
+    def backend(self):
+        alias = execution.get_setting('CACHE_ALIAS')
+        if alias:
+            return caches[alias]
+        if self._local is None:
+            self._local = LRUCache(execution.get_setting('CACHE_SIZE'), execution.get_setting('CACHE_TTL'))
+        return self._local
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, result):
+        value = {
+            'stdout': result.stdout,
+            'stderr': result.stderr,
+            'returncode': result.returncode,
+            'truncated': result.truncated,
+        }
+        self.backend.set(key, value, execution.get_setting('CACHE_TTL'))
+
+    def stats(self):
+        backend = self.backend
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'backend': 'local' if isinstance(backend, LRUCache) else execution.get_setting('CACHE_ALIAS'),
+            'size': len(backend) if isinstance(backend, LRUCache) else None,
+            'capacity': backend.size if isinstance(backend, LRUCache) else None,
+        }
+
+
+result_cache = ResultCache()
+
+
+def cacheable(result):
+    """Whether ``result`` depends only on the code and stdin.
+
+    Timeouts, crashes and signals (rlimit kills, the output cap) come from
+    the state of the host as much as from the program, so they are never
+    stored.
+    """
+    return not result.timed_out and not result.crashed and result.returncode >= 0
+
+
+def run_cached(language, code, stdin='', user_id=None):
+    """Run code through the result cache.
+
+    Returns ``(result, cached)``. Only results that pass ``cacheable`` are
+    stored. Only cache misses go through the execution scheduler.
+    """
+    key = make_key(language, code, stdin)
+    value = result_cache.get(key)
+    if value is not None:
+        return execution.ExecutionResult(**value), True
+    result = execution.run_code(language, code, stdin, user_id)
+    if cacheable(result):
+        result_cache.set(key, result)
+    return result, False
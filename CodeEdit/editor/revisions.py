@@ -0,0 +1,196 @@
+import difflib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .lru import LRUCache
+from .models import FileRevision
+
+DEFAULTS = {
+    'SNAPSHOT_INTERVAL': 20,  # at most this many deltas between snapshots
+    'KEEP': 200,  # revisions kept per file
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'FILE_REVISIONS', {}).get(name, DEFAULTS[name])
+
+
+# Latest recorded (number, content) per file, so recording a new revision
+# rarely has to rebuild the previous one from the store
+_latest = LRUCache(size=512, ttl=600)
+
+
+def make_delta(old, new):
+    """Encode ``new`` as the span of ``old`` that changed.
+
+    The delta is ``[prefix, suffix, text]``: keep ``prefix`` leading and
+    ``suffix`` trailing characters of ``old`` and put ``text`` between
+    them, so its size follows the edited region, not the file.
+    """
+    limit = min(len(old), len(new))
+    prefix = _common_length(lambda n: old[:n] == new[:n], limit)
+    suffix = _common_length(lambda n: old[len(old) - n:] == new[len(new) - n:], limit - prefix)
+    return [prefix, suffix, new[prefix:len(new) - suffix]]
+
+
+def _common_length(matches, limit):
+    # Binary search on slice comparisons, which run at C speed
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if matches(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def apply_delta(old, delta):
+    prefix, suffix, text = delta
+    return old[:prefix] + text + old[len(old) - suffix:]
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value).encode())
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def rebuild(file_id, number):
+    """Return the content of revision ``number``, or None if it isn't stored.
+
+    Walks back to the nearest snapshot, so at most SNAPSHOT_INTERVAL deltas
+    are applied.
+    """
+    chain = []
+    revisions = FileRevision.objects.filter(file_id=file_id, number__lte=number).order_by('-number')
+    for revision in revisions.only('number', 'kind', 'data')[:get_setting('SNAPSHOT_INTERVAL') + 1]:
+        if not chain and revision.number != number:
+            return None
+        chain.append(revision)
+        if revision.kind == FileRevision.SNAPSHOT:
+            break
+    if not chain or chain[-1].kind != FileRevision.SNAPSHOT:
+        return None
+
+    content = _unpack(chain[-1].data)
+    for revision in reversed(chain[:-1]):
+        content = apply_delta(content, _unpack(revision.data))
+    return content
+
+
+def record(file_id, number, content):
+    """Store ``content`` as revision ``number`` of the file.
+
+    A delta against the previous stored revision is used unless the chain
+    since the last snapshot is full or the delta would not be smaller.
+    Numbers at or below the latest stored revision are ignored.
+    """
+    latest = FileRevision.objects.filter(file_id=file_id).order_by('-number').only('number', 'depth').first()
+    if latest is not None and latest.number >= number:
+        return None
+
+    snapshot = _pack(content)
+    kind, depth, data = FileRevision.SNAPSHOT, 0, snapshot
+    if latest is not None and latest.depth + 1 < get_setting('SNAPSHOT_INTERVAL'):
+        cached = _latest.get(file_id)
+        previous = cached[1] if cached and cached[0] == latest.number else rebuild(file_id, latest.number)
+        if previous is not None:
+            delta = _pack(make_delta(previous, content))
+            if len(delta) < len(snapshot):
+                kind, depth, data = FileRevision.DELTA, latest.depth + 1, delta
+
+    try:
+        with transaction.atomic():
+            revision = FileRevision.objects.create(
+                file_id=file_id, number=number, kind=kind, depth=depth, data=data, size=len(data)
+            )
+    except IntegrityError:
+        # Another writer recorded this number first
+        return None
+    _latest.set(file_id, (number, content))
+    # Snapshots come every SNAPSHOT_INTERVAL revisions at most, which makes
+    # them a cheap point to apply the retention policy
+    if kind == FileRevision.SNAPSHOT and latest is not None:
+        compact(file_id)
+    return revision
+
+
+def record_many(files):
+    """Record the current content of several saved File instances.
+
+    Files with no history yet (e.g. just created or imported) get their
+    first snapshot in a single bulk insert.
+    """
+    files = list(files)
+    with_history = set(
+        FileRevision.objects.filter(file_id__in=[file.pk for file in files]).values_list('file_id', flat=True).distinct()
+    )
+    first = []
+    for file in files:
+        if file.pk in with_history:
+            record(file.pk, file.version, file.content)
+        else:
+            data = _pack(file.content)
+            first.append(FileRevision(
+                file_id=file.pk, number=file.version, kind=FileRevision.SNAPSHOT, depth=0, data=data, size=len(data)
+            ))
+    FileRevision.objects.bulk_create(first, ignore_conflicts=True)
+
+
+def compact(file_id):
+    """Drop revisions beyond the newest KEEP.
+
+    The oldest kept revision is rewritten as a snapshot first, so the
+    deltas above it never depend on a deleted revision.
+    """
+    keep = list(
+        FileRevision.objects.filter(file_id=file_id).order_by('-number').values_list('number', flat=True)[:get_setting('KEEP')]
+    )
+    if len(keep) < get_setting('KEEP'):
+        return 0
+    oldest = keep[-1]
+    with transaction.atomic():
+        revision = FileRevision.objects.get(file_id=file_id, number=oldest)
+        if revision.kind != FileRevision.SNAPSHOT:
+            content = rebuild(file_id, oldest)
+            revision.kind, revision.depth = FileRevision.SNAPSHOT, 0
+            revision.data = _pack(content)
+            revision.size = len(revision.data)
+            revision.save(update_fields=['kind', 'depth', 'data', 'size'])
+            # Later deltas now count their depth from the new snapshot
+            _renumber_depths(file_id, oldest)
+        deleted, _ = FileRevision.objects.filter(file_id=file_id, number__lt=oldest).delete()
+    return deleted
+
+
+def _renumber_depths(file_id, start):
+    depth = 0
+    updates = []
+    for revision in FileRevision.objects.filter(file_id=file_id, number__gt=start).order_by('number').only('id', 'kind', 'depth'):
+        if revision.kind == FileRevision.SNAPSHOT:
+            break
+        depth += 1
+        if revision.depth != depth:
+            revision.depth = depth
+            updates.append(revision)
+    FileRevision.objects.bulk_update(updates, ['depth'])
+
+
+def diff(file_id, old_number, new_number, name=''):
+    """Unified diff between two stored revisions, or None if either is missing."""
+    old = rebuild(file_id, old_number)
+    new = rebuild(file_id, new_number)
+    if old is None or new is None:
+        return None
+    return ''.join(difflib.unified_diff(
+        old.splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        fromfile=f'{name}@{old_number}',
+        tofile=f'{name}@{new_number}',
+    ))
@@ -0,0 +1,154 @@
+// Warm Node.js runner used by editor.execution.
+//
+// Node cannot fork, so each worker is started ahead of time, runs exactly one
+// framed job from stdin as the main module and replies with a framed JSON
+// result on the reply fd when the process exits. The pool replaces it afterwards.
+'use strict';
+
+const fs = require('fs');
+const path = require('path');
+const Module = require('module');
+const { Readable } = require('stream');
+
+// The reply gets a pipe of its own, as the program may write to fd 1
+// directly (or hand it to a child), which goes to /dev/null instead
+const REPLY_FD = Number(process.env.CODEEDIT_REPLY_FD);
+delete process.env.CODEEDIT_REPLY_FD;
+
+// Output of one stream, keeping at most `limit` bytes: the first three
+// quarters of the limit hold the start, the rest a rolling window over the
+// end (same scheme as Capture in python_worker.py).
+class Capture {
+  constructor() {
+    this.limit = 0;
+    this.head = [];
+    this.headSize = 0;
+    this.tail = Buffer.alloc(0);
+    this.total = 0;
+  }
+
+  get exceeded() {
+    return this.limit > 0 && this.total > this.limit;
+  }
+
+  push(chunk) {
+    let data = Buffer.isBuffer(chunk) ? chunk : Buffer.from(String(chunk));
+    this.total += data.length;
+    const tailSize = this.limit ? Math.floor(this.limit / 4) : 0;
+    const room = this.limit ? this.limit - tailSize - this.headSize : data.length;
+    if (room > 0) {
+      this.head.push(data.subarray(0, room));
+      this.headSize += Math.min(room, data.length);
+      data = data.subarray(room);
+    }
+    if (data.length) {
+      this.tail = Buffer.concat([this.tail, data]);
+      this.tail = this.tail.subarray(Math.max(0, this.tail.length - tailSize));
+    }
+  }
+
+  text() {
+    const head = Buffer.concat(this.head).toString();
+    if (!this.exceeded) return head + this.tail.toString();
+    const dropped = this.total - this.headSize - this.tail.length;
+    return head
+      + `\n... [output truncated: ${dropped} bytes omitted, program stopped after ${this.limit} bytes] ...\n`
+      + this.tail.toString();
+  }
+}
+
+const stdout = new Capture();
+const stderr = new Capture();
+let replied = false;
+
+function reply(code) {
+  if (replied) return;
+  replied = true;
+  const body = Buffer.from(JSON.stringify({
+    stdout: stdout.text(),
+    stderr: stderr.text(),
+    returncode: code,
+    truncated: stdout.exceeded || stderr.exceeded,
+  }));
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  writeAll(REPLY_FD, Buffer.concat([header, body]));
+}
+
+// writeSync on a pipe can write part of the buffer, or fail with EAGAIN
+// while the pool has yet to read, so keep going until all of it is out
+function writeAll(fd, data) {
+  const pause = new Int32Array(new SharedArrayBuffer(4));
+  let offset = 0;
+  while (offset < data.length) {
+    try {
+      offset += fs.writeSync(fd, data, offset, data.length - offset);
+    } catch (err) {
+      if (err.code !== 'EAGAIN') throw err;
+      Atomics.wait(pause, 0, 0, 1);
+    }
+  }
+}
+
+// Hide the runner's own frames so traces start at the user's code
+function userStack(err) {
+  if (!err || !err.stack) return String(err);
+  return err.stack
+    .split('\n')
+    .filter((line) => !line.includes(__filename) && !line.includes('(node:'))
+    .join('\n');
+}
+
+function capture(output) {
+  return (chunk, encoding, callback) => {
+    output.push(chunk);
+    if (output.exceeded) {
+      // Stop the program right here, like the Python runner kills its child.
+      // reply() returns once the whole frame is in the pipe, so the kill
+      // can't cut it short.
+      reply(-9);
+      process.kill(process.pid, 'SIGKILL');
+    }
+    const done = typeof encoding === 'function' ? encoding : callback;
+    if (done) done();
+    return true;
+  };
+}
+
+function run(job) {
+  stdout.limit = stderr.limit = job.output_limit || 0;
+  process.stdout.write = capture(stdout);
+  process.stderr.write = capture(stderr);
+  Object.defineProperty(process, 'stdin', { value: Readable.from([job.stdin || '']) });
+
+  process.on('exit', (code) => reply(code));
+  process.on('uncaughtException', (err) => {
+    stderr.push(userStack(err) + '\n');
+    process.exit(1);
+  });
+
+  // Project runs start in the project's workspace, with require() of
+  // relative paths resolving from the entry file
+  if (job.cwd) process.chdir(job.cwd);
+  const filename = path.join(process.cwd(), job.filename || 'main.js');
+  const main = new Module(filename, null);
+  main.filename = filename;
+  main.paths = Module._nodeModulePaths(path.dirname(filename));
+  process.mainModule = main;
+  main._compile(job.code, filename);
+}
+
+let pending = Buffer.alloc(0);
+process.stdin.on('data', (chunk) => {
+  pending = Buffer.concat([pending, chunk]);
+  if (pending.length < 4) return;
+  const size = pending.readUInt32BE(0);
+  if (pending.length < 4 + size) return;
+  const job = JSON.parse(pending.subarray(4, 4 + size).toString());
+  process.stdin.removeAllListeners('data');
+  process.stdin.destroy();
+  run(job);
+});
+process.stdin.on('end', () => {
+  if (!replied && pending.length === 0) process.exit(0);
+});
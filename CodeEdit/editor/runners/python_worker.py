@@ -0,0 +1,216 @@
+"""Warm Python runner used by editor.execution.
+
+The worker starts once, then loops reading framed jobs from stdin. Each job
+is executed in a forked child so jobs never see each other's state, and the
+captured output is sent back as a framed JSON reply on the reply fd given
+by editor.execution, which the children don't inherit.
+"""
+import json
+import os
+import resource
+import selectors
+import signal
+import struct
+import sys
+import threading
+import traceback
+
+HEADER = struct.Struct('>I')
+REPLY_FD = int(os.environ.pop('CODEEDIT_REPLY_FD'))
+
+
+def read_exact(fd, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = os.read(fd, size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def write_frame(fd, payload):
+    data = json.dumps(payload).encode()
+    data = HEADER.pack(len(data)) + data
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def apply_limits(limits):
+    # Mirrors editor.execution.apply_limits; the runner can't import Django code
+    if limits.get('nice'):
+        os.nice(limits['nice'])
+    if limits.get('cpu'):
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu'], limits['cpu'] + 1))
+    if limits.get('memory'):
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory'], limits['memory']))
+    if limits.get('processes'):
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits['processes'], limits['processes']))
+
+
+def run_child(code, limits, cwd=None, filename=None):
+    try:
+        apply_limits(limits or {})
+    except OSError as e:
+        print(f'Could not apply resource limits: {e}', file=sys.stderr)
+        os._exit(1)
+    filename = filename or 'main.py'
+    sys.path[0] = ''
+    if cwd:
+        # A project run: the entry file's imports resolve against the
+        # project's workspace, which must not collect __pycache__ dirs
+        os.chdir(cwd)
+        filename = os.path.join(cwd, filename)
+        sys.path[0] = os.path.dirname(filename)
+        sys.dont_write_bytecode = True
+    sys.argv = [filename]
+    namespace = {'__name__': '__main__', '__file__': filename, '__builtins__': __builtins__}
+    exit_code = 0
+    try:
+        exec(compile(code, filename, 'exec'), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        # Drop the worker's own frame so the traceback starts at user code
+        traceback.print_exception(etype, value, tb.tb_next)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+    os._exit(exit_code)
+
+
+class Capture:
+    """Output of one stream, keeping at most ``limit`` bytes.
+
+    The first three quarters of the limit hold the start of the output and
+    the rest a rolling window over its end, so a runaway program still
+    shows both what it printed first and what it printed last.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.tail_size = limit // 4 if limit else 0
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    @property
+    def exceeded(self):
+        return bool(self.limit) and self.total > self.limit
+
+    def add(self, data):
+        self.total += len(data)
+        room = self.limit - self.tail_size - len(self.head) if self.limit else len(data)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            del self.tail[:-self.tail_size]
+
+    def text(self):
+        if not self.exceeded:
+            return (self.head + self.tail).decode(errors='replace')
+        dropped = self.total - len(self.head) - len(self.tail)
+        marker = f'\n... [output truncated: {dropped} bytes omitted, program stopped after {self.limit} bytes] ...\n'
+        return self.head.decode(errors='replace') + marker + self.tail.decode(errors='replace')
+
+
+def collect(pid, out_r, err_r, limit):
+    """Read the child's output until both pipes close.
+
+    The child is killed as soon as either stream goes over ``limit``, so a
+    runaway print loop can't grow the worker. Anything it spawned still
+    holding the pipes is left to the job timeout, which kills the worker's
+    whole process group.
+    """
+    captures = {out_r: Capture(limit), err_r: Capture(limit)}
+    sel = selectors.DefaultSelector()
+    sel.register(out_r, selectors.EVENT_READ)
+    sel.register(err_r, selectors.EVENT_READ)
+    open_fds = 2
+    killed = False
+    while open_fds:
+        for key, _ in sel.select():
+            data = os.read(key.fd, 65536)
+            if data:
+                capture = captures[key.fd]
+                capture.add(data)
+                if capture.exceeded and not killed:
+                    killed = True
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            else:
+                sel.unregister(key.fd)
+                open_fds -= 1
+    sel.close()
+    return captures[out_r], captures[err_r]
+
+
+def feed(fd, data):
+    try:
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def serve():
+    while True:
+        header = read_exact(0, HEADER.size)
+        if header is None:
+            return
+        body = read_exact(0, HEADER.unpack(header)[0])
+        if body is None:
+            return
+        job = json.loads(body)
+
+        in_r, in_w = os.pipe()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.dup2(in_r, 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            for fd in (in_r, in_w, out_r, out_w, err_r, err_w, REPLY_FD):
+                os.close(fd)
+            run_child(job['code'], job.get('limits'), job.get('cwd'), job.get('filename'))
+
+        for fd in (in_r, out_w, err_w):
+            os.close(fd)
+        writer = threading.Thread(target=feed, args=(in_w, job.get('stdin', '').encode()))
+        writer.start()
+        stdout, stderr = collect(pid, out_r, err_r, job.get('output_limit'))
+        os.close(out_r)
+        os.close(err_r)
+        writer.join()
+        _, status = os.waitpid(pid, 0)
+
+        write_frame(REPLY_FD, {
+            'stdout': stdout.text(),
+            'stderr': stderr.text(),
+            'returncode': os.waitstatus_to_exitcode(status),
+            'truncated': stdout.exceeded or stderr.exceeded,
+        })
+
+
+if __name__ == '__main__':
+    serve()
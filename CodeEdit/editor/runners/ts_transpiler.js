@@ -0,0 +1,166 @@
+// Long-lived TypeScript transpiler and syntax checker, used by
+// editor.transpile and editor.diagnostics.
+//
+// Reads framed jobs from stdin and answers each with a framed JSON reply on
+// the reply fd, like the other runners, but stays up between jobs so the compiler
+// is loaded once. It uses the `typescript` package when node can resolve
+// it, and otherwise the type stripping built into Node 22.13+. Checking
+// JavaScript needs neither: it is only parsed, never run.
+'use strict';
+
+const fs = require('fs');
+const vm = require('vm');
+const Module = require('module');
+
+// Replies go to their own pipe (see editor.execution.Worker)
+const REPLY_FD = Number(process.env.CODEEDIT_REPLY_FD);
+delete process.env.CODEEDIT_REPLY_FD;
+
+// Arguments of the wrapper node puts around every CommonJS module
+const COMMONJS_PARAMS = ['exports', 'require', 'module', '__filename', '__dirname'];
+
+class CompileFailure extends Error {
+  constructor(diagnostics) {
+    super(diagnostics.map((d) => d.message).join('\n'));
+    this.diagnostics = diagnostics;
+  }
+}
+
+// Position of a SyntaxError from V8 or the type stripper, read from its
+// stack: "file:LINE", the source line, then carets under the bad token.
+function syntaxDiagnostic(err) {
+  const lines = String(err.stack || '').split('\n');
+  const match = /:(\d+)$/.exec(lines[0] || '');
+  const carets = lines.slice(1, 4).find((line) => /^\s*\^+\s*$/.test(line));
+  const diagnostic = { line: match ? Number(match[1]) : null, column: null, message: err.message };
+  if (match && carets) {
+    diagnostic.column = carets.indexOf('^') + 1;
+    diagnostic.end_line = diagnostic.line;
+    diagnostic.end_column = carets.lastIndexOf('^') + 2;
+  }
+  return diagnostic;
+}
+
+function loadCompiler() {
+  try {
+    const ts = require('typescript');
+    const options = {
+      module: ts.ModuleKind.CommonJS,
+      target: ts.ScriptTarget.ES2022,
+      esModuleInterop: true,
+      sourceMap: false,
+    };
+    return {
+      name: `typescript ${ts.version}`,
+      compile(source, fileName) {
+        const output = ts.transpileModule(source, { compilerOptions: options, fileName, reportDiagnostics: true });
+        const errors = (output.diagnostics || [])
+          .filter((d) => d.category === ts.DiagnosticCategory.Error)
+          .map((d) => {
+            const diagnostic = { line: null, column: null, message: `TS${d.code}: ${ts.flattenDiagnosticMessageText(d.messageText, '\n')}` };
+            if (d.file && d.start !== undefined) {
+              const start = d.file.getLineAndCharacterOfPosition(d.start);
+              const end = d.file.getLineAndCharacterOfPosition(d.start + (d.length || 0));
+              Object.assign(diagnostic, {
+                line: start.line + 1, column: start.character + 1, end_line: end.line + 1, end_column: end.character + 1,
+              });
+            }
+            return diagnostic;
+          });
+        if (errors.length) throw new CompileFailure(errors);
+        return output.outputText;
+      },
+    };
+  } catch (err) {
+    if (err.code !== 'MODULE_NOT_FOUND') throw err;
+  }
+  if (typeof Module.stripTypeScriptTypes === 'function') {
+    return {
+      name: `node ${process.version} strip-types`,
+      compile(source) {
+        try {
+          // 'transform' also handles enums and namespaces, which need code
+          return Module.stripTypeScriptTypes(source, { mode: 'transform' });
+        } catch (err) {
+          if (err.code !== 'ERR_INVALID_TYPESCRIPT_SYNTAX' && !(err instanceof SyntaxError)) throw err;
+          throw new CompileFailure([syntaxDiagnostic(err)]);
+        }
+      },
+    };
+  }
+  return null;
+}
+
+const compiler = loadCompiler();
+
+function reply(payload) {
+  const body = Buffer.from(JSON.stringify(payload));
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  writeAll(REPLY_FD, Buffer.concat([header, body]));
+}
+
+// Same as in node_worker.js: a write to the pipe can be partial or fail
+// with EAGAIN when the reader is behind, so loop until the frame is out
+function writeAll(fd, data) {
+  const pause = new Int32Array(new SharedArrayBuffer(4));
+  let offset = 0;
+  while (offset < data.length) {
+    try {
+      offset += fs.writeSync(fd, data, offset, data.length - offset);
+    } catch (err) {
+      if (err.code !== 'EAGAIN') throw err;
+      Atomics.wait(pause, 0, 0, 1);
+    }
+  }
+}
+
+// Syntax errors in `source`, parsed the way node_worker.js runs it
+function check(source, language, fileName) {
+  if (language === 'typescript') {
+    if (!compiler) return null;
+    try {
+      source = compiler.compile(source, fileName);
+    } catch (err) {
+      if (err instanceof CompileFailure) return err.diagnostics;
+      throw err;
+    }
+  }
+  try {
+    vm.compileFunction(source, COMMONJS_PARAMS, { filename: fileName });
+  } catch (err) {
+    if (!(err instanceof SyntaxError)) throw err;
+    return [syntaxDiagnostic(err)];
+  }
+  return [];
+}
+
+function handle(job) {
+  const fileName = job.filename || 'main.ts';
+  if (job.check) {
+    const diagnostics = check(job.source, job.language, fileName);
+    if (diagnostics === null) return reply({ compiler: null, error: 'No TypeScript compiler available' });
+    return reply({ compiler: compiler && compiler.name, diagnostics });
+  }
+  if (!compiler) return reply({ compiler: null, error: 'No TypeScript compiler available' });
+  if (job.source === undefined) return reply({ compiler: compiler.name });
+  try {
+    reply({ compiler: compiler.name, code: compiler.compile(job.source, fileName) });
+  } catch (err) {
+    const diagnostics = err instanceof CompileFailure ? err.diagnostics : [{ line: null, column: null, message: String(err.message || err) }];
+    reply({ compiler: compiler.name, diagnostics });
+  }
+}
+
+let pending = Buffer.alloc(0);
+process.stdin.on('data', (chunk) => {
+  pending = Buffer.concat([pending, chunk]);
+  while (pending.length >= 4) {
+    const size = pending.readUInt32BE(0);
+    if (pending.length < 4 + size) return;
+    const job = JSON.parse(pending.subarray(4, 4 + size).toString());
+    pending = pending.subarray(4 + size);
+    handle(job);
+  }
+});
+process.stdin.on('end', () => process.exit(0));
@@ -0,0 +1,141 @@
+import collections
+import contextlib
+import math
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'MAX_CONCURRENT': 4,  # executions running at once in this process
+    'MAX_PER_USER': 2,  # of which one user may hold this many
+    'QUEUE_SIZE': 8,  # requests waiting for a slot, across users
+    'MAX_QUEUED_PER_USER': 2,  # of which one user may have this many
+    'QUEUE_TIMEOUT': 3,  # seconds a request waits before being turned away
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'CODE_EXECUTION', {}).get(name, DEFAULTS[name])
+
+
+class Saturated(Exception):
+    """No execution slot is available; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Too many executions in progress, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class ExecutionScheduler:
+    """Bounded, fair admission for code execution.
+
+    At most MAX_CONCURRENT executions run at once and at most MAX_PER_USER
+    for any one user. Requests beyond that wait in a short queue, and
+    freed slots go round-robin across the users waiting, so one user
+    clicking Run repeatedly can't starve the others. When the queue is
+    full, or a request has waited QUEUE_TIMEOUT, Saturated is raised right
+    away so the caller can answer 429 instead of piling up workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.running_by_user = collections.Counter()
+        # user id -> waiters in arrival order; dict order is the round-robin
+        self.waiting = collections.OrderedDict()
+        self.queued = 0
+        self.rejected = 0
+        # Moving average of execution time, for Retry-After
+        self.average_seconds = 1.0
+
+    def _can_run(self, user_id):
+        return self.running < get_setting('MAX_CONCURRENT') and self.running_by_user[user_id] < get_setting('MAX_PER_USER')
+
+    def _grant(self, user_id):
+        self.running += 1
+        self.running_by_user[user_id] += 1
+
+    def retry_after(self):
+        slots = get_setting('MAX_CONCURRENT')
+        return max(1, math.ceil(self.average_seconds * (self.queued + 1) / slots))
+
+    def acquire(self, user_id, wait=True):
+        """Take an execution slot for ``user_id``, raising Saturated if none comes free."""
+        with self.lock:
+            if user_id not in self.waiting and self._can_run(user_id):
+                self._grant(user_id)
+                return
+            if (
+                not wait
+                or self.queued >= get_setting('QUEUE_SIZE')
+                or len(self.waiting.get(user_id, ())) >= get_setting('MAX_QUEUED_PER_USER')
+            ):
+                self.rejected += 1
+                raise Saturated(self.retry_after())
+            waiter = _Waiter()
+            self.waiting.setdefault(user_id, collections.deque()).append(waiter)
+            self.queued += 1
+
+        waiter.event.wait(get_setting('QUEUE_TIMEOUT'))
+        with self.lock:
+            if waiter.granted:
+                return
+            queue = self.waiting[user_id]
+            queue.remove(waiter)
+            if not queue:
+                del self.waiting[user_id]
+            self.queued -= 1
+            self.rejected += 1
+            raise Saturated(self.retry_after())
+
+    def release(self, user_id, seconds=None):
+        with self.lock:
+            self.running -= 1
+            self.running_by_user[user_id] -= 1
+            if not self.running_by_user[user_id]:
+                del self.running_by_user[user_id]
+            if seconds is not None:
+                self.average_seconds = 0.8 * self.average_seconds + 0.2 * seconds
+            self._dispatch()
+
+    def _dispatch(self):
+        while self.waiting:
+            user_id = next((user for user in self.waiting if self._can_run(user)), None)
+            if user_id is None:
+                return
+            queue = self.waiting[user_id]
+            waiter = queue.popleft()
+            if queue:
+                # Served users go to the back of the line
+                self.waiting.move_to_end(user_id)
+            else:
+                del self.waiting[user_id]
+            self.queued -= 1
+            self._grant(user_id)
+            waiter.granted = True
+            waiter.event.set()
+
+    @contextlib.contextmanager
+    def admit(self, user_id):
+        self.acquire(user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, time.monotonic() - started)
+
+    def stats(self):
+        with self.lock:
+            return {'running': self.running, 'queued': self.queued, 'rejected': self.rejected}
+
+
+scheduler = ExecutionScheduler()
@@ -0,0 +1,121 @@
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import File
+
+MAX_MATCHES_PER_FILE = 100
+# Files examined per request; the cursor lets the client continue from there
+SCAN_BUDGET = 2000
+SNIPPET_LENGTH = 200
+
+
+def required_literal(pattern, flags=0):
+    """Longest run of plain characters every match of ``pattern`` must contain.
+
+    Only top-level literals count, so alternations and optional groups
+    simply yield a shorter (or empty) run. Used to narrow regex searches
+    through the trigram index.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return ''
+    best, run = '', []
+    for op, value in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(chr(value))
+            continue
+        if len(run) > len(best):
+            best = ''.join(run)
+        run = []
+    if len(run) > len(best):
+        best = ''.join(run)
+    return best
+
+
+def candidate_files(user, literal, project_id=None):
+    """Files owned by ``user`` that may contain ``literal``, ordered by id.
+
+    On SQLite the FTS5 trigram index answers the substring test; other
+    databases fall back to a case-insensitive LIKE. Literals shorter than a
+    trigram cannot use the index and return every file in scope.
+    """
+    files = File.objects.filter(project__owner=user)
+    if project_id:
+        files = files.filter(project_id=project_id)
+    if len(literal) >= 3:
+        if connection.vendor == 'sqlite':
+            # Compressed contents aren't indexed, so they are always
+            # candidates and get scanned like the rest
+            phrase = '"' + literal.replace('"', '""') + '"'
+            files = files.filter(id__in=RawSQL(
+                'SELECT rowid FROM editor_file_search WHERE editor_file_search MATCH %s '
+                "UNION SELECT id FROM editor_file WHERE typeof(content) = 'blob'", [phrase]
+            ))
+        else:
+            files = files.filter(content__icontains=literal)
+    return files.order_by('id')
+
+
+def find_matches(pattern, content):
+    """Line/column (both 1-based) and line text for each match, capped per file."""
+    matches = []
+    line, scanned = 1, 0
+    for match in pattern.finditer(content):
+        if match.start() == match.end():
+            continue
+        line += content.count('\n', scanned, match.start())
+        line_start = content.rfind('\n', 0, match.start()) + 1
+        scanned = match.start()
+        line_end = content.find('\n', match.start())
+        text = content[line_start:line_end if line_end != -1 else len(content)]
+        column = match.start() - line_start
+        if len(text) > SNIPPET_LENGTH:
+            start = max(0, column - SNIPPET_LENGTH // 2)
+            text = text[start:start + SNIPPET_LENGTH]
+        matches.append({'line': line, 'column': column + 1, 'length': match.end() - match.start(), 'text': text})
+        if len(matches) >= MAX_MATCHES_PER_FILE:
+            break
+    return matches
+
+
+def search_files(user, query, regex=False, case_sensitive=False, project_id=None, after_id=0, limit=20):
+    """Search the user's files and return ``(results, last_scanned_id)``.
+
+    ``last_scanned_id`` is None when the scan reached the end, otherwise the
+    id to resume from. Raises re.error for an invalid pattern.
+    """
+    flags = 0 if case_sensitive else re.IGNORECASE
+    if regex:
+        pattern = re.compile(query, flags | re.MULTILINE)
+        literal = required_literal(query, flags)
+    else:
+        pattern = re.compile(re.escape(query), flags)
+        literal = query
+
+    files = candidate_files(user, literal, project_id).filter(id__gt=after_id)
+    files = files.only('id', 'name', 'path', 'project_id', 'content')
+
+    results, last_id, scanned = [], None, 0
+    for file in files.iterator(chunk_size=50):
+        scanned += 1
+        last_id = file.id
+        matches = find_matches(pattern, file.content)
+        if matches:
+            results.append({
+                'file': file.id,
+                'project': file.project_id,
+                'path': file.path,
+                'name': file.name,
+                'matches': matches,
+            })
+        if len(results) >= limit or scanned >= SCAN_BUDGET:
+            return results, last_id
+    return results, None
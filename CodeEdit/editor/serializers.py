@@ -1,5 +1,10 @@
+from django.db import transaction
+from django.db.models import F
 from rest_framework import serializers
-from .models import Project, File, UserPreferences
+from rest_framework.exceptions import NotFound
+from . import autosave
+from .folders import normalize_path
+from .models import Project, File, Folder, UserPreferences
 from django.contrib.auth.models import User
 
 
@@ -9,26 +14,157 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
+def clean_path(value):
+    try:
+        return normalize_path(value)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+
+
+def bump_version(instance):
+    """Give ``instance`` the next version of its stored row; call inside a transaction.
+
+    The increment is done by the database, which keeps the row locked until
+    commit, so writers holding stale instances still get distinct versions.
+    """
+    if not File.objects.filter(pk=instance.pk).update(version=F('version') + 1):
+        raise NotFound('File has been deleted')
+    instance.version = File.objects.filter(pk=instance.pk).values_list('version', flat=True).get()
+
+
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = ['id', 'name', 'content', 'language', 'path', 'project', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'content', 'language', 'path', 'project', 'version', 'created_at', 'updated_at']
+        read_only_fields = ['version']
+
+    def validate_path(self, value):
+        return clean_path(value)
+
+    def to_representation(self, instance):
+        # Show the latest buffered auto-save rather than the stored row
+        return super().to_representation(autosave.buffer.overlay(instance))
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            if 'content' in validated_data and validated_data['content'] != instance.content:
+                bump_version(instance)
+            return super().update(instance, validated_data)
 
 
 class FileContentSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = ['id', 'content']
+        fields = ['id', 'content', 'version']
+        read_only_fields = ['version']
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            bump_version(instance)
+            return super().update(instance, validated_data)
+
+
+class FileOperationSerializer(serializers.Serializer):
+    """One item of a bulk file request."""
+    REQUIRED = {
+        'create': ['name'],
+        'update': ['id'],
+        'rename': ['id', 'name'],
+        'delete': ['id'],
+    }
+
+    op = serializers.ChoiceField(choices=list(REQUIRED))
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=100, required=False)
+    path = serializers.CharField(max_length=255, allow_blank=True, required=False)
+    language = serializers.CharField(max_length=50, required=False)
+    content = serializers.CharField(allow_blank=True, trim_whitespace=False, required=False)
+
+    def validate_path(self, value):
+        return clean_path(value)
+
+    def validate(self, attrs):
+        missing = [field for field in self.REQUIRED[attrs['op']] if field not in attrs]
+        if missing:
+            raise serializers.ValidationError({field: 'This field is required.' for field in missing})
+        return attrs
+
+
+class BulkFileSerializer(serializers.Serializer):
+    project = serializers.IntegerField()
+    operations = FileOperationSerializer(many=True, allow_empty=False)
+
+
+class TextEditSerializer(serializers.Serializer):
+    offset = serializers.IntegerField(min_value=0)
+    delete = serializers.IntegerField(min_value=0, default=0)
+    insert = serializers.CharField(allow_blank=True, trim_whitespace=False, default='')
+
+
+class FileContentPatchSerializer(serializers.Serializer):
+    base_version = serializers.IntegerField(min_value=0)
+    edits = TextEditSerializer(many=True)
+
+
+def query_param_list(request, name):
+    """Split a comma separated query parameter such as ``?fields=id,name``."""
+    if request is None:
+        return set()
+    value = request.query_params.get(name, '')
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class FileSummarySerializer(serializers.ModelSerializer):
+    """File metadata without the body, for listings."""
+    size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = File
+        fields = ['id', 'name', 'path', 'language', 'size', 'updated_at']
+
+    def get_size(self, obj):
+        # Annotated by the viewset's queryset; fall back for unannotated instances
+        size = getattr(obj, 'size', None)
+        return size if size is not None else len(obj.content)
+
+
+class FolderSerializer(serializers.ModelSerializer):
+    """A folder in a directory listing; ``has_children`` tells the explorer whether it can expand."""
+    has_children = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Folder
+        fields = ['id', 'name', 'path', 'has_children']
+
+
+class FolderMoveSerializer(serializers.Serializer):
+    path = serializers.CharField(max_length=255)
+    to = serializers.CharField(max_length=255)
 
 
 class ProjectSerializer(serializers.ModelSerializer):
+    """Project with file metadata.
+
+    ``?include=content`` embeds full files and ``?fields=`` limits the
+    top-level fields returned.
+    """
     owner = UserSerializer(read_only=True)
-    files = FileSerializer(many=True, read_only=True)
+    files = FileSummarySerializer(many=True, read_only=True)
 
     class Meta:
         model = Project
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'owner', 'files']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if 'content' in query_param_list(request, 'include'):
+            self.fields['files'] = FileSerializer(many=True, read_only=True)
+        requested = query_param_list(request, 'fields')
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
     def create(self, validated_data):
         # Set the owner to the current user
         validated_data['owner'] = self.context['request'].user
@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import autosave, revisions, storage
+from .authentication import invalidate_token
+from .models import File, Project
+from .workspaces import workspaces
+
+
+@receiver(connection_created)
+def configure_database_connection(sender, connection, **kwargs):
+    storage.configure_connection(connection)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_tokens_of_changed_user(sender, instance, created, **kwargs):
+    # Covers deactivation and any other change to the cached user
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(post_save, sender=File)
+def record_file_revision(sender, instance, update_fields=None, **kwargs):
+    if 'content' in instance.get_deferred_fields():
+        return
+    if update_fields is None or 'content' in update_fields:
+        revisions.record(instance.pk, instance.version, instance.content)
+
+
+@receiver(post_delete, sender=Project)
+def discard_project_workspace(sender, instance, **kwargs):
+    workspaces.discard(instance.pk)
+
+
+@receiver(pre_delete, sender=Project)
+def discard_buffered_project_files(sender, instance, **kwargs):
+    # Buffered edits of files about to be deleted have nowhere to go
+    if autosave.buffer.dirty:
+        autosave.buffer.discard(File.objects.filter(project=instance).values_list('id', flat=True))
@@ -0,0 +1,75 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'JOURNAL_MODE': None,  # e.g. 'wal'; None leaves SQLite's default (rollback journal)
+    'SYNCHRONOUS': None,  # e.g. 'normal'
+    'BUSY_TIMEOUT': None,  # milliseconds to wait for a lock before failing
+    'WRITE_RETRIES': 0,  # retries of a statement that still found the database locked
+    'RETRY_BACKOFF': 0.05,  # seconds before the first retry, doubled for each one after it
+}
+
+JOURNAL_MODES = {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'}
+SYNCHRONOUS_MODES = {'off', 'normal', 'full', 'extra'}
+
+
+def get_setting(name):
+    return getattr(settings, 'SQLITE_STORAGE', {}).get(name, DEFAULTS[name])
+
+
+def is_locked(error):
+    # "database is locked", or "database table is locked" for shared caches
+    return 'locked' in str(error)
+
+
+def configure_connection(connection):
+    """Apply the SQLITE_STORAGE pragmas to a new connection and make its writes retry on contention."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = []
+    journal_mode = get_setting('JOURNAL_MODE')
+    if journal_mode:
+        if journal_mode.lower() not in JOURNAL_MODES:
+            raise ValueError(f'Unknown SQLite journal mode "{journal_mode}"')
+        pragmas.append(f'PRAGMA journal_mode = {journal_mode}')
+    synchronous = get_setting('SYNCHRONOUS')
+    if synchronous:
+        if synchronous.lower() not in SYNCHRONOUS_MODES:
+            raise ValueError(f'Unknown SQLite synchronous setting "{synchronous}"')
+        pragmas.append(f'PRAGMA synchronous = {synchronous}')
+    if get_setting('BUSY_TIMEOUT') is not None:
+        pragmas.append(f"PRAGMA busy_timeout = {int(get_setting('BUSY_TIMEOUT'))}")
+    with connection.cursor() as cursor:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    # The wrapper list outlives a reconnect of the same connection object
+    if get_setting('WRITE_RETRIES') and retry_locked not in connection.execute_wrappers:
+        connection.execute_wrappers.append(retry_locked)
+
+
+def retry_locked(execute, sql, params, many, context):
+    """Execute wrapper retrying a statement that failed because the database was locked.
+
+    Only statements outside a transaction are retried, plus the BEGIN that
+    opens one, since nothing has happened yet in either case. A failure in
+    the middle of a transaction is raised so the transaction fails as a
+    whole. Waits grow exponentially, with jitter so writers that collided
+    don't collide again.
+    """
+    connection = context['connection']
+    retries = get_setting('WRITE_RETRIES')
+    for attempt in range(retries + 1):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if attempt == retries or connection.in_atomic_block or not is_locked(e):
+                raise
+            delay = get_setting('RETRY_BACKOFF') * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.info('Database locked, retrying in %.3fs (attempt %d of %d)', delay, attempt + 1, retries)
+            time.sleep(delay)
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Aggregate, JSONField, OuterRef, Subquery
+
+from .lru import LRUCache
+from .models import Project, ProjectLanguage
+
+DEFAULTS = {
+    'CACHE_TTL': 300,  # seconds; also bounds staleness across processes with a local cache
+    'CACHE_SIZE': 10000,  # users per process
+    'CACHE_ALIAS': None,
+}
+
+DASHBOARD_FIELDS = [
+    'id', 'name', 'description', 'created_at', 'updated_at', 'file_count', 'total_size', 'last_edited_at',
+    'last_file__id', 'last_file__name', 'last_file__path',
+]
+
+
+def get_setting(name):
+    return getattr(settings, 'PROJECT_SUMMARIES', {}).get(name, DEFAULTS[name])
+
+
+class JSONGroupObject(Aggregate):
+    """SQLite's json_group_object(key, value), decoded to a dict."""
+    function = 'JSON_GROUP_OBJECT'
+    output_field = JSONField()
+
+
+class DashboardCache:
+    """Dashboard rows per user, in an in-process LRU or a Django cache (CACHE_ALIAS)."""
+
+    def __init__(self):
+        self._local = None
+
+    @property
+    def backend(self):
+        alias = get_setting('CACHE_ALIAS')
+        if alias:
+            return caches[alias]
+        if self._local is None:
+            self._local = LRUCache(get_setting('CACHE_SIZE'), get_setting('CACHE_TTL'))
+        return self._local
+
+    def get(self, user_id):
+        return self.backend.get(f'dashboard:{user_id}')
+
+    def set(self, user_id, rows):
+        self.backend.set(f'dashboard:{user_id}', rows, get_setting('CACHE_TTL'))
+
+    def invalidate(self, user_id):
+        self.backend.delete(f'dashboard:{user_id}')
+
+
+cache = DashboardCache()
+
+
+def project_rows(user):
+    """Summary of each of ``user``'s projects, newest first, in one query.
+
+    Everything comes from the projects' own summary columns, the last
+    edited file by primary key and the handful of ProjectLanguage rows of
+    each project; no file rows are scanned.
+    """
+    languages = ProjectLanguage.objects.filter(project=OuterRef('pk')).order_by().values('project').annotate(
+        counts=JSONGroupObject('language', 'files'),
+    ).values('counts')
+    projects = Project.objects.filter(owner=user).select_related('last_file').only(*DASHBOARD_FIELDS).annotate(
+        language_counts=Subquery(languages, output_field=JSONField()),
+    ).order_by('-updated_at', '-id')
+    return [
+        {
+            'id': project.pk,
+            'name': project.name,
+            'description': project.description,
+            'created_at': project.created_at,
+            'updated_at': project.updated_at,
+            'file_count': project.file_count,
+            'total_size': project.total_size,
+            'languages': dict(sorted((project.language_counts or {}).items(), key=lambda item: (-item[1], item[0]))),
+            'last_edited_at': project.last_edited_at,
+            'last_file': None if project.last_file is None else {
+                'id': project.last_file.pk,
+                'name': project.last_file.name,
+                'path': project.last_file.path,
+            },
+        }
+        for project in projects
+    ]
+
+
+def dashboard(user):
+    """``(rows, cached)`` for the user's projects page."""
+    rows = cache.get(user.pk)
+    if rows is not None:
+        return rows, True
+    rows = project_rows(user)
+    cache.set(user.pk, rows)
+    return rows, False
+
+
+def invalidate(user_id):
+    cache.invalidate(user_id)
+
+
+def invalidate_for_files(file_ids):
+    """Drop the dashboards of the owners of ``file_ids``, for writes made outside a user's request."""
+    owners = Project.objects.filter(files__in=list(file_ids)).values_list('owner_id', flat=True).distinct()
+    for owner_id in owners:
+        invalidate(owner_id)
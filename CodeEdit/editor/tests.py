@@ -1,3 +1,1106 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import F, RestrictedError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from . import (
+    authentication, autosave, collab, compression, execution, jobs, metrics, result_cache, revisions, search, storage,
+    summaries, transpile,
+)
+from .edits import apply_edits, transform_edits
+from .lru import LRUCache
+from .management.commands import benchmark
+from .models import FileRevision, Folder, Project, ProjectLanguage, File
+from .scheduler import ExecutionScheduler, Saturated, scheduler
+from .serializers import FileContentSerializer, ProjectSerializer
+from .transpile import transpiler
+
+
+class ProjectListingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            project = Project.objects.create(name=f'project {i}', owner=self.user)
+            for j in range(4):
+                File.objects.create(name=f'file{j}.py', content='x' * 100, project=project)
+
+    def test_list_omits_file_content(self):
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        files = response.data['results'][0]['files']
+        self.assertEqual(len(files), 4)
+        self.assertNotIn('content', files[0])
+        self.assertEqual(files[0]['size'], 100)
+
+    def test_list_query_count_does_not_grow_with_projects(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/projects/')
+        project = Project.objects.create(name='another', owner=self.user)
+        File.objects.create(name='extra.py', project=project)
+        with self.assertNumQueries(2):
+            self.client.get('/api/projects/')
+
+    def test_include_content(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/projects/?include=content')
+        self.assertEqual(response.data['results'][0]['files'][0]['content'], 'x' * 100)
+
+    def test_fields_without_files_skips_prefetch(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/projects/?fields=id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='big', owner=self.user)
+        File.objects.bulk_create(
+            File(name=f'file{i}.py', project=self.project) for i in range(25)
+        )
+        # Give every file the same timestamp so paging relies on the id tiebreak
+        stamp = File.objects.first().updated_at
+        File.objects.update(updated_at=stamp)
+
+    def test_walks_every_file_once(self):
+        seen = []
+        url = f'/api/files/?project={self.project.id}&page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 10)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/files/?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(shutil.which('node'), 'node is not installed')
+class NodeRunnerTests(SimpleTestCase):
+    def test_large_output_arrives_whole(self):
+        command, _ = execution._language_specs()['javascript']
+        worker = execution.Worker(command, reusable=False)
+        try:
+            worker._send({'code': 'console.log("x".repeat(900000))', 'output_limit': 1024 * 1024})
+            # Far more than a pipe holds, and nobody reading yet
+            time.sleep(0.5)
+            reply = worker._receive(time.monotonic() + 5)
+        finally:
+            worker.kill()
+        self.assertEqual(reply['returncode'], 0)
+        self.assertEqual(len(reply['stdout']), 900001)
+        self.assertFalse(reply['truncated'])
+
+    def test_runaway_output_is_truncated(self):
+        for _ in range(3):
+            result = execution.run_code('javascript', 'while (true) console.log("spam spam spam spam")')
+            self.assertTrue(result.truncated)
+            self.assertEqual(result.returncode, -9)
+            self.assertIn('output truncated', result.stdout)
+            self.assertGreater(len(result.stdout), 1000000)
+            self.assertNotIn('exited unexpectedly', result.stderr)
+
+    def test_program_writing_to_fd_1_directly(self):
+        result = execution.run_code('javascript', (
+            'require("fs").writeSync(1, "hello\\n");\n'
+            'require("child_process").spawnSync("echo", ["hi"], {stdio: "inherit"});\n'
+            'console.log("ok");\n'
+        ))
+        self.assertFalse(result.crashed)
+        self.assertEqual((result.stdout, result.returncode), ('ok\n', 0))
+
+    def test_large_compile_output_arrives_whole(self):
+        worker = execution.Worker(transpiler.command())
+        try:
+            if not worker.call({}, 10).get('compiler'):
+                self.skipTest('No TypeScript compiler available')
+            worker._send({'source': 'let x: number = 1;\n' * 50000})
+            time.sleep(0.5)
+            reply = worker._receive(time.monotonic() + 10)
+        finally:
+            worker.kill()
+        self.assertEqual(reply['code'].count('let x'), 50000)
+
+class OutputLimitTests(SimpleTestCase):
+    def test_runaway_python_output_is_truncated(self):
+        result = execution.run_code('python', 'while True: print("spam spam spam spam")')
+        self.assertTrue(result.truncated)
+        self.assertIn('output truncated', result.stdout)
+        self.assertLess(len(result.stdout), 1100000)
+
+class WorkerTests(SimpleTestCase):
+    def test_oversized_reply_is_rejected(self):
+        flood = (
+            'import os, struct\n'
+            'fd = int(os.environ["CODEEDIT_REPLY_FD"])\n'
+            'os.write(fd, struct.pack(">I", 0x7fffffff))\n'
+            'while True: os.write(fd, b"x" * 65536)\n'
+        )
+        worker = execution.Worker([sys.executable, '-c', flood], reusable=False)
+        result = worker.run('', timeout=5)
+        self.assertTrue(result.crashed)
+        self.assertIn('more than the output limit allows', result.stderr)
+        self.assertFalse(worker.alive)
+
+    def test_program_killing_its_runner_runs_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            marker = os.path.join(directory, 'runs')
+            result = execution.run_code('python', (
+                'import os, signal\n'
+                f'open({marker!r}, "a").write("x")\n'
+                'os.kill(os.getppid(), signal.SIGKILL)\n'
+            ))
+            with open(marker) as f:
+                self.assertEqual(f.read(), 'x')
+        self.assertTrue(result.crashed)
+        self.assertIn('exited unexpectedly', result.stderr)
+
+    def test_acquire_gives_up_when_a_replacement_fails(self):
+        pool = execution.RunnerPool(['/nonexistent/runner'], size=1, max_jobs=1)
+        pool.total = 1  # the only worker is busy
+
+        def replacement_failed():
+            with pool.lock:
+                pool.total -= 1
+
+        threading.Timer(0.1, replacement_failed).start()
+        with self.assertRaises(execution.ExecutionError):
+            pool.acquire()
+
+class ExecutionJobTests(SimpleTestCase):
+    def run_job(self, code):
+        job = jobs.manager.submit(user_id=1, language='python', code=code)
+        deadline = time.monotonic() + 10
+        while not job.done and time.monotonic() < deadline:
+            job.wait(len(job.events), 1)
+        self.assertTrue(job.done)
+        return job
+
+    def test_streams_output(self):
+        job = self.run_job('print("hello")')
+        self.assertEqual(job.output('stdout'), 'hello\n')
+        self.assertEqual(job.returncode, 0)
+
+    def test_unexpected_error_finishes_job(self):
+        async def fail(manager, job):
+            raise RuntimeError('boom')
+
+        with mock.patch.object(jobs.JobManager, '_execute', fail), self.assertLogs('editor.jobs', 'ERROR'):
+            job = self.run_job('print("hello")')
+        self.assertEqual(job.returncode, -1)
+        self.assertEqual(job.events[-1][0], 'exit')
+        self.assertIn('Internal error', job.to_dict()['error'])
+
+
+class ResultCacheTests(SimpleTestCase):
+    def test_caches_clean_runs(self):
+        ok = execution.ExecutionResult(stdout='1\n')
+        with mock.patch.object(execution, 'run_code', return_value=ok) as run:
+            self.assertEqual(result_cache.run_cached('python', 'print(1)  # clean'), (ok, False))
+            result, cached = result_cache.run_cached('python', 'print(1)  # clean')
+        self.assertTrue(cached)
+        self.assertEqual(result.stdout, '1\n')
+        self.assertEqual(run.call_count, 1)
+
+    def test_skips_crashes_and_signals(self):
+        failures = [
+            execution.ExecutionResult(timed_out=True, returncode=-9),
+            execution.ExecutionResult(stderr='Process exited unexpectedly (exit code 0)', crashed=True),
+            execution.ExecutionResult(returncode=-24),
+        ]
+        for i, failure in enumerate(failures):
+            code = f'print({i})  # flaky host'
+            with mock.patch.object(execution, 'run_code', return_value=failure):
+                result_cache.run_cached('python', code)
+            ok = execution.ExecutionResult(stdout=f'{i}\n')
+            with mock.patch.object(execution, 'run_code', return_value=ok):
+                self.assertEqual(result_cache.run_cached('python', code), (ok, False))
+
+
+@override_settings(AUTOSAVE_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 3600, 'MAX_DIRTY': 1000})
+class AutosaveBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('carol', 'carol@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.doomed = Project.objects.create(name='doomed', owner=self.user)
+        self.kept = Project.objects.create(name='kept', owner=self.user)
+        self.f1 = File.objects.create(name='a.py', content='a', project=self.doomed)
+        self.f2 = File.objects.create(name='b.py', content='b', project=self.kept)
+        self.addCleanup(autosave.buffer.dirty.clear)
+
+    def edit(self, file, content):
+        response = self.client.put(f'/api/files/{file.pk}/content/', {'content': content}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_flush_writes_buffered_edits(self):
+        self.edit(self.f2, 'edited')
+        self.assertEqual(File.objects.get(pk=self.f2.pk).content, 'b')
+        self.assertEqual(autosave.buffer.flush(), 1)
+        version = self.f2.version + 1
+        self.f2.refresh_from_db()
+        self.assertEqual((self.f2.content, self.f2.version), ('edited', version))
+        self.assertEqual(revisions.rebuild(self.f2.pk, version), 'edited')
+
+    def test_deleting_project_discards_its_edits(self):
+        self.edit(self.f1, 'x')
+        self.edit(self.f2, 'y')
+        self.assertEqual(self.client.delete(f'/api/projects/{self.doomed.pk}/').status_code, 204)
+        autosave.buffer.flush()
+        self.assertEqual(File.objects.get(pk=self.f2.pk).content, 'y')
+        self.assertEqual(autosave.buffer.dirty, {})
+
+    def test_edits_of_files_deleted_elsewhere_are_dropped(self):
+        self.edit(self.f1, 'x')
+        self.edit(self.f2, 'y')
+        File.objects.filter(pk=self.f1.pk).delete()
+        self.assertEqual(autosave.buffer.flush(), 1)
+        self.assertEqual(File.objects.get(pk=self.f2.pk).content, 'y')
+        self.assertEqual(autosave.buffer.dirty, {})
+
+    def test_failing_entry_does_not_hold_back_the_rest(self):
+        self.edit(self.f1, 'x')
+        self.edit(self.f2, 'y')
+        record_many = revisions.record_many
+
+        def fail_for_f1(files):
+            if any(file.pk == self.f1.pk for file in files):
+                raise DatabaseError('disk I/O error')
+            record_many(files)
+
+        with mock.patch.object(revisions, 'record_many', fail_for_f1), self.assertLogs('editor.autosave', 'ERROR'):
+            self.assertEqual(autosave.buffer.flush(), 1)
+        self.assertEqual(File.objects.get(pk=self.f2.pk).content, 'y')
+        self.assertEqual(File.objects.get(pk=self.f1.pk).content, 'a')
+        self.assertEqual(list(autosave.buffer.dirty), [self.f1.pk])
+        self.assertEqual(autosave.buffer.flush(), 1)
+        self.assertEqual(File.objects.get(pk=self.f1.pk).content, 'x')
+
+
+class DiagnosticsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('dave', 'dave@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='checked', owner=self.user)
+
+    def check(self, name, content):
+        file = File.objects.create(name=name, content=content, project=self.project)
+        response = self.client.get(f'/api/files/{file.pk}/diagnostics/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_syntax_error(self):
+        data = self.check('broken.py', 'def f(:\n    pass\n')
+        self.assertTrue(data['checked'])
+        self.assertEqual([(d['line'], d['severity']) for d in data['diagnostics']], [(1, 'error')])
+
+    def test_unused_import_and_cache(self):
+        data = self.check('tools.py', 'import os\nimport sys\nprint(sys.argv)\n')
+        self.assertEqual([d['message'] for d in data['diagnostics']], ["'os' imported but unused"])
+        self.assertFalse(data['cached'])
+        again = self.client.get(f"/api/files/{data['file']}/diagnostics/").data
+        self.assertTrue(again['cached'])
+
+    def test_deep_nesting_is_a_finding(self):
+        for i, content in enumerate(['x = ' + '1+' * 200000 + '1', 'x = ' + '-' * 100000 + '1']):
+            data = self.check(f'deep{i}.py', content)
+            self.assertEqual(data['diagnostics'][0]['severity'], 'error')
+
+    @override_settings(DIAGNOSTICS={'MAX_SIZE': 100})
+    def test_large_file_is_not_parsed(self):
+        data = self.check('big.py', 'x = 1\n' * 100)
+        self.assertEqual(data['diagnostics'][0]['severity'], 'warning')
+        self.assertIn('too large', data['diagnostics'][0]['message'])
+
+    def test_project_check_survives_bad_files(self):
+        File.objects.create(name='deep.py', content='x = ' + '1+' * 200000 + '1', project=self.project)
+        File.objects.create(name='fine.py', content='print(1)\n', project=self.project)
+        File.objects.create(name='notes.txt', content='hello', project=self.project)
+        response = self.client.get(f'/api/projects/{self.project.pk}/diagnostics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['checked'], 2)
+        self.assertEqual(response.data['errors'], 1)
+        self.assertEqual([f['name'] for f in response.data['files']], ['deep.py'])
+
+
+class DeltaSaveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('erin', 'erin@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(name='deltas', owner=self.user)
+        self.file = File.objects.create(name='main.py', content='print("hello")\n', project=project)
+        self.url = f'/api/files/{self.file.pk}/content/'
+
+    def patch(self, base_version, edits):
+        return self.client.patch(self.url, {'base_version': base_version, 'edits': edits}, format='json')
+
+    def test_applies_edits_in_order(self):
+        version = self.file.version
+        response = self.patch(version, [{'offset': 7, 'delete': 5, 'insert': 'world'}, {'offset': 0, 'insert': '# hi\n'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], version + 1)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.content, '# hi\nprint("world")\n')
+        self.assertEqual(response['ETag'], f'"{self.file.content_hash}"')
+
+    def test_stale_base_version_conflicts(self):
+        version = self.file.version
+        self.assertEqual(self.patch(version, [{'offset': 0, 'insert': 'a'}]).status_code, 200)
+        response = self.patch(version, [{'offset': 0, 'insert': 'b'}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], version + 1)
+        self.file.refresh_from_db()
+        self.assertTrue(self.file.content.startswith('aprint'))
+
+    def test_edit_outside_document(self):
+        response = self.patch(self.file.version, [{'offset': 100, 'delete': 1}])
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(AUTOSAVE_BUFFER={'ENABLED': True})
+    def test_conflict_after_buffer_was_flushed(self):
+        def conflicting_put(file, content, base_version=None):
+            # Another save won, and a flush writes it out before lookup()
+            File.objects.filter(pk=file.pk).update(version=F('version') + 1)
+
+        with mock.patch.object(autosave.buffer, 'put', conflicting_put), \
+                mock.patch.object(autosave.buffer, 'lookup', return_value=None):
+            response = self.patch(self.file.version, [{'offset': 0, 'insert': 'a'}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], self.file.version + 1)
+
+    def test_stale_writers_get_distinct_versions(self):
+        stale = File.objects.get(pk=self.file.pk)
+        version = self.file.version
+        self.assertEqual(self.patch(version, [{'offset': 0, 'insert': 'a'}]).status_code, 200)
+        # An unconditional PUT that loaded the file before the PATCH landed
+        serializer = FileContentSerializer(stale, data={'content': 'b'})
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(stale.version, version + 2)
+        numbers = FileRevision.objects.filter(file=self.file).values_list('number', flat=True)
+        self.assertEqual(list(numbers[:2]), [version + 2, version + 1])
+
+
+class ETagTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('frank', 'frank@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='tagged', owner=self.user)
+        self.file = File.objects.create(name='main.py', content='x = 1', project=self.project)
+        self.url = f'/api/files/{self.file.pk}/content/'
+
+    def test_content_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.put(self.url, {'content': 'x = 2'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_put(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.put(self.url, {'content': 'x = 2'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.put(self.url, {'content': 'x = 3'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.content, 'x = 2')
+
+    def test_project_etag_follows_its_files(self):
+        url = f'/api/projects/{self.project.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        File.objects.create(name='other.py', project=self.project)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BulkFileOperationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('grace', 'grace@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='bulk', owner=self.user)
+        self.a = File.objects.create(name='a.py', content='a', project=self.project)
+        self.b = File.objects.create(name='b.py', content='b', project=self.project)
+
+    def bulk(self, operations):
+        return self.client.post('/api/files/bulk/', {'project': self.project.pk, 'operations': operations}, format='json')
+
+    def test_applies_mixed_batch(self):
+        response = self.bulk([
+            {'op': 'create', 'name': 'c.py', 'path': 'pkg', 'content': 'c'},
+            {'op': 'update', 'id': self.a.pk, 'content': 'a2'},
+            {'op': 'rename', 'id': self.b.pk, 'name': 'a.py', 'path': 'old'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok'] * 3)
+        files = {(f.path, f.name): f.content for f in File.objects.filter(project=self.project)}
+        self.assertEqual(files, {('pkg', 'c.py'): 'c', ('', 'a.py'): 'a2', ('old', 'a.py'): 'b'})
+
+    def test_invalid_item_rolls_back_everything(self):
+        response = self.bulk([
+            {'op': 'delete', 'id': self.a.pk},
+            {'op': 'create', 'name': 'b.py'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['skipped', 'error'])
+        self.assertEqual(File.objects.filter(project=self.project).count(), 2)
+
+    def test_name_freed_in_the_same_batch(self):
+        response = self.bulk([
+            {'op': 'delete', 'id': self.a.pk},
+            {'op': 'rename', 'id': self.b.pk, 'name': 'a.py'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(File.objects.filter(project=self.project).values_list('name', flat=True)), ['a.py'])
+
+
+class ProjectArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('heidi', 'heidi@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='Archived Project', owner=self.user)
+        File.objects.create(name='main.py', content='import util\n', project=self.project)
+        File.objects.create(name='util.py', path='lib', content='x = 1\n', project=self.project)
+
+    def upload(self, project, members, **data):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+        buffer.seek(0)
+        buffer.name = 'upload.zip'
+        return self.client.post(f'/api/projects/{project.pk}/import/', {'file': buffer, **data}, format='multipart')
+
+    def test_export(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('archived-project.zip', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['lib/util.py', 'main.py'])
+            self.assertEqual(archive.read('lib/util.py'), b'x = 1\n')
+
+    def test_import_skips_unsafe_members(self):
+        target = Project.objects.create(name='target', owner=self.user)
+        response = self.upload(target, {
+            'src/app.ts': 'let a: number = 1;',
+            '../escape.py': 'x',
+            'image.png': b'\x89PNG\xff\xfe',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            sorted(s['reason'] for s in response.data['skipped']), ['invalid path', 'not a text file'],
+        )
+        file = File.objects.get(project=target)
+        self.assertEqual((file.path, file.name, file.language), ('src', 'app.ts', 'typescript'))
+
+    def test_import_without_overwrite_keeps_existing(self):
+        response = self.upload(self.project, {'main.py': 'changed', 'new.py': 'new'}, overwrite='false')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 0))
+        self.assertEqual(File.objects.get(project=self.project, name='main.py').content, 'import util\n')
+        response = self.upload(self.project, {'main.py': 'changed'})
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(File.objects.get(project=self.project, name='main.py').content, 'changed')
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ivan', 'ivan@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(name='searched', owner=self.user)
+        self.file = File.objects.create(name='app.py', content='def handler():\n    return compute_total(1)\n', project=project)
+        File.objects.create(name='other.py', content='print("nothing")\n', project=project)
+        stranger = User.objects.create_user('judy', 'judy@example.com', 'password')
+        File.objects.create(
+            name='secret.py', content='compute_total = None\n', project=Project.objects.create(name='theirs', owner=stranger),
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_text_search_in_own_files(self):
+        results = self.search(q='COMPUTE_total')
+        self.assertEqual([r['file'] for r in results], [self.file.pk])
+        self.assertEqual(results[0]['matches'], [
+            {'line': 2, 'column': 12, 'length': 13, 'text': '    return compute_total(1)'},
+        ])
+        self.assertEqual(self.search(q='COMPUTE_total', case='true'), [])
+
+    def test_index_follows_edits(self):
+        self.file.content = 'renamed_function()\n'
+        self.file.save()
+        self.assertEqual(self.search(q='compute_total'), [])
+        self.assertEqual(len(self.search(q='renamed_func')), 1)
+
+    def test_regex_search(self):
+        results = self.search(q=r'def \w+\(\)', regex='true')
+        self.assertEqual(results[0]['matches'][0]['text'], 'def handler():')
+        response = self.client.get('/api/search/', {'q': '(unclosed', 'regex': 'true'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_required_literal(self):
+        self.assertEqual(search.required_literal(r'foo\d+barbaz'), 'barbaz')
+        self.assertEqual(search.required_literal('a|b'), '')
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('kim', 'kim@example.com', 'password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/me/')
+        return response, len(queries)
+
+    def test_second_request_skips_token_lookup(self):
+        response, first = self.me()
+        self.assertEqual(response.status_code, 200)
+        response, second = self.me()
+        self.assertEqual(response.data['username'], 'kim')
+        self.assertEqual(second, first - 1)
+
+    def test_deleted_token_is_rejected(self):
+        self.me()
+        self.token.delete()
+        self.assertEqual(self.me()[0].status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me()[0].status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_shared_cache_sees_other_processes_invalidations(self):
+        caches['default'].clear()
+        self.me()
+        # The token is deleted in another process, with an LRU of its own
+        with mock.patch.object(authentication, '_local', LRUCache(10, 60)):
+            self.token.delete()
+        self.assertEqual(self.me()[0].status_code, 401)
+
+
+@override_settings(FILE_REVISIONS={'SNAPSHOT_INTERVAL': 3, 'KEEP': 5})
+class RevisionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('leo', 'leo@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(name='history', owner=self.user)
+        self.file = File.objects.create(name='main.py', content='line 0\n' * 50, project=project)
+        self.contents = {self.file.version: self.file.content}
+        for i in range(1, 12):
+            self.file.content = self.file.content.replace(f'line {i - 1}\n', f'line {i}\n', 1)
+            self.file.version += 1
+            self.file.save()
+            self.contents[self.file.version] = self.file.content
+
+    def test_delta_round_trip(self):
+        old, new = 'hello wide world', 'hello whole world'
+        self.assertEqual(revisions.apply_delta(old, revisions.make_delta(old, new)), new)
+        self.assertEqual(revisions.make_delta(old, new), [7, 7, 'hol'])
+
+    def test_rebuilds_kept_revisions(self):
+        stored = list(self.file.revisions.order_by('number'))
+        # Compaction runs at snapshots, so up to an interval more than KEEP may wait for the next one
+        self.assertLessEqual(len(stored), 5 + 3)
+        self.assertEqual(stored[0].kind, FileRevision.SNAPSHOT)
+        self.assertTrue(all(revision.depth < 3 for revision in stored))
+        for revision in stored:
+            self.assertEqual(revisions.rebuild(self.file.pk, revision.number), self.contents[revision.number])
+        self.assertIsNone(revisions.rebuild(self.file.pk, self.file.version - 20))
+
+    def test_endpoints(self):
+        listed = self.client.get(f'/api/files/{self.file.pk}/revisions/').data
+        self.assertEqual(listed[0]['number'], self.file.version)
+        response = self.client.get(f'/api/files/{self.file.pk}/revisions/{listed[-1]["number"]}/')
+        self.assertEqual(response.data['content'], self.contents[listed[-1]['number']])
+        self.assertEqual(self.client.get(f'/api/files/{self.file.pk}/revisions/9999/').status_code, 404)
+
+
+class EditTransformTests(SimpleTestCase):
+    def random_edits(self, rng, length):
+        edits = []
+        for _ in range(rng.randint(1, 3)):
+            offset = rng.randint(0, length)
+            delete = rng.randint(0, length - offset)
+            insert = rng.choice(['', 'x', 'yz', 'long insert'])
+            edits.append({'offset': offset, 'delete': delete, 'insert': insert})
+            length += len(insert) - delete
+        return edits
+
+    def test_concurrent_edits_converge(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            doc = ''.join(rng.choice('abcdef') for _ in range(rng.randint(0, 12)))
+            mine, theirs = self.random_edits(rng, len(doc)), self.random_edits(rng, len(doc))
+            mine_after, theirs_after = transform_edits(mine, theirs, first=True)
+            self.assertEqual(
+                apply_edits(apply_edits(doc, theirs), mine_after),
+                apply_edits(apply_edits(doc, mine), theirs_after),
+                (doc, mine, theirs),
+            )
+
+    def test_tie_goes_to_first(self):
+        mine, theirs = [{'offset': 1, 'delete': 0, 'insert': 'A'}], [{'offset': 1, 'delete': 0, 'insert': 'B'}]
+        mine_after, _ = transform_edits(mine, theirs, first=True)
+        self.assertEqual(apply_edits(apply_edits('xy', theirs), mine_after), 'xABy')
+
+    def test_edit_outside_document(self):
+        with self.assertRaises(ValueError):
+            apply_edits('abc', [{'offset': 2, 'delete': 5}])
+
+
+@override_settings(COLLAB_EDITING={'BATCH_INTERVAL': 0, 'PERSIST_INTERVAL': 3600, 'HISTORY': 2})
+class DocumentSessionTests(SimpleTestCase):
+    async def test_rebases_lagging_client(self):
+        session = collab.DocumentSession(collab.SessionHub(), 1, 'hello world')
+        alice, bob = collab.Connection(None), collab.Connection(None)
+        session.join(alice)
+        session.join(bob)
+        session.submit(alice, 0, [{'offset': 0, 'delete': 5, 'insert': 'goodbye'}])
+        # Bob typed against revision 0 too, before seeing Alice's op
+        session.submit(bob, 0, [{'offset': 11, 'delete': 0, 'insert': '!'}])
+        self.assertEqual((session.content, session.revision), ('goodbye world!', 2))
+        session.broadcast()
+        message = json.loads((await bob.outbox.get())['text'])
+        self.assertEqual(message['type'], 'init')
+        ops = json.loads((await bob.outbox.get())['text'])['ops']
+        self.assertEqual([op['edits'][0]['offset'] for op in ops], [0, 13])
+        # Only HISTORY ops are kept for rebasing
+        session.submit(alice, 2, [{'offset': 0, 'insert': '>'}])
+        with self.assertRaises(collab.StaleRevision):
+            session.submit(bob, 0, [{'offset': 0, 'insert': '<'}])
+        session.persist_task.cancel()
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = User.objects.create_user('mallory', 'mallory@example.com', 'password')
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'password')
+        Project.objects.create(name='measured', owner=self.user)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_records_requests_per_view(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            self.client.get('/api/projects/')
+        self.client.get('/api/files/0/')
+        text = self.scrape()
+        self.assertIn('codeedit_request_duration_seconds_count{view="ProjectViewSet.list",method="GET"} 2', text)
+        self.assertIn('codeedit_responses_total{view="FileViewSet.retrieve",method="GET",status="404"} 1', text)
+        queries = next(line for line in text.splitlines()
+                       if line.startswith('codeedit_request_sql_queries_total{view="ProjectViewSet.list"'))
+        self.assertGreater(int(queries.rsplit(' ', 1)[1]), 0)
+
+    @override_settings(METRICS={'ENABLED': True, 'SLOW_REQUEST_SECONDS': 0})
+    def test_logs_slow_requests_with_sql(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('editor.metrics.slow', 'WARNING') as logs:
+            self.client.get('/api/projects/')
+        self.assertIn('ProjectViewSet.list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_summarize_latencies(self):
+        summary = benchmark.summarize_latencies([i / 1000 for i in range(1, 101)])
+        self.assertEqual((summary['p50'], summary['max']), (50.5, 100.0))
+        self.assertEqual(benchmark.summarize_latencies([])['p95'], None)
+        self.assertEqual(benchmark.summarize_latencies([0.002])['p99'], 2.0)
+
+    def test_compare_against_baseline(self):
+        def report(p95, queries):
+            return {'latency_ms': {'p95': p95}, 'queries_per_request': {'mean': queries}}
+
+        baseline = {'scenarios': {'open_file': report(10, 4), 'mixed': report(5, 0), 'gone': report(1, 1)}}
+        current = {'scenarios': {'open_file': report(5, 2), 'mixed': report(5, 0), 'new': report(1, 1)}}
+        self.assertEqual(benchmark.compare(baseline, current), {
+            'open_file': {'p95_change': -0.5, 'queries_change': -0.5},
+            'mixed': {'p95_change': 0.0, 'queries_change': 0.0},
+        })
+
+
+@override_settings(CODE_EXECUTION={'MAX_CONCURRENT': 1, 'MAX_PER_USER': 1, 'QUEUE_SIZE': 3, 'QUEUE_TIMEOUT': 5})
+class ExecutionSchedulerTests(SimpleTestCase):
+    def test_rejects_without_waiting(self):
+        scheduler = ExecutionScheduler()
+        scheduler.acquire(1)
+        with self.assertRaises(Saturated) as raised:
+            scheduler.acquire(1, wait=False)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(scheduler.stats(), {'running': 1, 'queued': 0, 'rejected': 1})
+
+    def test_freed_slots_go_round_robin(self):
+        scheduler = ExecutionScheduler()
+        scheduler.acquire('a')
+        order = []
+
+        def wait_for_slot(user):
+            scheduler.acquire(user)
+            order.append(user)
+            scheduler.release(user)
+
+        threads = []
+        for user in ('a', 'a', 'b'):
+            threads.append(threading.Thread(target=wait_for_slot, args=(user,)))
+            threads[-1].start()
+            while scheduler.stats()['queued'] < len(threads):
+                time.sleep(0.001)
+        with self.assertRaises(Saturated):
+            scheduler.acquire('c')
+        scheduler.release('a')
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['a', 'b', 'a'])
+
+    def test_child_limits(self):
+        with self.settings(CODE_EXECUTION={'CPU_LIMIT': 2, 'MEMORY_LIMIT': 64 * 1024 * 1024}):
+            self.assertEqual(execution.child_limits('python')['memory'], 64 * 1024 * 1024)
+            self.assertEqual(
+                execution.child_limits('javascript')['memory'], 64 * 1024 * 1024 + execution.NODE_ADDRESS_SPACE,
+            )
+            self.assertEqual(execution.child_limits('python')['cpu'], 2)
+
+
+class ExecutionAdmissionTests(APITestCase):
+    def test_job_over_user_limit_gets_429(self):
+        user = User.objects.create_user('niaj', 'niaj@example.com', 'password')
+        self.client.force_authenticate(user)
+        held = 0
+        # Take every slot the user is allowed
+        with contextlib.suppress(Saturated):
+            while True:
+                scheduler.acquire(user.pk, wait=False)
+                held += 1
+        try:
+            response = self.client.post('/api/execute/jobs/', {'language': 'python', 'code': 'print(1)'}, format='json')
+        finally:
+            for _ in range(held):
+                scheduler.release(user.pk)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class ProjectRunTests(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='codeedit-test-workspaces-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = self.settings(CODE_EXECUTION=dict(settings.CODE_EXECUTION, WORKSPACE_ROOT=os.path.join(root, 'ws')))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('olivia', 'olivia@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='runnable', owner=self.user)
+        self.main = File.objects.create(name='main.py', content='from lib import util\nutil.greet()', project=self.project)
+        self.util = File.objects.create(name='util.py', path='lib', content='def greet():\n    print("hi")', project=self.project)
+
+    def run_project(self):
+        response = self.client.post(f'/api/projects/{self.project.pk}/run/', {'entry': self.main.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_runs_entry_with_siblings_and_syncs_incrementally(self):
+        data = self.run_project()
+        self.assertEqual((data['output'], data['error']), ('hi\n', None))
+        self.assertEqual(data['workspace'], {'written': 2, 'deleted': 0})
+        self.assertEqual(self.run_project()['workspace'], {'written': 0, 'deleted': 0})
+        self.util.content = 'def greet():\n    print("hello")'
+        self.util.save()
+        data = self.run_project()
+        self.assertEqual((data['output'], data['workspace']), ('hello\n', {'written': 1, 'deleted': 0}))
+
+    def test_delete_project_without_workspace(self):
+        # Nothing was ever run, so neither the workspace nor its root exists
+        self.assertEqual(self.client.delete(f'/api/projects/{self.project.pk}/').status_code, 204)
+
+    def test_delete_project_removes_workspace(self):
+        self.run_project()
+        directory = os.path.join(execution.get_setting('WORKSPACE_ROOT'), str(self.project.pk))
+        self.assertTrue(os.path.isdir(directory))
+        self.client.delete(f'/api/projects/{self.project.pk}/')
+        self.assertFalse(os.path.exists(directory))
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('peggy', 'peggy@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='squeezed', owner=self.user)
+        self.content = 'print("needle é")\n' * 5000
+        self.big = File.objects.create(name='big.py', content=self.content, project=self.project)
+        self.small = File.objects.create(name='small.py', content='x = 1', project=self.project)
+
+    def stored_type(self, file):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT typeof(content) FROM editor_file WHERE id = %s', [file.pk])
+            return cursor.fetchone()[0]
+
+    def test_large_content_stored_compressed(self):
+        self.assertEqual((self.stored_type(self.big), self.stored_type(self.small)), ('blob', 'text'))
+        self.assertEqual(File.objects.get(pk=self.big.pk).content, self.content)
+        sizes = File.objects.annotate(size=compression.ContentLength('content')).values_list('name', 'size')
+        self.assertEqual(dict(sizes), {'big.py': len(self.content), 'small.py': 5})
+
+    def test_search_scans_compressed_content(self):
+        response = self.client.get('/api/search/', {'q': 'needle é'})
+        self.assertEqual([r['file'] for r in response.data['results']], [self.big.pk])
+
+    def test_response_compression(self):
+        url = f'/api/files/{self.big.pk}/content/'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['content'], self.content)
+        self.assertFalse(self.client.get(url).has_header('Content-Encoding'))
+        small = self.client.get(f'/api/files/{self.small.pk}/content/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_accepted_encoding(self):
+        self.assertEqual(compression.accepted_encoding('gzip;q=0, deflate'), None)
+        self.assertEqual(compression.accepted_encoding('*'), 'br' if compression.brotli else 'gzip')
+        self.assertEqual(compression.accepted_encoding('gzip, br;q=0'), 'gzip')
+
+
+class FolderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('quinn', 'quinn@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='nested', owner=self.user)
+        for path, name in [('', 'README.md'), ('src', 'main.py'), ('src/lib', 'util.py'), ('src/lib/deep', 'x.py')]:
+            File.objects.create(name=name, path=path, project=self.project)
+
+    def test_tree_lists_one_level_with_expanded_folders(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/tree/', {'expand': 'src'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['name'] for f in response.data['files']], ['README.md'])
+        src = response.data['folders'][0]
+        self.assertEqual((src['path'], src['has_children']), ('src', True))
+        self.assertEqual([f['name'] for f in src['children']['files']], ['main.py'])
+        self.assertNotIn('children', src['children']['folders'][0])
+
+    def test_move_folder_moves_subtree(self):
+        response = self.client.post(
+            f'/api/projects/{self.project.pk}/move-folder/', {'path': 'src/lib', 'to': 'pkg/lib'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['folders'], response.data['files']), (2, 2))
+        paths = set(File.objects.filter(project=self.project).values_list('path', 'name'))
+        self.assertEqual(paths, {('', 'README.md'), ('src', 'main.py'), ('pkg/lib', 'util.py'), ('pkg/lib/deep', 'x.py')})
+        tree = self.client.get(f'/api/projects/{self.project.pk}/tree/', {'path': 'pkg/lib'}).data
+        self.assertEqual([f['name'] for f in tree['files']], ['util.py'])
+
+    def test_move_folder_errors(self):
+        url = f'/api/projects/{self.project.pk}/move-folder/'
+        self.assertEqual(self.client.post(url, {'path': 'src', 'to': 'src/lib/src'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'path': 'nope', 'to': 'other'}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(url, {'path': 'src/lib/deep', 'to': 'src'}, format='json').status_code, 409)
+
+    def folders(self):
+        return set(Folder.objects.filter(project=self.project).values_list('path', flat=True))
+
+    def test_emptied_folders_are_removed(self):
+        deep = File.objects.get(project=self.project, name='x.py')
+        self.assertEqual(self.client.delete(f'/api/files/{deep.pk}/').status_code, 204)
+        self.assertEqual(self.folders(), {'src', 'src/lib'})
+        util = File.objects.get(project=self.project, name='util.py')
+        self.assertEqual(self.client.patch(f'/api/files/{util.pk}/', {'path': 'lib'}, format='json').status_code, 200)
+        self.assertEqual(self.folders(), {'src', 'lib'})
+        main = File.objects.get(project=self.project, name='main.py')
+        response = self.client.post('/api/files/bulk/', {
+            'project': self.project.pk, 'operations': [{'op': 'delete', 'id': main.pk}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.folders(), {'lib'})
+        tree = self.client.get(f'/api/projects/{self.project.pk}/tree/').data
+        self.assertEqual([folder['path'] for folder in tree['folders']], ['lib'])
+
+    def test_move_folder_prunes_its_old_parent(self):
+        File.objects.filter(project=self.project, path='src').delete()
+        url = f'/api/projects/{self.project.pk}/move-folder/'
+        self.assertEqual(self.client.post(url, {'path': 'src/lib', 'to': 'lib'}, format='json').status_code, 200)
+        self.assertEqual(self.folders(), {'lib', 'lib/deep'})
+
+    def test_folders_are_not_deleted_from_under_files(self):
+        with self.assertRaises(RestrictedError):
+            Folder.objects.get(project=self.project, path='src/lib/deep').delete()
+        self.assertEqual(self.client.delete(f'/api/projects/{self.project.pk}/').status_code, 204)
+        self.assertFalse(File.objects.filter(project_id=self.project.pk).exists())
+
+
+class TranspileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='codeedit-test-ts-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = self.settings(CODE_EXECUTION=dict(settings.CODE_EXECUTION, TRANSPILE_CACHE_DIR=directory))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_output_is_reused_across_restarts(self):
+        with mock.patch.object(transpile.transpiler, 'version', return_value='fake 1.0'), \
+                mock.patch.object(transpile.transpiler, 'compile', return_value='let x = 1;') as compile_source:
+            with mock.patch.object(transpile, 'cache', transpile.TranspileCache()):
+                self.assertEqual(transpile.transpile('let x: number = 1;')[::2], ('let x = 1;', False))
+                self.assertEqual(transpile.transpile('let x: number = 1;')[::2], ('let x = 1;', True))
+            # A new process starts with an empty memory cache but the same directory
+            with mock.patch.object(transpile, 'cache', transpile.TranspileCache()):
+                self.assertEqual(transpile.transpile('let x: number = 1;')[::2], ('let x = 1;', True))
+        self.assertEqual(compile_source.call_count, 1)
+
+    def test_cache_directory_writable_by_others_is_not_used(self):
+        directory = execution.get_setting('TRANSPILE_CACHE_DIR')
+        os.chmod(directory, 0o777)
+        os.makedirs(os.path.join(directory, 'ab'))
+        with open(os.path.join(directory, 'ab', 'abcd.js'), 'w') as f:
+            f.write('planted()')
+        cache = transpile.TranspileCache()
+        self.assertIsNone(cache.directory)
+        self.assertIsNone(cache.get('abcd'))
+        cache.set('ef01', 'let x = 1;')
+        self.assertEqual(cache.get('ef01'), 'let x = 1;')
+        self.assertFalse(os.path.exists(os.path.join(directory, 'ef')))
+
+    def test_run_cache_key_follows_the_compiler(self):
+        with mock.patch.object(transpile.transpiler, 'version', side_effect=transpile.TranspilerUnavailable('none')):
+            without = result_cache.make_key('typescript', 'console.log(1)')
+        with mock.patch.object(transpile.transpiler, 'version', return_value='fake 1.0'):
+            self.assertNotEqual(result_cache.make_key('typescript', 'console.log(1)'), without)
+
+    def test_compile_error_fails_the_run(self):
+        error = transpile.CompileError('main.ts:1:8: Expression expected.')
+        with mock.patch.object(transpile, 'transpile', side_effect=error):
+            result = execution.run_code('typescript', 'let x = ;')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('main.ts:1:8', result.stderr)
+
+    @skipUnless(shutil.which('node'), 'node is not installed')
+    def test_runs_as_javascript_without_a_compiler(self):
+        with mock.patch.object(transpile, 'transpile', side_effect=transpile.TranspilerUnavailable('none')):
+            result = execution.run_code('typescript', 'console.log(1 + 1)')
+        self.assertEqual((result.stdout, result.returncode, result.compile_seconds), ('2\n', 0, None))
+
+
+@override_settings(SQLITE_STORAGE={'SYNCHRONOUS': 'normal', 'BUSY_TIMEOUT': 1234, 'WRITE_RETRIES': 2, 'RETRY_BACKOFF': 0})
+class SQLiteStorageTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_configure_connection(self):
+        storage.configure_connection(connection)
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+        self.assertIn(storage.retry_locked, connection.execute_wrappers)
+        with self.settings(SQLITE_STORAGE={'JOURNAL_MODE': 'bogus'}), self.assertRaises(ValueError):
+            storage.configure_connection(connection)
+
+    def retry(self, failures, in_atomic_block=False):
+        execute = mock.Mock(side_effect=failures + ['ok'])
+        context = {'connection': mock.Mock(in_atomic_block=in_atomic_block)}
+        return storage.retry_locked(execute, 'UPDATE ...', (), False, context), execute.call_count
+
+    def test_retries_locked_statements(self):
+        locked = OperationalError('database is locked')
+        self.assertEqual(self.retry([locked, locked]), ('ok', 3))
+        with self.assertRaises(OperationalError):
+            self.retry([locked, locked, locked])
+
+    def test_does_not_retry_inside_transactions_or_other_errors(self):
+        with self.assertRaises(OperationalError):
+            self.retry([OperationalError('database is locked')], in_atomic_block=True)
+        with self.assertRaises(OperationalError):
+            self.retry([OperationalError('no such table: x')])
+
+
+class ProjectSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rosa', 'rosa@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(name='summary', owner=self.user)
+        summaries.invalidate(self.user.pk)
+
+    def summary(self):
+        project = Project.objects.get(pk=self.project.pk)
+        languages = dict(ProjectLanguage.objects.filter(project=project, files__gt=0).values_list('language', 'files'))
+        return project.file_count, project.total_size, languages, project.last_file_id
+
+    def test_triggers_follow_file_writes(self):
+        a = File.objects.create(name='a.py', content='x' * 10, project=self.project)
+        b = File.objects.create(name='b.js', content='y' * 5, language='javascript', project=self.project)
+        self.assertEqual(self.summary(), (2, 15, {'python': 1, 'javascript': 1}, b.pk))
+        a.content, a.language = 'z' * 3, 'javascript'
+        a.save()
+        self.assertEqual(self.summary(), (2, 8, {'javascript': 2}, a.pk))
+        a.delete()
+        self.assertEqual(self.summary(), (1, 5, {'javascript': 1}, b.pk))
+        b.delete()
+        self.assertEqual(self.summary(), (0, 0, {}, None))
+
+    def test_project_saves_keep_the_summary(self):
+        stale = Project.objects.get(pk=self.project.pk)
+        file = File.objects.create(name='main.py', content='x' * 100, project=self.project)
+        serializer = ProjectSerializer(stale, data={'name': 'renamed'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(self.summary(), (1, 100, {'python': 1}, file.pk))
+        self.assertEqual(Project.objects.get(pk=self.project.pk).name, 'renamed')
+        self.assertEqual(self.client.patch(
+            f'/api/projects/{self.project.pk}/', {'description': 'notes'}, format='json',
+        ).status_code, 200)
+        self.assertEqual(self.summary(), (1, 100, {'python': 1}, file.pk))
+
+    def test_dashboard_is_cached_until_a_write(self):
+        File.objects.create(name='main.py', content='print(1)', project=self.project)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/projects/dashboard/')
+        self.assertFalse(response.data['cached'])
+        row = response.data['projects'][0]
+        self.assertEqual((row['file_count'], row['total_size'], row['languages']), (1, 8, {'python': 1}))
+        self.assertEqual(row['last_file']['name'], 'main.py')
+        with self.assertNumQueries(0):
+            self.assertTrue(self.client.get('/api/projects/dashboard/').data['cached'])
+
+        response = self.client.post(
+            '/api/files/', {'name': 'util.py', 'content': 'x', 'project': self.project.pk}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/projects/dashboard/')
+        self.assertFalse(response.data['cached'])
+        self.assertEqual(response.data['projects'][0]['file_count'], 2)
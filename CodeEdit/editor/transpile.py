@@ -0,0 +1,243 @@
+import atexit
+import contextlib
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
+
+from . import execution
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class TranspilerUnavailable(execution.ExecutionError):
+    pass
+
+
+class CompileError(execution.ExecutionError):
+    pass
+
+
+def ensure_private_directory(path):
+    """Create ``path`` for this user only, or check an existing one; False if it can't be trusted.
+
+    It must be a directory owned by us that nobody else can write to.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError as e:
+        logger.warning('Not caching compiled TypeScript on disk: %s', e)
+        return False
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        logger.warning(
+            'Not caching compiled TypeScript in %s: it must be a directory owned by this user '
+            'and writable by no one else', path,
+        )
+        return False
+    return True
+
+
+def default_cache_directory():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'codeedit', 'typescript')
+
+
+def format_diagnostic(diagnostic, filename):
+    """``main.ts:3:7: message``, the way compilers print errors."""
+    if diagnostic.get('line') is None:
+        return f"{filename}: {diagnostic['message']}"
+    return f"{filename}:{diagnostic['line']}:{diagnostic.get('column') or 1}: {diagnostic['message']}"
+
+
+class Transpiler:
+    """One long-lived node process that compiles TypeScript to JavaScript.
+
+    Starting the compiler costs far more than a compile, so the process is
+    kept between jobs and only replaced when it dies or times out. Jobs are
+    sent one at a time under a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.worker = None
+        self.compiler = None
+        # Why there is no compiler, once we know; not rechecked until restart
+        self.missing = None
+
+    def command(self):
+        node = execution.get_setting('TRANSPILER_NODE') or execution.get_setting('NODE')
+        return [node, str(execution.RUNNERS_DIR / 'ts_transpiler.js')]
+
+    def _request(self, payload):
+        timeout = execution.get_setting('TRANSPILE_TIMEOUT')
+        for attempt in range(2):
+            if self.worker is None or not self.worker.alive:
+                self.worker = execution.Worker(self.command())
+            try:
+                return self.worker.call(payload, timeout)
+            except execution.ExecutionTimeout:
+                self.close_worker()
+                raise CompileError(f'Compilation timed out (limit: {timeout} seconds)')
+            except execution.WorkerCrashed:
+                self.close_worker()
+                if attempt:
+                    raise TranspilerUnavailable('The TypeScript transpiler exited unexpectedly')
+        return None
+
+    def version(self):
+        """Name and version of the compiler in use; part of every cache key."""
+        with self.lock:
+            if self.missing is not None:
+                raise TranspilerUnavailable(self.missing)
+            if self.compiler is None:
+                try:
+                    reply = self._request({})
+                except OSError as e:
+                    reply = {'error': str(e)}
+                if not reply.get('compiler'):
+                    self.missing = reply.get('error', 'No TypeScript compiler available')
+                    self.close_worker()
+                    logger.warning('TypeScript will run as plain JavaScript: %s', self.missing)
+                    raise TranspilerUnavailable(self.missing)
+                self.compiler = reply['compiler']
+            return self.compiler
+
+    def compile(self, source, filename='main.ts'):
+        with self.lock:
+            reply = self._request({'source': source, 'filename': filename})
+        if 'diagnostics' in reply:
+            raise CompileError('\n'.join(format_diagnostic(d, filename) for d in reply['diagnostics']))
+        if reply.get('code') is None:
+            raise TranspilerUnavailable(reply.get('error', 'No TypeScript compiler available'))
+        return reply['code']
+
+    def close_worker(self):
+        if self.worker is not None:
+            self.worker.kill()
+            self.worker = None
+
+    def close(self):
+        with self.lock:
+            self.close_worker()
+
+
+class TranspileCache:
+    """Compiled output by content hash, in memory and in a directory on disk.
+
+    The in-memory LRU holds TRANSPILE_CACHE_SIZE entries. The directory
+    survives restarts and is shared by every process of the same user; it
+    is trimmed oldest first (by mtime, refreshed on each hit) once it grows
+    past TRANSPILE_CACHE_BUDGET bytes. Whatever is found there gets run,
+    so it is only used if no other user can write to it.
+    """
+
+    # Trim the directory at most this often, in writes
+    TRIM_EVERY = 50
+
+    def __init__(self):
+        self._memory = None
+        self.writes = 0
+        self.lock = threading.Lock()
+        # Last directory checked, and whether it passed
+        self._checked = (None, False)
+
+    @property
+    def memory(self):
+        if self._memory is None:
+            # Keys are content hashes, so entries never go stale
+            self._memory = LRUCache(execution.get_setting('TRANSPILE_CACHE_SIZE'), float('inf'))
+        return self._memory
+
+    @property
+    def directory(self):
+        """The cache directory, or None when it isn't safe to use."""
+        path = execution.get_setting('TRANSPILE_CACHE_DIR') or default_cache_directory()
+        if self._checked[0] != path:
+            self._checked = (path, ensure_private_directory(path))
+        return path if self._checked[1] else None
+
+    def _path(self, key):
+        directory = self.directory
+        return None if directory is None else os.path.join(directory, key[:2], key + '.js')
+
+    def get(self, key):
+        code = self.memory.get(key)
+        if code is not None:
+            return code
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                code = f.read()
+        except FileNotFoundError:
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.memory.set(key, code)
+        return code
+
+    def set(self, key, code):
+        self.memory.set(key, code)
+        path = self._path(key)
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.partial'
+        with open(partial, 'w', encoding='utf-8') as f:
+            f.write(code)
+        os.replace(partial, path)
+        with self.lock:
+            self.writes += 1
+            trim = self.writes % self.TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def trim(self):
+        directory = self.directory
+        if directory is None:
+            return
+        budget = execution.get_setting('TRANSPILE_CACHE_BUDGET')
+        entries = []
+        total = 0
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                return
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+
+transpiler = Transpiler()
+cache = TranspileCache()
+atexit.register(transpiler.close)
+
+
+def transpile(source):
+    """Compile TypeScript ``source``, reusing earlier output for the same source.
+
+    Returns ``(code, seconds, cached)`` where seconds is the time spent
+    compiling, or looking the result up. Raises CompileError for code the
+    compiler rejects and TranspilerUnavailable when there is no compiler.
+    """
+    started = time.perf_counter()
+    key = hashlib.sha256(f'{transpiler.version()}\0{source}'.encode()).hexdigest()
+    code = cache.get(key)
+    if code is not None:
+        return code, time.perf_counter() - started, True
+    code = transpiler.compile(source)
+    cache.set(key, code)
+    return code, time.perf_counter() - started, False
@@ -12,5 +12,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/register/', register_user, name='register'),
     path('auth/me/', views.get_current_user, name='current_user'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('search/', views.search_code, name='search_code'),
     path('execute/', execute_code, name='execute_code'),
+    path('execute/cache/', views.execution_cache_stats, name='execution_cache_stats'),
+    path('execute/jobs/', views.create_execution_job, name='execution_job_create'),
+    path('execute/jobs/<str:job_id>/', views.execution_job_detail, name='execution_job_detail'),
+    path('execute/jobs/<str:job_id>/stream/', views.execution_job_stream, name='execution_job_stream'),
 ]
\ No newline at end of file
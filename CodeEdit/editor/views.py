@@ -1,14 +1,25 @@
-import subprocess
-import tempfile
-import os
+import json
+import re
+import zipfile
 from rest_framework import status, viewsets, permissions, serializers
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+from django.utils.http import quote_etag
+from rest_framework.generics import get_object_or_404
+from rest_framework.utils.urls import replace_query_param
 from django.views.decorators.csrf import csrf_exempt
 
 from .serializers import (
@@ -16,9 +27,34 @@ from .serializers import (
     FileSerializer,
     UserPreferencesSerializer,
     FileContentSerializer,
+    FileContentPatchSerializer,
+    BulkFileSerializer,
     UserSerializer,
+    FileSummarySerializer,
+    FolderSerializer,
+    FolderMoveSerializer,
+    query_param_list,
 )
-from .models import Project, File, UserPreferences
+from .models import Project, File, UserPreferences, hash_content
+from . import autosave, diagnostics, execution, metrics, revisions, summaries
+from .jobs import manager as job_manager
+from .result_cache import result_cache, run_cached
+from .renderers import EventStreamRenderer, PrometheusRenderer
+from .edits import apply_edits
+from .pagination import UpdatedAtCursorPagination
+from .etags import etag_matches, file_etag, project_etag
+from .bulk import BulkOperationError, apply_file_operations
+from .compression import ContentLength
+from .archives import import_project_zip, language_for, stream_project_zip
+from .search import search_files
+from .folders import FolderConflict, FolderNotFound, get_folder, list_children, move_folder, normalize_path
+from .scheduler import Saturated, scheduler
+from .workspaces import InvalidPath, workspace_path, workspaces
+
+
+def milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -27,6 +63,8 @@ def execute_code(request):
     file_id = request.data.get('file_id')
     language = request.data.get('language')
     code = request.data.get('code')
+    stdin = request.data.get('stdin') or ''
+    use_cache = request.data.get('cache') in (True, 'true', '1', 1)
 
     if not code:
         return Response({'detail': 'No code provided'}, status=400)
@@ -38,63 +76,182 @@ def execute_code(request):
                 file = File.objects.get(id=file_id, project__owner=request.user)
             except File.DoesNotExist:
                 return Response({'detail': 'File not found'}, status=404)
-        result = ''
-        error = ''
-
-        #Execute code based on language
-        if language == 'python':
-            with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as temp_file:
-                temp_file.write(code.encode())
-                temp_file_name = temp_file.name
-
-            try:
-                # Run with timeout protection
-                process = subprocess.run(
-                    ['python', temp_file_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=5  # 5 second timeout for safety
-                )
-                result = process.stdout
-                error = process.stderr
-
-            except subprocess.TimeoutExpired:
-                error = "Execution timed out (limit: 5 seconds)"
-            finally:
-                # Clean up the temp file
-                os.unlink(temp_file_name)
-
-        elif language in ['javascript', 'typescript']:
-            with tempfile.NamedTemporaryFile(suffix='.js', delete=False) as temp_file:
-                temp_file.write(code.encode())
-                temp_file_name = temp_file.name
-
-            try:
-                # Run with Node.js
-                process = subprocess.run(
-                    ['node', temp_file_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                result = process.stdout
-                error = process.stderr
-            except subprocess.TimeoutExpired:
-                error = "Execution timed out (limit: 5 seconds)"
-            finally:
-                os.unlink(temp_file_name)
-        else:
+        #Execute code on a warm runner for the language, or serve a cached
+        #result when the client marks the run as deterministic
+        try:
+            if use_cache:
+                outcome, cached = run_cached(language, code, stdin, request.user.id)
+            else:
+                outcome, cached = execution.run_code(language, code, stdin, request.user.id), False
+        except execution.UnsupportedLanguage:
             return Response({'detail': f'Execution for language "{language}" not supported'}, status=400)
+        except Saturated as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(e.retry_after)},
+            )
+
+        result = outcome.stdout
+        error = outcome.stderr
+        if outcome.timed_out:
+            error = f"Execution timed out (limit: {execution.get_setting('TIMEOUT')} seconds)"
 
         # Return the execution result
         return Response({
             'output': result,
-            'error': error if error else None
+            'error': error if error else None,
+            'cached': cached,
+            'truncated': outcome.truncated,
+            'compile_ms': milliseconds(outcome.compile_seconds),
+            'run_ms': milliseconds(outcome.run_seconds),
         })
 
     except Exception as e:
         return Response({'detail': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def execution_cache_stats(request):
+    """Hit/miss counters and occupancy of the execution result cache"""
+    return Response(result_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+@renderer_classes([PrometheusRenderer])
+def metrics_view(request):
+    """Request metrics of this process in the Prometheus text format"""
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_execution_job(request):
+    """Start an asynchronous execution and return its job id straight away"""
+    file_id = request.data.get('file_id')
+    language = request.data.get('language')
+    code = request.data.get('code')
+    stdin = request.data.get('stdin') or ''
+
+    if not code:
+        return Response({'detail': 'No code provided'}, status=400)
+
+    if file_id and not File.objects.filter(id=file_id, project__owner=request.user).exists():
+        return Response({'detail': 'File not found'}, status=404)
+
+    try:
+        job = job_manager.submit(request.user.id, language, code, stdin)
+    except execution.UnsupportedLanguage:
+        return Response({'detail': f'Execution for language "{language}" not supported'}, status=400)
+    except Saturated as e:
+        return Response(
+            {'detail': str(e)},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(e.retry_after)},
+        )
+
+    return Response({'id': job.id, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def execution_job_detail(request, job_id):
+    """Return the state of a job and all output produced so far"""
+    job = job_manager.get(job_id, request.user.id)
+    if job is None:
+        return Response({'detail': 'Job not found'}, status=404)
+    return Response(job.to_dict())
+
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_KEEPALIVE = 15
+
+
+def _format_event(index, kind, data):
+    payload = data if kind == 'exit' else {'text': data}
+    return f'id: {index}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n'
+
+
+def _job_events(job, offset):
+    while True:
+        events, done = job.wait(offset, STREAM_KEEPALIVE)
+        if not events and not done:
+            yield ': keep-alive\n\n'
+        for kind, data in events:
+            yield _format_event(offset, kind, data)
+            offset += 1
+        if done and offset >= len(job.events):
+            return
+
+
+async def _job_events_async(job, offset):
+    while True:
+        events, done = await job.wait_async(offset, STREAM_KEEPALIVE)
+        if not events and not done:
+            yield ': keep-alive\n\n'
+        for kind, data in events:
+            yield _format_event(offset, kind, data)
+            offset += 1
+        if done and offset >= len(job.events):
+            return
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def execution_job_stream(request, job_id):
+    """Stream a job's stdout/stderr as server-sent events while it runs.
+
+    Clients can resume with the standard Last-Event-ID header. Under ASGI
+    the stream is served by an async iterator so it holds no worker thread.
+    """
+    job = job_manager.get(job_id, request.user.id)
+    if job is None:
+        return Response({'detail': 'Job not found'}, status=404)
+
+    last_id = request.headers.get('Last-Event-ID', '')
+    offset = int(last_id) + 1 if last_id.isdigit() else 0
+
+    if isinstance(request._request, ASGIRequest):
+        events = _job_events_async(job, offset)
+    else:
+        events = _job_events(job, offset)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_code(request):
+    """Find text or a regex across the user's files, or one project's with ?project="""
+    query = request.query_params.get('q', '')
+    if not query:
+        return Response({'q': 'A search query is required'}, status=400)
+    if len(query) > 500:
+        return Response({'q': 'Search query is too long'}, status=400)
+    regex = request.query_params.get('regex') in ('1', 'true')
+    case_sensitive = request.query_params.get('case') in ('1', 'true')
+    try:
+        after_id = int(request.query_params.get('cursor', 0))
+        limit = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+    except ValueError:
+        return Response({'detail': 'Invalid cursor or page_size'}, status=400)
+
+    try:
+        results, last_id = search_files(
+            request.user, query, regex=regex, case_sensitive=case_sensitive,
+            project_id=request.query_params.get('project'), after_id=after_id, limit=limit,
+        )
+    except re.error as e:
+        return Response({'q': f'Invalid regular expression: {e}'}, status=400)
+
+    next_url = None
+    if last_id is not None:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', last_id)
+    return Response({'next': next_url, 'results': results})
+
 # Rest of the file remains unchanged
 @csrf_exempt
 @api_view(['POST'])
@@ -122,20 +279,199 @@ def get_current_user(request):
     serializer = UserSerializer(request.user)
     return Response(serializer.data)
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class DashboardInvalidationMixin:
+    """Drops the user's cached dashboard after any successful write through the viewset.
+
+    Users only reach their own projects and files here, so no other
+    dashboard can change.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            summaries.invalidate(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ProjectViewSet(DashboardInvalidationMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UpdatedAtCursorPagination
 
     def get_queryset(self):
         # Only return projects owned by the authenticated user
-        return Project.objects.filter(owner=self.request.user)
+        queryset = Project.objects.filter(owner=self.request.user).select_related('owner')
+
+        # Load file metadata for every project in one query, and only pull
+        # file bodies when the client asked for them
+        requested = query_param_list(self.request, 'fields')
+        if requested and 'files' not in requested:
+            return queryset
+        files = File.objects.annotate(size=ContentLength('content'))
+        if 'content' not in query_param_list(self.request, 'include'):
+            files = files.defer('content')
+        return queryset.prefetch_related(Prefetch('files', queryset=files))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Answer revalidations from a cheap aggregate before loading the tree
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=kwargs['pk'])
+        etag = project_etag(project, request)
+        if etag_matches(request.headers.get('If-None-Match'), etag, weak=True):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data, headers={'ETag': etag})
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class FileViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """File count, size, languages and last edited file of every project, from the summary columns"""
+        rows, cached = summaries.dashboard(request.user)
+        return Response({'projects': rows, 'cached': cached})
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Download the project as a zip archive, streamed file by file"""
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        autosave.buffer.flush()
+        response = StreamingHttpResponse(stream_project_zip(project), content_type='application/zip')
+        filename = slugify(project.name) or f'project-{project.pk}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+        return response
+
+    @action(detail=True, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_archive(self, request, pk=None):
+        """Add the files of an uploaded zip archive to the project"""
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'A zip archive is required'}, status=400)
+        overwrite = request.data.get('overwrite', 'true') not in ('false', '0')
+        autosave.buffer.flush()
+        try:
+            with transaction.atomic():
+                summary = import_project_zip(project, upload, overwrite=overwrite)
+        except (zipfile.BadZipFile, ValueError) as e:
+            return Response({'file': str(e)}, status=400)
+        return Response(summary, status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        """List one directory, with the folders named in ?expand= opened below it.
+
+        ``?path=src`` picks the directory (the project root by default) and
+        ``?expand=src/lib,src/lib/util`` the folders whose children to
+        include, so the explorer only loads what is on screen.
+        """
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        try:
+            root = get_folder(project, request.query_params.get('path', ''))
+            expand = {normalize_path(path) for path in query_param_list(request, 'expand')}
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        except FolderNotFound as e:
+            return Response({'detail': str(e)}, status=404)
+
+        root_path = root.path if root else ''
+        expand = {path for path in expand if not root_path or path.startswith(root_path + '/')}
+        expanded = dict(project.folders.filter(path__in=expand).values_list('id', 'path')) if expand else {}
+        root_id = root.pk if root else None
+        folders, files = list_children(project, [root_id, *expanded])
+
+        def listing(folder_id):
+            children = []
+            for folder in folders[folder_id]:
+                entry = FolderSerializer(folder).data
+                if folder.pk in expanded:
+                    entry['children'] = listing(folder.pk)
+                children.append(entry)
+            return {'folders': children, 'files': FileSummarySerializer(files[folder_id], many=True).data}
+
+        return Response({'path': root_path, **listing(root_id)})
+
+    @action(detail=True, methods=['post'], url_path='move-folder')
+    def move_folder(self, request, pk=None):
+        """Move or rename a folder and everything in it"""
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        serializer = FolderMoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        try:
+            summary = move_folder(project, serializer.validated_data['path'], serializer.validated_data['to'])
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        except FolderNotFound as e:
+            return Response({'detail': str(e)}, status=404)
+        except FolderConflict as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        except IntegrityError:
+            return Response({'detail': 'Files in the folder conflict with existing files'}, status=status.HTTP_409_CONFLICT)
+        return Response(summary)
+
+    @action(detail=True, methods=['get'])
+    def diagnostics(self, request, pk=None):
+        """Syntax errors and lint findings for every file, listing only the files that have some"""
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        results = diagnostics.check_project(project)
+        findings = [d for r in results for d in r['diagnostics']]
+        return Response({
+            'files': [r for r in results if r['diagnostics']],
+            'checked': sum(r['checked'] for r in results),
+            'cached': sum(r['cached'] for r in results),
+            'errors': sum(d['severity'] == 'error' for d in findings),
+            'warnings': sum(d['severity'] == 'warning' for d in findings),
+        })
+
+    @action(detail=True, methods=['post'])
+    def run(self, request, pk=None):
+        """Run an entry file with the rest of the project next to it"""
+        project = get_object_or_404(Project.objects.filter(owner=request.user), pk=pk)
+        entry_id = request.data.get('entry')
+        if not entry_id:
+            return Response({'entry': 'An entry file id is required'}, status=400)
+        try:
+            entry = File.objects.only('id', 'path', 'name').get(id=entry_id, project=project)
+        except (File.DoesNotExist, ValueError):
+            return Response({'detail': 'File not found'}, status=404)
+        stdin = request.data.get('stdin') or ''
+        language = language_for(entry.name)
+
+        try:
+            execution.resolve_language(language)
+            filename = workspace_path(entry)
+            #Take the slot first so a saturated server doesn't sync for nothing
+            with scheduler.admit(request.user.id):
+                with workspaces.checkout(project.pk) as (directory, sync):
+                    with open(f'{directory}/{filename}', encoding='utf-8') as f:
+                        code = f.read()
+                    outcome = execution.run_code(language, code, stdin, cwd=directory, filename=filename)
+        except execution.UnsupportedLanguage:
+            return Response({'detail': f'Execution for language "{language}" not supported'}, status=400)
+        except InvalidPath as e:
+            return Response({'detail': str(e)}, status=400)
+        except Saturated as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(e.retry_after)},
+            )
+
+        error = outcome.stderr
+        if outcome.timed_out:
+            error = f"Execution timed out (limit: {execution.get_setting('TIMEOUT')} seconds)"
+        return Response({
+            'output': outcome.stdout,
+            'error': error if error else None,
+            'truncated': outcome.truncated,
+            'compile_ms': milliseconds(outcome.compile_seconds),
+            'run_ms': milliseconds(outcome.run_seconds),
+            'workspace': sync,
+        })
+
+class FileViewSet(DashboardInvalidationMixin, viewsets.ModelViewSet):
     serializer_class = FileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UpdatedAtCursorPagination
 
     def get_queryset(self):
         # Filter by authenticated user
@@ -154,20 +490,171 @@ class FileViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError({"project": "Project ID is required"})
         serializer.save(project_id=project_id)
 
-    @action(detail=True, methods=['get', 'put'])
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create, update, rename and delete many files of one project in one transaction"""
+        serializer = BulkFileSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        try:
+            project = Project.objects.get(id=serializer.validated_data['project'], owner=request.user)
+        except Project.DoesNotExist:
+            return Response({'project': 'Project not found'}, status=404)
+        autosave.buffer.flush()
+        try:
+            results = apply_file_operations(project, serializer.validated_data['operations'])
+        except BulkOperationError as e:
+            return Response({'results': e.results}, status=400)
+        except IntegrityError:
+            return Response({'detail': 'Operations conflict with existing files'}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
+    def get_file(self, defer_content=False):
+        """Like get_object(), optionally leaving the content column unread."""
+        queryset = self.filter_queryset(self.get_queryset())
+        if defer_content:
+            queryset = queryset.defer('content')
+        file = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, file)
+        return file
+
+    def perform_update(self, serializer):
+        # Buffered auto-saves must not land on top of this write later
+        autosave.buffer.flush([serializer.instance.pk])
+        serializer.instance.refresh_from_db()
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        autosave.buffer.discard([instance.pk])
+        instance.delete()
+
+    @action(detail=True, methods=['get'])
+    def diagnostics(self, request, pk=None):
+        """Syntax errors and lint findings, cached while the content is unchanged"""
+        return Response(diagnostics.check_file(self.get_file(defer_content=True)))
+
+    @action(detail=True, methods=['get', 'put', 'patch'])
     def content(self, request, pk=None):
-        file = self.get_object()
         if request.method == 'GET':
+            # A revalidation only needs the stored hash, not the body
+            if_none_match = request.headers.get('If-None-Match')
+            file = autosave.buffer.overlay(self.get_file(defer_content=bool(if_none_match)))
+            etag = file_etag(file)
+            if etag_matches(if_none_match, etag, weak=True):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
             serializer = FileContentSerializer(file)
-            return Response(serializer.data)
-        elif request.method == 'PUT':
-            serializer = FileContentSerializer(file, data=request.data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data)
-            return Response(serializer.errors, status=400)
+            return Response(serializer.data, headers={'ETag': etag})
+        file = autosave.buffer.overlay(self.get_object())
+        if request.method == 'PUT':
+            return self._put_content(request, file)
+        elif request.method == 'PATCH':
+            return self._patch_content(request, file)
         return None
 
+    def _put_content(self, request, file):
+        """Replace the file body.
+
+        With an If-Match header the write is conditional on the ETag, so a
+        client saving over a version it never saw gets a 412.
+        """
+        serializer = FileContentSerializer(file, data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        if_match = request.headers.get('If-Match')
+        if if_match and not etag_matches(if_match, file_etag(file)):
+            return Response({'detail': 'File has been modified'}, status=status.HTTP_412_PRECONDITION_FAILED)
+        content = serializer.validated_data['content']
+
+        if autosave.buffer.enabled:
+            entry = autosave.buffer.put(file, content, base_version=file.version if if_match else None)
+            if entry is None:
+                return Response({'detail': 'File has been modified'}, status=status.HTTP_412_PRECONDITION_FAILED)
+            autosave.buffer.overlay(file)
+            return Response(FileContentSerializer(file).data, headers={'ETag': file_etag(file)})
+
+        if not if_match:
+            serializer.save()
+            return Response(serializer.data, headers={'ETag': file_etag(file)})
+
+        updated = File.objects.filter(pk=file.pk, version=file.version).update(
+            content=content, content_hash=hash_content(content), version=file.version + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            return Response({'detail': 'File has been modified'}, status=status.HTTP_412_PRECONDITION_FAILED)
+        file.refresh_from_db()
+        revisions.record(file.pk, file.version, file.content)
+        return Response(FileContentSerializer(file).data, headers={'ETag': file_etag(file)})
+
+    def _patch_content(self, request, file):
+        """Apply text edits made against ``base_version`` of the file.
+
+        The write only goes through if the stored version still matches the
+        base, so concurrent editors get a 409 instead of overwriting each other.
+        """
+        serializer = FileContentPatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        base_version = serializer.validated_data['base_version']
+        if base_version != file.version:
+            return Response({'detail': 'File has changed since base_version', 'version': file.version},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            content = apply_edits(file.content, serializer.validated_data['edits'])
+        except ValueError as e:
+            return Response({'edits': [str(e)]}, status=400)
+
+        if autosave.buffer.enabled:
+            entry = autosave.buffer.put(file, content, base_version=base_version)
+            if entry is None:
+                current = autosave.buffer.lookup(file.pk)
+                if current is None:
+                    # Flushed since the put; the stored row has the version now
+                    file.refresh_from_db(fields=['version'])
+                    current = {'version': file.version}
+                return Response({'detail': 'File has changed since base_version', 'version': current['version']},
+                                status=status.HTTP_409_CONFLICT)
+            return Response({'id': file.pk, 'version': entry['version']}, headers={'ETag': quote_etag(entry['content_hash'])})
+
+        content_hash = hash_content(content)
+        updated = File.objects.filter(pk=file.pk, version=base_version).update(
+            content=content, content_hash=content_hash, version=base_version + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            file.refresh_from_db(fields=['version'])
+            return Response({'detail': 'File has changed since base_version', 'version': file.version},
+                            status=status.HTTP_409_CONFLICT)
+        revisions.record(file.pk, base_version + 1, content)
+        return Response({'id': file.pk, 'version': base_version + 1}, headers={'ETag': quote_etag(content_hash)})
+
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, pk=None):
+        """List the stored revisions of a file, newest first"""
+        file = self.get_file(defer_content=True)
+        stored = file.revisions.values('number', 'kind', 'size', 'created_at')
+        return Response(list(stored[:revisions.get_setting('KEEP')]))
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>\d+)')
+    def revision(self, request, pk=None, number=None):
+        """Return the content of one revision"""
+        file = self.get_file(defer_content=True)
+        content = revisions.rebuild(file.pk, int(number))
+        if content is None:
+            return Response({'detail': 'Revision not found'}, status=404)
+        return Response({'number': int(number), 'content': content})
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """Unified diff between revisions ?from= and ?to="""
+        file = self.get_file(defer_content=True)
+        try:
+            old, new = int(request.query_params['from']), int(request.query_params['to'])
+        except (KeyError, ValueError):
+            return Response({'detail': 'Integer from and to revisions are required'}, status=400)
+        text = revisions.diff(file.pk, old, new, name=file.name)
+        if text is None:
+            return Response({'detail': 'Revision not found'}, status=404)
+        return Response({'from': old, 'to': new, 'diff': text})
+
 class UserPreferencesViewSet(viewsets.ModelViewSet):
     serializer_class = UserPreferencesSerializer
     permission_classes = [permissions.IsAuthenticated]
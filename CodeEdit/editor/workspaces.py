@@ -0,0 +1,186 @@
+import contextlib
+import fcntl
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+
+from . import autosave, execution
+from .archives import archive_name
+from .models import File
+
+
+class InvalidPath(ValueError):
+    pass
+
+
+def workspace_path(file):
+    """Path of ``file`` inside its project's workspace, laid out by File.path."""
+    relative = posixpath.normpath(archive_name(file))
+    if relative in ('.', '..') or relative.startswith('../') or relative.startswith('.manifest'):
+        raise InvalidPath(f'"{archive_name(file)}" is not a valid path inside the project')
+    return relative
+
+
+def _disk_usage(directory):
+    total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class WorkspaceCache:
+    """Per-project directories of materialized files, reused between runs.
+
+    Each workspace has a manifest of the content hash, size and mtime of
+    every file written, so a sync only rewrites files whose hash changed
+    (or that a previous run modified on disk) and removes deleted ones.
+    Workspaces are locked with flock, exclusively while syncing and
+    shared while a program runs, so several processes can share the root.
+    Idle workspaces are evicted least recently used first once the root
+    grows past WORKSPACE_BUDGET bytes.
+    """
+
+    @property
+    def root(self):
+        return execution.get_setting('WORKSPACE_ROOT') or os.path.join(tempfile.gettempdir(), 'codeedit-workspaces')
+
+    def _paths(self, project_id):
+        base = os.path.join(self.root, str(project_id))
+        return base, base + '.manifest.json', base + '.lock'
+
+    @contextlib.contextmanager
+    def checkout(self, project_id):
+        """Sync the project's workspace and hold it while the block runs.
+
+        Yields ``(directory, summary)`` where summary counts the files
+        written and deleted by the sync.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        directory, manifest_path, lock_path = self._paths(project_id)
+        lock = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            summary = self._sync(project_id, directory, manifest_path)
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            self.evict()
+            yield directory, summary
+        finally:
+            os.close(lock)
+
+    def _read_manifest(self, manifest_path):
+        try:
+            with open(manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'files': {}, 'size': 0}
+
+    def _sync(self, project_id, directory, manifest_path):
+        files = File.objects.filter(project_id=project_id)
+        if autosave.buffer.enabled:
+            autosave.buffer.flush(list(files.values_list('id', flat=True)))
+
+        manifest = self._read_manifest(manifest_path)
+        known = manifest['files']
+        wanted = {}
+        stale = {}
+        for file in files.only('id', 'path', 'name', 'content_hash'):
+            relative = workspace_path(file)
+            wanted[relative] = file.content_hash
+            entry = known.get(relative)
+            if entry is None or entry[0] != file.content_hash or not self._untouched(directory, relative, entry):
+                stale[file.pk] = relative
+
+        written = {}
+        for file_id, content in files.filter(pk__in=stale).values_list('id', 'content').iterator():
+            relative = stale[file_id]
+            target = os.path.join(directory, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Write aside and rename, so a crash never leaves a half file
+            # that the manifest claims is current
+            partial = target + '.partial'
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(partial, target)
+            stat = os.stat(target)
+            written[relative] = [wanted[relative], stat.st_size, stat.st_mtime_ns]
+
+        deleted = [relative for relative in known if relative not in wanted]
+        for relative in deleted:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, relative))
+        if deleted:
+            self._prune_empty_dirs(directory)
+
+        known = {relative: entry for relative, entry in known.items() if relative in wanted}
+        known.update(written)
+        os.makedirs(directory, exist_ok=True)
+        manifest = {'files': known, 'size': _disk_usage(directory)}
+        with open(manifest_path + '.partial', 'w') as f:
+            json.dump(manifest, f)
+        # The manifest's mtime doubles as the workspace's last use
+        os.replace(manifest_path + '.partial', manifest_path)
+        return {'written': len(written), 'deleted': len(deleted)}
+
+    def _untouched(self, directory, relative, entry):
+        try:
+            stat = os.stat(os.path.join(directory, relative))
+        except FileNotFoundError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns] == entry[1:]
+
+    def _prune_empty_dirs(self, directory):
+        for root, dirs, names in os.walk(directory, topdown=False):
+            if root != directory and not dirs and not names:
+                with contextlib.suppress(OSError):
+                    os.rmdir(root)
+
+    def evict(self):
+        """Remove idle workspaces, oldest first, until the root fits the budget."""
+        budget = execution.get_setting('WORKSPACE_BUDGET')
+        workspaces = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith('.manifest.json'):
+                continue
+            try:
+                used = entry.stat().st_mtime
+                with open(entry.path) as f:
+                    size = json.load(f)['size']
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            workspaces.append((used, entry.name[:-len('.manifest.json')], size))
+            total += size
+        for _, project_id, size in sorted(workspaces):
+            if total <= budget:
+                return
+            if self.discard(project_id, wait=False):
+                total -= size
+
+    def discard(self, project_id, wait=True):
+        """Delete a workspace, returning False if it is in use and ``wait`` is false."""
+        directory, manifest_path, lock_path = self._paths(project_id)
+        try:
+            lock = os.open(lock_path, os.O_RDWR)
+        except FileNotFoundError:
+            # Never checked out on this host, so there is nothing to delete
+            return True
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(manifest_path)
+            shutil.rmtree(directory, ignore_errors=True)
+            return True
+        finally:
+            os.close(lock)
+
+
+workspaces = WorkspaceCache()
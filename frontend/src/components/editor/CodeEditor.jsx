@@ -11,7 +11,13 @@ const CodeEditor = () => {
   const { projectId } = useParams();
   const navigate = useNavigate();
   const [project, setProject] = useState(null);
-  const [files, setFiles] = useState([]);
+  // Directory listings loaded so far, by folder path ('' is the project
+  // root). Folders are listed when first opened, so a large project only
+  // loads what the explorer shows.
+  const [listings, setListings] = useState({});
+  const [expanded, setExpanded] = useState(() => new Set());
+  // Content of files edited in this session, by id
+  const [contents, setContents] = useState({});
   const [activeFile, setActiveFile] = useState(null);
   const [fileContent, setFileContent] = useState('');
   const [loading, setLoading] = useState(true);
@@ -26,16 +32,28 @@ const CodeEditor = () => {
   const [executionError, setExecutionError] = useState(null);
   const [showTerminal, setShowTerminal] = useState(false);
 
-  // Fetch project and files
+  const loadListing = async (path) => {
+    const response = await projectsApi.tree(projectId, path);
+    const { folders, files } = response.data;
+    setListings(prev => ({ ...prev, [path]: { folders, files } }));
+  };
+
+  // Apply `update` to the files of every loaded listing
+  const updateListedFiles = (update) => {
+    setListings(prev => Object.fromEntries(
+      Object.entries(prev).map(([path, listing]) => [path, { ...listing, files: update(listing.files) }])
+    ));
+  };
+
+  // Fetch project and the top level of its files
   useEffect(() => {
     const fetchProjectData = async () => {
       try {
         setLoading(true);
-        const projectResponse = await projectsApi.get(projectId);
+        const projectResponse = await projectsApi.get(projectId, { fields: 'id,name,description' });
         setProject(projectResponse.data);
 
-        const filesResponse = await filesApi.getAll(projectId);
-        setFiles(filesResponse.data);
+        await loadListing('');
 
         setLoading(false);
       } catch (err) {
@@ -69,9 +87,8 @@ const CodeEditor = () => {
 
     setActiveFile(file);
 
-    const existingFileState = files.find(f => f.id === file.id);
-    if (existingFileState && existingFileState.content !== undefined) {
-        setFileContent(existingFileState.content || '');
+    if (contents[file.id] !== undefined) {
+        setFileContent(contents[file.id]);
     } else if (file.content !== undefined) {
         setFileContent(file.content || '');
     }
@@ -80,6 +97,24 @@ const CodeEditor = () => {
     }
   };
 
+  const handleToggleFolder = async (path) => {
+    const next = new Set(expanded);
+    if (next.has(path)) {
+      next.delete(path);
+      setExpanded(next);
+      return;
+    }
+    next.add(path);
+    setExpanded(next);
+    if (!listings[path]) {
+      try {
+        await loadListing(path);
+      } catch (err) {
+        setError('Failed to load folder');
+      }
+    }
+  };
+
   const handleEditorDidMount = (editor) => {
     editorRef.current = editor;
   };
@@ -87,9 +122,7 @@ const CodeEditor = () => {
   const handleContentChange = (value) => {
     setFileContent(value || '');
     if (activeFile) {
-      setFiles(prevFiles => prevFiles.map(f =>
-        f.id === activeFile.id ? { ...f, content: value || '' } : f
-      ));
+      setContents(prev => ({ ...prev, [activeFile.id]: value || '' }));
     }
   };
 
@@ -99,10 +132,6 @@ const CodeEditor = () => {
     try {
       setSaving(true);
       await filesApi.updateContent(activeFile.id, { content: fileContent });
-      // Update the file in the state
-      setFiles(prevFiles => prevFiles.map(f =>
-        f.id === activeFile.id ? { ...f, content: fileContent } : f
-      ));
       setSaving(false);
     } catch (err) {
       setError('Failed to save file');
@@ -143,7 +172,11 @@ const CodeEditor = () => {
         project: projectId,
         content: ''
       });
-      setFiles(prevFiles => [...prevFiles, response.data]);
+      // New files are created at the project root
+      setListings(prev => ({
+        ...prev,
+        '': { folders: prev['']?.folders || [], files: [...(prev['']?.files || []), response.data] },
+      }));
       handleFileSelect(response.data);
     } catch (err) {
       setError('Failed to create file');
@@ -153,7 +186,7 @@ const CodeEditor = () => {
   const handleRenameFile = async (fileId, newName) => {
     try {
       const response = await filesApi.update(fileId, { name: newName });
-      setFiles(prevFiles => prevFiles.map(f =>
+      updateListedFiles(files => files.map(f =>
         f.id === fileId ? { ...f, name: newName } : f
       ));
       if (activeFile?.id === fileId) {
@@ -167,7 +200,7 @@ const CodeEditor = () => {
   const handleDeleteFile = async (fileId) => {
     try {
       await filesApi.delete(fileId);
-      setFiles(prevFiles => prevFiles.filter(f => f.id !== fileId));
+      updateListedFiles(files => files.filter(f => f.id !== fileId));
       if (activeFile?.id === fileId) {
         setActiveFile(null);
         setFileContent('');
@@ -285,7 +318,9 @@ const CodeEditor = () => {
         {sidebarOpen && (
           <div className="w-64 bg-gray-100 border-r">
             <FileExplorer
-              files={files}
+              listings={listings}
+              expanded={expanded}
+              onToggleFolder={handleToggleFolder}
               activeFileId={activeFile?.id}
               onFileSelect={handleFileSelect}
               onCreateFile={handleCreateFile}
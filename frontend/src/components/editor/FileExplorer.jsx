@@ -2,8 +2,13 @@ import { useState } from 'react';
 import Button from '../ui/Button';
 import { formatDistanceToNow } from 'date-fns';
 
+// Indent of an entry `depth` folders below the project root
+const indent = (depth) => ({ paddingLeft: `${1 + depth * 0.75}rem` });
+
 const FileExplorer = ({
-  files,
+  listings,
+  expanded,
+  onToggleFolder,
   activeFileId,
   onFileSelect,
   onCreateFile,
@@ -54,15 +59,94 @@ const FileExplorer = ({
     setNewFileNameForRename(file.name);
   };
 
-  // Group files by extension
-  const groupedFiles = (Array.isArray(files) ? files : []).reduce((acc, file) => {
-    const ext = file.name.split('.').pop() || 'other';
-    if (!acc[ext]) {
-      acc[ext] = [];
+  const root = listings[''];
+
+  const renderFile = (file, depth) => (
+    <li
+      key={file.id}
+      className={`flex items-center justify-between pr-4 py-1 cursor-pointer hover:bg-gray-200 ${
+        file.id === activeFileId ? 'bg-blue-100' : ''
+      }`}
+      style={indent(depth)}
+      onClick={() => onFileSelect(file)}
+    >
+      {fileToRename === file.id ? (
+        <input
+          type="text"
+          value={newFileNameForRename}
+          onChange={(e) => setNewFileNameForRename(e.target.value)}
+          onKeyDown={(e) => handleRenameKeyDown(e, file)}
+          onBlur={() => handleRenameSubmit(file)}
+          className="flex-1 px-1 py-0 border rounded text-sm"
+          autoFocus
+        />
+      ) : (
+        <span className="flex-1 truncate">{file.name}</span>
+      )}
+
+      <div className="flex space-x-1">
+        {file.id === activeFileId && (
+          <>
+            <button
+              className="text-gray-500 hover:text-gray-700 text-xs"
+              onClick={(e) => {
+                e.stopPropagation();
+                onFileSelect(null);
+              }}
+              title="Close file"
+            >
+              ✕
+            </button>
+            <button
+              className="text-gray-500 hover:text-gray-700 text-xs"
+              onClick={(e) => startRenameFile(e, file)}
+              title="Rename file"
+            >
+              ✏️
+            </button>
+            <button
+              className="text-gray-500 hover:text-gray-700 text-xs"
+              onClick={(e) => {
+                e.stopPropagation();
+                onDeleteFile(file.id);
+              }}
+              title="Delete file"
+            >
+              🗑️
+            </button>
+          </>
+        )}
+      </div>
+    </li>
+  );
+
+  // One directory: its folders first, each opened on click, then its files
+  const renderListing = (path, depth) => {
+    const listing = listings[path];
+    if (!listing) {
+      return <div className="py-1 text-xs text-gray-500" style={indent(depth)}>Loading...</div>;
     }
-    acc[ext].push(file);
-    return acc;
-  }, {});
+    return (
+      <ul>
+        {listing.folders.map((folder) => (
+          <li key={`folder:${folder.path}`}>
+            <div
+              className="flex items-center py-1 pr-4 cursor-pointer hover:bg-gray-200 font-medium"
+              style={indent(depth)}
+              onClick={() => onToggleFolder(folder.path)}
+            >
+              <span className="w-4 text-xs text-gray-500">
+                {folder.has_children ? (expanded.has(folder.path) ? '▾' : '▸') : ''}
+              </span>
+              <span className="flex-1 truncate">{folder.name}</span>
+            </div>
+            {expanded.has(folder.path) && renderListing(folder.path, depth + 1)}
+          </li>
+        ))}
+        {listing.files.map((file) => renderFile(file, depth))}
+      </ul>
+    );
+  };
 
   return (
     <div className="flex flex-col h-full">
@@ -92,74 +176,9 @@ const FileExplorer = ({
       </div>
 
       <div className="overflow-y-auto flex-1 py-2">
-        {Object.entries(groupedFiles).map(([ext, fileGroup]) => (
-          <div key={ext} className="mb-4">
-            <div className="text-xs uppercase text-gray-500 font-semibold px-4 mb-1">
-              {ext}
-            </div>
-            <ul>
-              {fileGroup.map((file) => (
-                <li
-                  key={file.id}
-                  className={`flex items-center justify-between px-4 py-1 cursor-pointer hover:bg-gray-200 ${
-                    file.id === activeFileId ? 'bg-blue-100' : ''
-                  }`}
-                  onClick={() => onFileSelect(file)}
-                >
-                  {fileToRename === file.id ? (
-                    <input
-                      type="text"
-                      value={newFileNameForRename}
-                      onChange={(e) => setNewFileNameForRename(e.target.value)}
-                      onKeyDown={(e) => handleRenameKeyDown(e, file)}
-                      onBlur={() => handleRenameSubmit(file)}
-                      className="flex-1 px-1 py-0 border rounded text-sm"
-                      autoFocus
-                    />
-                  ) : (
-                    <span className="flex-1 truncate">{file.name}</span>
-                  )}
-
-                  <div className="flex space-x-1">
-                    {file.id === activeFileId && (
-                      <>
-                        <button
-                          className="text-gray-500 hover:text-gray-700 text-xs"
-                          onClick={(e) => {
-                            e.stopPropagation();
-                            onFileSelect(null);
-                          }}
-                          title="Close file"
-                        >
-                          ✕
-                        </button>
-                        <button
-                          className="text-gray-500 hover:text-gray-700 text-xs"
-                          onClick={(e) => startRenameFile(e, file)}
-                          title="Rename file"
-                        >
-                          ✏️
-                        </button>
-                        <button
-                          className="text-gray-500 hover:text-gray-700 text-xs"
-                          onClick={(e) => {
-                            e.stopPropagation();
-                            onDeleteFile(file.id);
-                          }}
-                          title="Delete file"
-                        >
-                          🗑️
-                        </button>
-                      </>
-                    )}
-                  </div>
-                </li>
-              ))}
-            </ul>
-          </div>
-        ))}
+        {renderListing('', 0)}
 
-        {files.length === 0 && (
+        {root && root.folders.length === 0 && root.files.length === 0 && (
           <div className="text-gray-500 text-center py-4">
             No files yet. Create one to get started.
           </div>
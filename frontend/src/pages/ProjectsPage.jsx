@@ -19,8 +19,7 @@ const fetchProjects = async () => {
   try {
     setLoading(true);
     const response = await projects.getAll();
-    // Check if response.data is paginated (has 'results' property)
-    setProjectsList(response.data.results || response.data);
+    setProjectsList(response.data);
     setError(null);
   } catch (err) {
     console.error('Error fetching projects:', err);
@@ -37,6 +37,19 @@ apiClient.interceptors.response.use(
   }
 );
 
+// Lists are paginated with a cursor; follow `next` until every page is in.
+// Resolves like a single response whose data is the combined results.
+const getAllPages = async (url, params) => {
+  let response = await apiClient.get(url, { params });
+  if (!Array.isArray(response.data.results)) return response;
+  const results = [...response.data.results];
+  while (response.data.next) {
+    response = await apiClient.get(response.data.next);
+    results.push(...response.data.results);
+  }
+  return { ...response, data: results };
+};
+
 export const auth = {
   login: (credentials) => apiClient.post('token/', credentials),
   register: (userData) => apiClient.post('auth/register/', userData),
@@ -47,21 +60,35 @@ export const auth = {
 };
 
 export const projects = {
-  getAll: () => apiClient.get('projects/'),
-  get: (id) => apiClient.get(`projects/${id}/`),
+  getAll: () => getAllPages('projects/'),
+  dashboard: () => apiClient.get('projects/dashboard/'),
+  get: (id, params) => apiClient.get(`projects/${id}/`, { params }),
   create: (data) => apiClient.post('projects/', data),
   update: (id, data) => apiClient.put(`projects/${id}/`, data),
   delete: (id) => apiClient.delete(`projects/${id}/`),
+  exportArchive: (id) => apiClient.get(`projects/${id}/export/`, { responseType: 'blob' }),
+  importArchive: (id, archive) => {
+    const form = new FormData();
+    form.append('file', archive);
+    return apiClient.post(`projects/${id}/import/`, form, { headers: { 'Content-Type': 'multipart/form-data' } });
+  },
+  run: (id, entry, stdin = '') => apiClient.post(`projects/${id}/run/`, { entry, stdin }),
+  tree: (id, path = '', expand = []) => apiClient.get(`projects/${id}/tree/`, { params: { path, expand: expand.join(',') } }),
+  moveFolder: (id, path, to) => apiClient.post(`projects/${id}/move-folder/`, { path, to }),
+  diagnostics: (id) => apiClient.get(`projects/${id}/diagnostics/`),
 };
 
 export const files = {
-  getAll: (projectId) => apiClient.get('files/', { params: { project: projectId } }),
+  getAll: (projectId) => getAllPages('files/', { project: projectId, page_size: 200 }),
   get: (id) => apiClient.get(`files/${id}/`),
   getContent: (id) => apiClient.get(`files/${id}/content/`),
+  diagnostics: (id) => apiClient.get(`files/${id}/diagnostics/`),
   create: (data) => apiClient.post('files/', data),
   update: (id, data) => apiClient.put(`files/${id}/`, data),
   updateContent: (id, data) => apiClient.put(`files/${id}/content/`, data),
+  patchContent: (id, baseVersion, edits) => apiClient.patch(`files/${id}/content/`, { base_version: baseVersion, edits }),
   delete: (id) => apiClient.delete(`files/${id}/`),
+  bulk: (projectId, operations) => apiClient.post('files/bulk/', { project: projectId, operations }),
 };
 
 export const preferences = {
@@ -70,6 +97,10 @@ export const preferences = {
   update: (id, data) => apiClient.put(`user-preferences/${id}/`, data),
 };
 
+export const search = {
+  query: (params) => apiClient.get('search/', { params }),
+};
+
 export const code = {
   execute: (data) => apiClient.post('execute/', data),
 };